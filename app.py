@@ -1,16 +1,200 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, request, jsonify, render_template, stream_with_context
 from flask_cors import CORS
-from podcast_generator import PodcastContentGenerator, load_config
+from markupsafe import escape
+from podcast_generator import RENDERED_MARKER, PodcastContentGenerator, get_config, validate_model
+from async_generator import AsyncPodcastContentGenerator
+from batch import BatchRunner, normalize_record
+from jobs import FINISHED, create_job_queue
+from prefetch import create_prefetcher
+from pipeline import create_pipelines
+from validation import ValidationError, validate_request
+import metrics
+import token_budget
+import tenants
+from structured import to_dict
+from rendering import CompressionCache, choose_encoding
+from limits import describe_error, field_error
+import asyncio
+import json
 import os
+import time
 
-# Load configuration
-config = load_config()
+# Load configuration (the process-wide one, which the benchmark replaces)
+config = get_config()
 
 app = Flask(__name__)
 CORS(app)
+# Larger bodies are refused before they are read into memory
+app.config['MAX_CONTENT_LENGTH'] = (config.get('limits') or {}).get('max_request_bytes', 1048576)
 
-# Initialize the generator
-generator = PodcastContentGenerator()
+# Initialize the generator (the Gemini client is set up on first use)
+generator = PodcastContentGenerator(config)
+
+# Optionally check the model up front instead of on the first request
+if config['api'].get('validate_on_startup', False):
+    validate_model(config)
+
+async_generator = AsyncPodcastContentGenerator(generator)
+
+# Compressed bodies of recent responses, reused for repeat views
+compression = CompressionCache()
+
+# Background jobs; worker threads start on first use in each process
+jobs = create_job_queue(generator, config)
+
+# Titles and questions generated ahead of the request, after an outline
+prefetch = create_prefetcher(generator, config)
+
+# Multi-stage pipelines from pipelines.yaml
+pipelines = create_pipelines(config)
+
+@app.before_request
+def start_timer():
+    request.started_at = time.perf_counter()
+    metrics.start_request_timings()
+
+@app.before_request
+def identify_user():
+    # Tokens are charged to the request's tenant, else the X-User-Id header
+    # when a trusted proxy sent it, else the client address
+    user = request.remote_addr
+    if request.remote_addr in config['server'].get('trusted_proxies', []):
+        user = request.headers.get('X-User-Id') or user
+    if user and user.startswith(tenants.TENANT_PREFIX):
+        # Only a tenant token can act as a tenant
+        user = request.remote_addr
+    if generator.scheduler is not None:
+        auth = request.headers.get('Authorization', '')
+        token = auth[7:].strip() if auth.lower().startswith('bearer ') else ''
+        tenant = generator.scheduler.registry.authenticate(token) if token else None
+        if token and tenant is None:
+            return jsonify({'error': 'Unknown API token'}), 401
+        if tenant is None and config['tenants'].get('require_token') and request.path.startswith('/api/'):
+            return jsonify({'error': 'An API token is required'}), 401
+        user = tenant or user
+    token_budget.set_user(user)
+    return None
+
+@app.before_request
+def touch_session():
+    session = request.headers.get('X-Session-Id')
+    if prefetch is not None and session:
+        prefetch.touch(session)
+
+@app.before_request
+def check_input_sizes():
+    if request.method != 'POST':
+        return None
+    values = request.get_json(silent=True) if request.is_json else request.form
+    if not hasattr(values, 'get'):
+        return None
+    error = field_error(values, config)
+    if error:
+        return jsonify({'error': error}), 400
+    return None
+
+@app.errorhandler(413)
+def request_too_large(error):
+    return jsonify({'error': f"Request body is larger than {app.config['MAX_CONTENT_LENGTH']} bytes"}), 413
+
+@app.before_request
+def check_token_quota():
+    if generator.quota is None or request.method != 'POST':
+        return None
+    try:
+        generator.quota.check(token_budget.current_user())
+    except token_budget.QuotaExceeded as e:
+        return jsonify({'error': str(e)}), 429, {'Retry-After': str(e.retry_after)}
+    return None
+
+@app.after_request
+def record_timing(response):
+    elapsed = time.perf_counter() - request.started_at
+    metrics.HTTP_LATENCY.observe(elapsed, endpoint=request.endpoint or 'unknown', status=response.status_code)
+    # Streamed bodies are still being produced, so only the time to first byte is known
+    timings = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in metrics.request_timings().items()]
+    timings.append(f"app;dur={elapsed * 1000:.1f}")
+    response.headers['Server-Timing'] = ", ".join(timings)
+    response.headers['X-Response-Time'] = f"{elapsed * 1000:.1f}ms"
+    return response
+
+@app.after_request
+def compress_response(response):
+    # Streams are sent as produced, so only whole bodies get an ETag and compression
+    if (response.direct_passthrough or response.is_streamed or response.status_code != 200
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in ('text/html', 'application/json', 'text/plain')):
+        return response
+    # Weak, so the compressed and plain bodies share one ETag
+    response.add_etag(weak=True)
+    # Only GET and HEAD can become 304s; POST replies always carry the body
+    response.make_conditional(request)
+    if response.status_code != 200:
+        return response
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    encoding = choose_encoding(request.headers.get('Accept-Encoding', ''))
+    if encoding is None or len(body) < compression.min_size:
+        return response
+    etag, _ = response.get_etag()
+    response.set_data(compression.compress(etag, body, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+def flag(values, name):
+    """Read a boolean flag from JSON or form values."""
+    return str(values.get(name, '')).lower() in ('1', 'true', 'yes', 'on')
+
+def use_cache_for(values):
+    """Return False when the client asked to bypass the response cache."""
+    return not flag(values, 'no_cache')
+
+def wants_stream(values):
+    """Return True when the client asked for incremental delivery."""
+    return flag(values, 'stream') or 'text/event-stream' in request.headers.get('Accept', '')
+
+def json_body():
+    """Return the request's JSON object, or raise ValidationError."""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        raise ValidationError('Request body must be a JSON object')
+    return data
+
+def prefetch_follow_ons(inputs):
+    """Start generating the session's likely next requests, if prefetch is enabled."""
+    session = request.headers.get('X-Session-Id')
+    if prefetch is not None and session:
+        prefetch.after_outline(session, inputs['topic'], inputs['style'], inputs.get('guest_expertise'))
+
+def prefetch_after(chunks, inputs):
+    """Yield a streamed outline, then start its prefetch."""
+    for chunk in chunks:
+        yield chunk
+    prefetch_follow_ons(inputs)
+
+def sse_response(chunks):
+    """Send generated chunks as Server-Sent Events, ending with a done event."""
+    def events():
+        for chunk in chunks:
+            yield f"data: {json.dumps(chunk)}\n\n"
+        yield "event: done\ndata: {}\n\n"
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def html_stream_response(chunks):
+    """Send generated HTML chunks with chunked transfer encoding."""
+    return Response(stream_with_context(chunks), mimetype='text/html',
+                    headers={'X-Accel-Buffering': 'no'})
+
+def markdown_page_stream(chunks):
+    """Escape a streamed markdown reply for the page, then send its sanitized rendering."""
+    parts = []
+    yield '<div style="white-space: pre-wrap;">'
+    for chunk in chunks:
+        parts.append(chunk)
+        yield str(escape(chunk))
+    yield '</div>'
+    yield RENDERED_MARKER + generator.renderer.markdown_to_html("".join(parts))
 
 @app.route('/')
 def index():
@@ -19,124 +203,462 @@ def index():
 @app.route('/api/generate/outline', methods=['POST'])
 def generate_outline():
     try:
-        data = request.get_json()
-        topic = data.get('topic')
-        duration = data.get('duration', 30)
-        style = data.get('style', 'deep')
-        
-        if not topic:
-            return jsonify({'error': 'Topic is required'}), 400
+        data = json_body()
+        inputs = validate_request('outline', data, config)
+        topic, duration, style = inputs['topic'], inputs['duration'], inputs['style']
+        structure = inputs.get('structure')
             
-        outline = generator.generate_outline(topic, duration, style)
+        if wants_stream(data):
+            chunks = generator.stream_outline(topic, duration, style, use_cache_for(data), structure)
+            return sse_response(prefetch_after(chunks, inputs))
+            
+        if data.get('format') == 'json':
+            outline = generator.generate_outline_structured(topic, duration, style, use_cache_for(data), structure)
+            if outline is None:
+                return jsonify({'error': 'Failed to generate outline'}), 500
+            prefetch_follow_ons(inputs)
+            return jsonify({'outline': to_dict(outline), 'total_minutes': outline.total_minutes})
+            
+        outline = generator.generate_outline(topic, duration, style, use_cache_for(data), structure)
         
         if outline:
+            prefetch_follow_ons(inputs)
             return jsonify({'outline': outline})
         else:
             return jsonify({'error': 'Failed to generate outline'}), 500
             
+    except ValidationError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return jsonify({'error': describe_error(e)}), 500
 
 @app.route('/api/generate/questions', methods=['POST'])
 def generate_questions():
     try:
-        data = request.get_json()
-        topic = data.get('topic')
-        guest_expertise = data.get('guest_expertise')
-        style = data.get('style', 'deep')
-        
-        if not topic or not guest_expertise:
-            return jsonify({'error': 'Topic and guest expertise are required'}), 400
+        data = json_body()
+        inputs = validate_request('questions', data, config)
+        topic, guest_expertise, style = inputs['topic'], inputs['guest_expertise'], inputs['style']
             
-        questions = generator.generate_questions(topic, guest_expertise, style)
+        if wants_stream(data):
+            return sse_response(generator.stream_questions(topic, guest_expertise, style, use_cache_for(data)))
+            
+        questions = generator.generate_questions(topic, guest_expertise, style, use_cache_for(data))
         
         if questions:
             return jsonify({'questions': questions})
         else:
             return jsonify({'error': 'Failed to generate questions'}), 500
             
+    except ValidationError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return jsonify({'error': describe_error(e)}), 500
 
 @app.route('/api/generate/title', methods=['POST'])
 def generate_title():
     try:
-        data = request.get_json()
-        topic = data.get('topic')
-        style = data.get('style', 'deep')
-        
-        if not topic:
-            return jsonify({'error': 'Topic is required'}), 400
+        data = json_body()
+        inputs = validate_request('title', data, config)
+        topic, style = inputs['topic'], inputs['style']
+            
+        if wants_stream(data):
+            return sse_response(generator.stream_title(topic, style, use_cache_for(data)))
             
-        titles = generator.generate_title(topic, style)
+        if data.get('format') == 'json':
+            titles = generator.generate_title_structured(topic, style, use_cache_for(data))
+            if titles is None:
+                return jsonify({'error': 'Failed to generate titles'}), 500
+            return jsonify({'titles': to_dict(titles)['titles']})
+            
+        titles = generator.generate_title(topic, style, use_cache_for(data))
         
         if titles:
             return jsonify({'titles': titles})
         else:
             return jsonify({'error': 'Failed to generate titles'}), 500
             
+    except ValidationError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': describe_error(e)}), 500
+
+@app.route('/api/generate/research', methods=['POST'])
+def generate_research_json():
+    try:
+        data = json_body()
+        inputs = validate_request('research', data, config)
+        topic, keywords, analysis_type = inputs['topic'], inputs['keywords'], inputs['analysis_type']
+            
+        if data.get('format') == 'json':
+            report = generator.generate_research_structured(topic, keywords, analysis_type, use_cache_for(data))
+            if report is None:
+                return jsonify({'error': 'Failed to generate research analysis'}), 500
+            return jsonify({'research': to_dict(report)})
+            
+        if wants_stream(data):
+            return sse_response(generator.stream_research(topic, keywords, analysis_type, use_cache_for(data)))
+            
+        research = generator.generate_research(topic, keywords, analysis_type, use_cache_for(data))
+        
+        if research:
+            return jsonify({'research': research})
+        else:
+            return jsonify({'error': 'Failed to generate research analysis'}), 500
+        
+    except ValidationError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': describe_error(e)}), 500
+
+@app.route('/api/generate/package', methods=['POST'])
+def generate_package():
+    try:
+        data = json_body()
+        inputs = validate_request('package', data, config)
+        topic, duration, style = inputs['topic'], inputs['duration'], inputs['style']
+        guest_expertise, analysis_type = inputs['guest_expertise'], inputs['analysis_type']
+        keywords = inputs.get('keywords', topic)
+            
+        package = asyncio.run(async_generator.generate_episode_package(
+            topic, duration, style, guest_expertise, keywords, analysis_type, use_cache_for(data),
+            inputs.get('structure')
+        ))
+        
+        if all(package.values()):
+            return jsonify(package)
+        else:
+            failed = [name for name, value in package.items() if not value]
+            return jsonify({'error': f"Failed to generate: {', '.join(failed)}", **package}), 500
+            
+    except ValidationError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return jsonify({'error': describe_error(e)}), 500
+
+@app.route('/api/generate/batch', methods=['POST'])
+def generate_batch():
+    try:
+        data = json_body()
+        records = data.get('records') or []
+        max_records = config.get('batch', {}).get('max_records_per_request', 200)
+        
+        if not records:
+            return jsonify({'error': 'Records are required'}), 400
+        if not isinstance(records, list) or not all(isinstance(record, dict) for record in records):
+            return jsonify({'error': 'Records must be a list of JSON objects'}), 400
+        if len(records) > max_records:
+            return jsonify({'error': f'At most {max_records} records per request; use batch.py for larger runs'}), 400
+            
+        # Clients may ask for fewer workers than batch.max_workers, never more
+        max_workers = config.get('batch', {}).get('max_workers', 4)
+        workers = data.get('workers', max_workers)
+        if isinstance(workers, bool) or not isinstance(workers, int) or workers < 1:
+            return jsonify({'error': 'workers must be a positive integer'}), 400
+            
+        records = [normalize_record(record, i) for i, record in enumerate(records)]
+        order = {record['id']: i for i, record in enumerate(records)}
+        runner = BatchRunner(generator, max_workers=min(workers, max_workers), use_cache=use_cache_for(data))
+        if flag(data, 'stream'):
+            # One JSON line per record as it finishes, so no reply waits in memory for the rest
+            lines = (json.dumps(result) + '\n' for result in runner.iter_results(records))
+            return Response(stream_with_context(lines), mimetype='application/x-ndjson',
+                            headers={'X-Accel-Buffering': 'no'})
+        results = sorted(runner.run(records), key=lambda result: order[result['id']])
+        failed = sum(1 for result in results if result['status'] != 'ok')
+        return jsonify({'results': results, 'completed': len(results) - failed, 'failed': failed})
+        
+    except ValidationError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': describe_error(e)}), 500
+
+@app.route('/api/pipelines', methods=['GET'])
+def list_pipelines():
+    return jsonify({'pipelines': [pipeline.describe() for pipeline in pipelines.values()]})
+
+@app.route('/api/pipelines/<name>', methods=['POST'])
+def run_pipeline(name):
+    try:
+        pipeline = pipelines.get(name)
+        if pipeline is None:
+            return jsonify({'error': f'Unknown pipeline: {name}'}), 404
+        data = json_body()
+        values = validate_request('pipeline', data, config)
+        missing = pipeline.missing_inputs(values)
+        if missing:
+            return jsonify({'error': f"Missing inputs: {', '.join(missing)}"}), 400
+            
+        stages = pipeline.run(generator, values, use_cache_for(data),
+                              config.get('pipelines', {}).get('max_workers', 4))
+        failed = [stage for stage, result in stages.items() if result['status'] != 'ok']
+        if failed:
+            return jsonify({'error': f"Failed stages: {', '.join(failed)}", 'pipeline': name, 'stages': stages}), 500
+        return jsonify({'pipeline': name, 'stages': stages})
+        
+    except ValidationError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': describe_error(e)}), 500
+
+@app.route('/api/documents', methods=['POST'])
+def create_document():
+    try:
+        data = json_body()
+        kind = data.get('kind', 'outline')
+        if kind not in ('outline', 'research'):
+            return jsonify({'error': 'Kind must be outline or research'}), 400
+        inputs = validate_request(f'document_{kind}', data, config)
+        if kind == 'outline':
+            inputs.setdefault('structure', None)
+        else:
+            inputs.setdefault('keywords', inputs['topic'])
+            
+        document = generator.create_document(kind, inputs, use_cache_for(data))
+        return jsonify({'document': document.to_dict(), 'html': generator.render_document(document)})
+        
+    except ValidationError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': describe_error(e)}), 500
+
+@app.route('/api/documents/<document_id>', methods=['GET'])
+def get_document(document_id):
+    try:
+        document = generator.documents.get(document_id)
+    except KeyError as e:
+        return jsonify({'error': str(e.args[0])}), 404
+    return jsonify({'document': document.to_dict(), 'html': generator.render_document(document)})
+
+@app.route('/api/documents/<document_id>/sections/<section_id>/regenerate', methods=['POST'])
+def regenerate_section(document_id, section_id):
+    # Only an unknown document or section is a 404; a KeyError from
+    # regenerating it is a server error like any other
+    try:
+        generator.documents.get(document_id).section(section_id)
+    except KeyError as e:
+        return jsonify({'error': str(e.args[0])}), 404
+    try:
+        data = request.get_json(silent=True) or {}
+        document = generator.regenerate_section(document_id, section_id, data.get('instructions'))
+        section = document.section(section_id)
+        return jsonify({
+            'section': {'id': section.id, 'heading': section.heading, 'markdown': section.markdown},
+            'document': document.to_dict(),
+            'html': generator.render_document(document),
+        })
+        
+    except Exception as e:
+        return jsonify({'error': describe_error(e)}), 500
 
 @app.route('/generate_research', methods=['POST'])
 def generate_research():
     try:
-        topic = request.form.get('topic')
-        keywords = request.form.get('keywords')
-        analysis_type = request.form.get('analysisType')
-        
-        if not all([topic, keywords, analysis_type]):
-            return '<div class="error-message">Please provide all required fields</div>', 400
+        inputs = validate_request('research', request.form, config)
+        topic, keywords, analysis_type = inputs['topic'], inputs['keywords'], inputs['analysis_type']
+            
+        if wants_stream(request.form):
+            return html_stream_response(generator.stream_research(topic, keywords, analysis_type,
+                                                                  use_cache_for(request.form), rendered=True))
             
-        result = generator.generate_research(topic, keywords, analysis_type)
+        result = generator.generate_research(topic, keywords, analysis_type, use_cache_for(request.form))
         if result is None:
             return '<div class="error-message">Failed to generate research analysis. Please try again.</div>', 500
             
         # Ensure we always return the result as a response
         return result if isinstance(result, tuple) else (result, 200)
         
+    except ValidationError as e:
+        return f'<div class="error-message">{escape(str(e))}</div>', 400
     except Exception as e:
-        print(f"Error in generate_research: {str(e)}")  # Log the error
-        return '<div class="error-message">An error occurred while generating research analysis: ' + str(e) + '</div>', 500
+        print(f"Error in generate_research: {describe_error(e)}")  # Log the error
+        return '<div class="error-message">An error occurred while generating research analysis: ' + escape(describe_error(e)) + '</div>', 500
 
 @app.route('/generate_questions', methods=['POST'])
 def generate_questions_form():
     try:
-        topic = request.form.get('topic')
-        guest_expertise = request.form.get('guest_expertise')
-        style = request.form.get('style')
-        
-        if not all([topic, guest_expertise, style]):
-            return '<div class="error-message">Please provide all required fields</div>', 400
+        inputs = validate_request('questions', request.form, config)
+        topic, guest_expertise, style = inputs['topic'], inputs['guest_expertise'], inputs['style']
+            
+        if wants_stream(request.form):
+            return html_stream_response(markdown_page_stream(
+                generator.stream_questions(topic, guest_expertise, style, use_cache_for(request.form))))
             
-        result = generator.generate_questions(topic, guest_expertise, style)
+        result = generator.generate_questions(topic, guest_expertise, style, use_cache_for(request.form))
         if result is None:
             return '<div class="error-message">Failed to generate questions. Please try again.</div>', 500
             
-        return result
+        return generator.renderer.markdown_to_html(result)
         
+    except ValidationError as e:
+        return f'<div class="error-message">{escape(str(e))}</div>', 400
     except Exception as e:
-        print(f"Error in generate_questions: {str(e)}")  # Log the error
-        return '<div class="error-message">An error occurred while generating questions: ' + str(e) + '</div>', 500
+        print(f"Error in generate_questions: {describe_error(e)}")  # Log the error
+        return '<div class="error-message">An error occurred while generating questions: ' + escape(describe_error(e)) + '</div>', 500
 
 @app.route('/generate_title', methods=['POST'])
 def generate_title_form():
     try:
-        topic = request.form.get('topic')
-        style = request.form.get('style')
-        
-        if not all([topic, style]):
-            return '<div class="error-message">Please provide all required fields</div>', 400
+        inputs = validate_request('title', request.form, config)
+        topic, style = inputs['topic'], inputs['style']
             
-        result = generator.generate_title(topic, style)
+        if wants_stream(request.form):
+            return html_stream_response(markdown_page_stream(generator.stream_title(topic, style, use_cache_for(request.form))))
+            
+        result = generator.generate_title(topic, style, use_cache_for(request.form))
         if result is None:
             return '<div class="error-message">Failed to generate titles. Please try again.</div>', 500
             
-        return result
+        return generator.renderer.markdown_to_html(result)
+        
+    except ValidationError as e:
+        return f'<div class="error-message">{escape(str(e))}</div>', 400
+    except Exception as e:
+        print(f"Error in generate_title: {describe_error(e)}")  # Log the error
+        return '<div class="error-message">An error occurred while generating titles: ' + escape(describe_error(e)) + '</div>', 500
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    if jobs is None:
+        return jsonify({'error': 'Background jobs are disabled'}), 404
+    try:
+        data = json_body()
+        record = {key: value for key, value in data.items() if key not in ('priority', 'webhook', 'no_cache')}
+        job = jobs.submit(record, priority=data.get('priority', 0), webhook=data.get('webhook'),
+                          use_cache=use_cache_for(data))
+        return jsonify(job), 202, {'Location': f"/api/jobs/{job['id']}"}
         
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': describe_error(e)}), 400
     except Exception as e:
-        print(f"Error in generate_title: {str(e)}")  # Log the error
-        return '<div class="error-message">An error occurred while generating titles: ' + str(e) + '</div>', 500
+        return jsonify({'error': describe_error(e)}), 500
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    if jobs is None:
+        return jsonify({'error': 'Background jobs are disabled'}), 404
+    jobs.start()
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    return jsonify({'jobs': jobs.list_jobs(request.args.get('status'), limit, user=token_budget.current_user())})
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    if jobs is None:
+        return jsonify({'error': 'Background jobs are disabled'}), 404
+    jobs.start()
+    # ?wait=N long-polls for up to N seconds while the job is unfinished
+    wait = min(request.args.get('wait', 0, type=float), 60)
+    user = token_budget.current_user()
+    job = jobs.get(job_id, user)
+    if job is not None and wait > 0 and job['status'] not in FINISHED:
+        job = jobs.wait(job_id, job['status'], wait, user)
+    if job is None:
+        return jsonify({'error': f'Unknown job: {job_id}'}), 404
+    return jsonify(job)
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    if jobs is None:
+        return jsonify({'error': 'Background jobs are disabled'}), 404
+    jobs.start()
+    user = token_budget.current_user()
+    job = jobs.get(job_id, user)
+    if job is None:
+        return jsonify({'error': f'Unknown job: {job_id}'}), 404
+    
+    def events(job):
+        # One event per status change, then the finished job; comments keep proxies from timing out
+        while True:
+            if job['status'] in FINISHED:
+                yield f"event: {job['status']}\ndata: {json.dumps(job)}\n\n"
+                return
+            yield f"event: status\ndata: {json.dumps({'id': job['id'], 'status': job['status']})}\n\n"
+            status = job['status']
+            while job is not None and job['status'] == status:
+                job = jobs.wait(job_id, status, 15, user)
+                if job is not None and job['status'] == status:
+                    yield ": keep-alive\n\n"
+            if job is None:
+                return
+    return Response(stream_with_context(events(job)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    if jobs is None:
+        return jsonify({'error': 'Background jobs are disabled'}), 404
+    job = jobs.cancel(job_id, token_budget.current_user())
+    if job is None:
+        return jsonify({'error': f'Unknown job: {job_id}'}), 404
+    return jsonify(job)
+
+@app.route('/api/sessions/<session_id>', methods=['DELETE'])
+def end_session(session_id):
+    if prefetch is None:
+        return jsonify({'error': 'Prefetch is disabled'}), 404
+    return jsonify({'session': session_id, 'cancelled': prefetch.end_session(session_id)})
+
+@app.route('/api/usage', methods=['GET'])
+def token_usage():
+    if generator.quota is None:
+        return jsonify({'error': 'Token quotas are disabled'}), 404
+    user = token_budget.current_user()
+    return jsonify({
+        'user': user,
+        'used_today': generator.quota.usage(user),
+        'remaining_today': generator.quota.remaining(user),
+        'daily_quota': generator.quota.daily_tokens_per_user,
+    })
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    stats = generator.cache.stats()
+    stats['coalesced'] = generator.inflight.coalesced
+    stats['in_flight'] = generator.inflight.in_flight()
+    if generator.similar is not None:
+        stats['similar'] = generator.similar.stats()
+    if prefetch is not None:
+        stats['prefetch'] = prefetch.stats()
+    return jsonify(stats)
+
+@app.route('/api/history/search', methods=['GET'])
+def search_history():
+    if generator.store is None:
+        return jsonify({'error': 'Generation history is disabled'}), 404
+    try:
+        limit = min(int(request.args.get('limit', 20)), 100)
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        return jsonify({'error': 'limit and offset must be integers'}), 400
+    results = generator.store.search(
+        q=request.args.get('q'),
+        method=request.args.get('method'),
+        topic=request.args.get('topic'),
+        style=request.args.get('style'),
+        analysis_type=request.args.get('analysis_type'),
+        source=request.args.get('source'),
+        limit=limit,
+        offset=offset,
+    )
+    return jsonify({'results': results})
+
+@app.route('/api/history/stats', methods=['GET'])
+def history_stats():
+    if generator.store is None:
+        return jsonify({'error': 'Generation history is disabled'}), 404
+    return jsonify({'methods': generator.store.stats()})
+
+@app.route('/api/history/<int:generation_id>', methods=['GET'])
+def get_history(generation_id):
+    if generator.store is None:
+        return jsonify({'error': 'Generation history is disabled'}), 404
+    record = generator.store.get(generation_id)
+    if record is None:
+        return jsonify({'error': f'Unknown generation: {generation_id}'}), 404
+    return jsonify(record)
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
 
 if __name__ == '__main__':
     # Get host and port from config
@@ -144,5 +666,9 @@ if __name__ == '__main__':
     port = config['server']['port']
     debug = config['server']['debug']
     
-    print(f"Starting server on {host}:{port}")
-    app.run(host=host, port=port, debug=debug) 
\ No newline at end of file
+    if config['server'].get('mode', 'development') == 'production':
+        import serve
+        serve.main(config)
+    else:
+        print(f"Starting server on {host}:{port}")
+        app.run(host=host, port=port, debug=debug, threaded=True) 
\ No newline at end of file
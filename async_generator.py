@@ -0,0 +1,63 @@
+import asyncio
+import weakref
+from podcast_generator import PodcastContentGenerator
+
+class AsyncPodcastContentGenerator:
+    """Asyncio front end for PodcastContentGenerator.
+
+    Each call runs the blocking generator method on a worker thread, so the
+    response cache and every other layer of the sync generator still apply.
+    At most `max_concurrency` model calls run at once per event loop.
+    """
+
+    def __init__(self, generator=None, max_concurrency=None):
+        self.generator = generator or PodcastContentGenerator()
+        if max_concurrency is None:
+            max_concurrency = self.generator.config.get('generation', {}).get('max_concurrency', 4)
+        self.max_concurrency = max_concurrency
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def _semaphore(self):
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphores[loop] = semaphore
+        return semaphore
+
+    async def _run(self, method, *args, **kwargs):
+        async with self._semaphore():
+            return await asyncio.to_thread(method, *args, **kwargs)
+
+    async def generate_outline(self, topic, duration, style, use_cache=True, structure=None):
+        return await self._run(self.generator.generate_outline, topic, duration, style, use_cache, structure)
+
+    async def generate_questions(self, topic, guest_expertise, style, use_cache=True):
+        return await self._run(self.generator.generate_questions, topic, guest_expertise, style, use_cache)
+
+    async def generate_title(self, topic, style, use_cache=True):
+        return await self._run(self.generator.generate_title, topic, style, use_cache)
+
+    async def generate_research(self, topic, keywords, analysis_type, use_cache=True):
+        return await self._run(self.generator.generate_research, topic, keywords, analysis_type, use_cache)
+
+    async def generate_episode_package(self, topic, duration, style, guest_expertise,
+                                       keywords=None, analysis_type='trends', use_cache=True, structure=None):
+        """Generate outline, titles, questions and research concurrently.
+
+        `structure` picks the outline's podcast_templates entry, as for
+        generate_outline. Returns a dict keyed by content type. A part that
+        failed is None, matching what the sync methods return on error.
+        """
+        outline, titles, questions, research = await asyncio.gather(
+            self.generate_outline(topic, duration, style, use_cache, structure),
+            self.generate_title(topic, style, use_cache),
+            self.generate_questions(topic, guest_expertise, style, use_cache),
+            self.generate_research(topic, keywords or topic, analysis_type, use_cache),
+        )
+        return {
+            'outline': outline,
+            'titles': titles,
+            'questions': questions,
+            'research': research,
+        }
@@ -0,0 +1,211 @@
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from response_cache import normalize_prompt
+
+class FakeAPIError(Exception):
+    """Simulated API failure; `code` mirrors the HTTP status of the real error."""
+
+    def __init__(self, message, code=503):
+        super().__init__(message)
+        self.code = code
+
+class FakeResponse:
+    """Minimal stand-in for GenerateContentResponse."""
+
+    def __init__(self, text, chunks=None, chunk_delay=0):
+        self.text = text
+        self._chunks = chunks
+        self._chunk_delay = chunk_delay
+
+    def __iter__(self):
+        for i, chunk in enumerate(self._chunks or [self.text]):
+            if i and self._chunk_delay:
+                time.sleep(self._chunk_delay)
+            yield FakeResponse(chunk)
+
+def prompt_id(prompt):
+    return hashlib.sha256(normalize_prompt(prompt).encode("utf-8")).hexdigest()
+
+def load_recordings(path):
+    """Read {prompt_id: text} pairs saved by RecordingModel."""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def synthesize_response(prompt, target_chars):
+    """Build a deterministic markdown reply that follows the prompt's layout."""
+    lines = []
+    for line in prompt.splitlines():
+        line = line.strip()
+        if line.startswith(("#", "•", "- ")):
+            lines.append(line.replace("[", "").replace("]", ""))
+    body = "\n".join(lines) or prompt
+    text = body
+    while len(text) < target_chars:
+        text += "\n" + body
+    return text[:target_chars]
+
+def _fill(shape, words, headings=()):
+    """Fill a JSON shape example ("string", 0, one-item lists) with sample values."""
+    if isinstance(shape, list):
+        item = shape[0] if shape else "string"
+        if isinstance(item, dict) and 'heading' in item and headings:
+            return [dict(_fill(item, words), heading=heading) for heading in headings]
+        return [_fill(item, words, headings) for _ in range(3)]
+    if isinstance(shape, dict):
+        return {key: _fill(value, words, headings) for key, value in shape.items()}
+    if isinstance(shape, int) and not isinstance(shape, bool):
+        return 5
+    return " ".join(words)
+
+def synthesize_json(prompt):
+    """Build a JSON reply for a structured prompt, or None if it isn't one.
+
+    Repair prompts get a value for each listed path, and prompts that end
+    with a shape example get that shape filled in. Research sections are
+    named after the sections the prompt asks for.
+    """
+    words = [word for word in prompt.split() if word.isalpha()][:8] or ["sample"]
+    if "keys are exactly the paths listed above" in prompt:
+        fixes = {}
+        for path, message in re.findall(r"^- (\S+): (.+)$", prompt, re.MULTILINE):
+            if message == "expected an integer":
+                fixes[path] = 5
+            elif message == "expected a non-empty list":
+                fixes[path] = [" ".join(words)]
+            else:
+                fixes[path] = " ".join(words)
+        return json.dumps(fixes)
+    marker = prompt.find("matching this shape:")
+    if marker == -1 or "Reply with JSON only" not in prompt:
+        return None
+    try:
+        shape, _ = json.JSONDecoder().raw_decode(prompt, prompt.index("{", marker))
+    except ValueError:
+        return None
+    listed = re.search(r"(?:sections in order|write only these sections): (.+?)\.\n", prompt)
+    headings = [heading.strip() for heading in listed.group(1).split(",")] if listed else ()
+    return json.dumps(_fill(shape, words, headings), indent=2)
+
+class FakeGeminiModel:
+    """Local model that replays recordings and simulates latency and errors.
+
+    Prompts found in the recordings file get the recorded reply; any other
+    prompt gets a synthetic reply that follows the prompt's markdown layout,
+    or its JSON shape for structured prompts.
+    Latency, chunk timing and the error rate come from the config, and a
+    fixed seed keeps runs repeatable.
+    """
+
+    def __init__(self, model_name='models/fake-gemini', recordings=None, latency_seconds=1.0,
+                 latency_jitter=0.0, response_chars=4000, chunk_chars=200,
+                 chunk_delay_seconds=0.05, error_rate=0.0, error_code=503, seed=0):
+        self.model_name = model_name
+        self.recordings = recordings or {}
+        self.latency_seconds = latency_seconds
+        self.latency_jitter = latency_jitter
+        self.response_chars = response_chars
+        self.chunk_chars = chunk_chars
+        self.chunk_delay_seconds = chunk_delay_seconds
+        self.error_rate = error_rate
+        self.error_code = error_code
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config, model_name='models/fake-gemini'):
+        fake = (config.get('backend') or {}).get('fake') or {}
+        return cls(
+            model_name=model_name,
+            recordings=load_recordings(fake.get('recordings')),
+            latency_seconds=fake.get('latency_seconds', 1.0),
+            latency_jitter=fake.get('latency_jitter', 0.0),
+            response_chars=fake.get('response_chars', 4000),
+            chunk_chars=fake.get('chunk_chars', 200),
+            chunk_delay_seconds=fake.get('chunk_delay_seconds', 0.05),
+            error_rate=fake.get('error_rate', 0.0),
+            error_code=fake.get('error_code', 503),
+            seed=fake.get('seed', 0),
+        )
+
+    def generate_content(self, prompt, generation_config=None, stream=False, request_options=None, **kwargs):
+        with self._lock:
+            self.calls += 1
+            fail = self._random.random() < self.error_rate
+            jitter = self._random.uniform(-self.latency_jitter, self.latency_jitter)
+        latency = max(0.0, self.latency_seconds + jitter)
+
+        text = self.recordings.get(prompt_id(prompt))
+        if text is None:
+            text = synthesize_json(prompt)
+        if text is None:
+            text = synthesize_response(prompt, self.response_chars)
+        chunks = [text[i:i + self.chunk_chars] for i in range(0, len(text), self.chunk_chars)] or [text]
+
+        # Time to first chunk when streaming; the rest arrive at chunk_delay_seconds intervals
+        wait = latency / max(1, len(chunks)) if stream else latency
+        timeout = (request_options or {}).get('timeout')
+        if timeout is not None and wait > timeout:
+            # Like the SDK, give up on the request at its timeout
+            time.sleep(timeout)
+            raise FakeAPIError("Deadline Exceeded", 504)
+        time.sleep(wait)
+        if fail:
+            raise FakeAPIError("Simulated service error", self.error_code)
+        if stream:
+            return FakeResponse(text, chunks, self.chunk_delay_seconds)
+        return FakeResponse(text)
+
+class RecordingModel:
+    """Wraps a real model and saves each reply for FakeGeminiModel to replay."""
+
+    def __init__(self, model, path):
+        self.model = model
+        self.path = path
+        self.recordings = load_recordings(path)
+        self._lock = threading.Lock()
+
+    @property
+    def model_name(self):
+        return self.model.model_name
+
+    def generate_content(self, prompt, **kwargs):
+        response = self.model.generate_content(prompt, **kwargs)
+        if kwargs.get('stream'):
+            return response
+        with self._lock:
+            self.recordings[prompt_id(prompt)] = response.text
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(self.recordings, f, indent=2)
+        return response
+
+def create_model(config, model_name, api_key=None):
+    """Build the model backend selected by `backend.type`.
+
+    "gemini" is the real API, "fake" the offline stand-in, and "record"
+    calls the real API while saving replies to backend.fake.recordings.
+    The Gemini SDK must already be configured for "gemini" and "record".
+    With an api_key, the model gets its own API client using that key
+    instead of the configured default.
+    """
+    backend = (config.get('backend') or {}).get('type', 'gemini')
+    if backend == 'fake':
+        return FakeGeminiModel.from_config(config, model_name.replace('models/', 'models/fake-', 1))
+    import google.generativeai as genai
+    model = genai.GenerativeModel(model_name)
+    if api_key:
+        from google.ai import generativelanguage as glm
+        model._client = glm.GenerativeServiceClient(client_options={'api_key': api_key})
+    if backend == 'record':
+        path = ((config.get('backend') or {}).get('fake') or {}).get('recordings') or 'recordings.json'
+        return RecordingModel(model, path)
+    if backend != 'gemini':
+        raise ValueError(f"Unknown model backend: {backend}")
+    return model
@@ -0,0 +1,197 @@
+import argparse
+import contextvars
+import csv
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from podcast_generator import PodcastContentGenerator, get_config
+from limits import describe_error
+from validation import ValidationError, validate_request
+
+KINDS = ('outline', 'questions', 'title', 'research')
+
+class RateLimiter:
+    """Spaces out calls so no more than `per_minute` start in any minute."""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute else 0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+def normalize_record(record, index):
+    """Fill in defaults for a batch record and give it a stable id."""
+    record = {k: v for k, v in record.items() if v not in (None, '')}
+    record.setdefault('id', str(index))
+    record['id'] = str(record['id'])
+    record.setdefault('kind', 'outline')
+    record.setdefault('style', 'deep')
+    if record['kind'] == 'outline':
+        try:
+            record['duration'] = int(record.get('duration', 30))
+        except (TypeError, ValueError):
+            pass
+    if record['kind'] == 'research':
+        record.setdefault('keywords', record.get('topic'))
+        record.setdefault('analysis_type', 'trends')
+    return record
+
+def validate_record(record, config=None):
+    """Return an error message for an unusable record, or None.
+
+    A usable record's inputs are replaced by their canonical form.
+    """
+    if record['kind'] not in KINDS:
+        return f"Unknown kind: {record['kind']}"
+    try:
+        record.update(validate_request(record['kind'], record, config or get_config()))
+    except ValidationError as e:
+        return str(e)
+    return None
+
+def load_records(path):
+    """Read batch records from a CSV or JSONL file."""
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.endswith('.jsonl'):
+            records = [json.loads(line) for line in f if line.strip()]
+        else:
+            records = list(csv.DictReader(f))
+    return [normalize_record(record, i) for i, record in enumerate(records)]
+
+def load_checkpoint(path):
+    """Return the ids already completed in an earlier run of this output file."""
+    done = set()
+    if not path or not os.path.exists(path):
+        return done
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                # A line cut short by an interrupted run; redo that record
+                continue
+            if result.get('status') == 'ok':
+                done.add(str(result['id']))
+    return done
+
+class BatchRunner:
+    """Runs many generation records over a bounded worker pool."""
+
+    def __init__(self, generator=None, max_workers=None, requests_per_minute=None, use_cache=True):
+        self.generator = generator or PodcastContentGenerator()
+        batch_config = self.generator.config.get('batch') or {}
+        self.max_workers = max_workers or batch_config.get('max_workers', 4)
+        if requests_per_minute is None:
+            requests_per_minute = batch_config.get('requests_per_minute', 60)
+        self.rate_limiter = RateLimiter(requests_per_minute)
+        self.use_cache = use_cache
+        self._write_lock = threading.Lock()
+
+    def generate(self, record):
+        """Generate the content for one record."""
+        kind = record['kind']
+        if kind == 'outline':
+            return self.generator.generate_outline(record['topic'], record['duration'], record['style'], self.use_cache,
+                                                   record.get('structure'))
+        if kind == 'questions':
+            return self.generator.generate_questions(record['topic'], record['guest_expertise'], record['style'], self.use_cache)
+        if kind == 'title':
+            return self.generator.generate_title(record['topic'], record['style'], self.use_cache)
+        return self.generator.generate_research(record['topic'], record['keywords'], record['analysis_type'], self.use_cache)
+
+    def _process(self, record):
+        started = time.monotonic()
+        error = validate_record(record, self.generator.config)
+        content = None
+        if error is None:
+            self.rate_limiter.wait()
+            try:
+                content = self.generate(record)
+            except Exception as e:
+                error = describe_error(e)
+            if content is None and error is None:
+                error = f"Failed to generate {record['kind']}"
+        return {
+            'id': record['id'],
+            'kind': record['kind'],
+            'input': record,
+            'status': 'error' if error else 'ok',
+            'content': content,
+            'error': error,
+            'elapsed': round(time.monotonic() - started, 3),
+        }
+
+    def iter_results(self, records):
+        """Yield each record's result as soon as it finishes."""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            # Run each record in a copy of the caller's context, so tokens
+            # are charged to the user who started the batch
+            futures = [pool.submit(contextvars.copy_context().run, self._process, record) for record in records]
+            try:
+                for future in as_completed(futures):
+                    yield future.result()
+            finally:
+                # The consumer stopped early; don't start what is still queued
+                for future in futures:
+                    future.cancel()
+
+    def run(self, records, output_path=None, resume=True):
+        """Process records, appending each result to output_path as JSONL.
+
+        With resume, records already written as successful to output_path are
+        skipped, so an interrupted run picks up where it stopped. Returns the
+        results produced by this run; with an output_path their content is
+        only in the file, so a long run doesn't hold every reply in memory.
+        """
+        done = load_checkpoint(output_path) if resume else set()
+        pending = [record for record in records if record['id'] not in done]
+        results = []
+        out = open(output_path, 'a' if resume else 'w', encoding='utf-8') if output_path else None
+        try:
+            for result in self.iter_results(pending):
+                if out:
+                    with self._write_lock:
+                        out.write(json.dumps(result) + '\n')
+                        out.flush()
+                    result = {key: value for key, value in result.items() if key != 'content'}
+                results.append(result)
+        finally:
+            if out:
+                out.close()
+        return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate podcast content for many topics at once.")
+    parser.add_argument('input', help="CSV or JSONL file with topic, style, duration, kind, ... columns")
+    parser.add_argument('-o', '--output', default='batch_results.jsonl', help="JSONL file for results (also the checkpoint)")
+    parser.add_argument('-w', '--workers', type=int, help="Concurrent generations")
+    parser.add_argument('--rpm', type=int, help="Maximum requests started per minute")
+    parser.add_argument('--fresh', action='store_true', help="Ignore earlier results in the output file")
+    parser.add_argument('--no-cache', action='store_true', help="Bypass the response cache")
+    args = parser.parse_args(argv)
+
+    records = load_records(args.input)
+    runner = BatchRunner(
+        PodcastContentGenerator(get_config()),
+        max_workers=args.workers,
+        requests_per_minute=args.rpm,
+        use_cache=not args.no_cache,
+    )
+    results = runner.run(records, args.output, resume=not args.fresh)
+    failed = sum(1 for result in results if result['status'] != 'ok')
+    print(f"Processed {len(results)} of {len(records)} records ({failed} failed); results in {args.output}")
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,205 @@
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from rich.console import Console
+from rich.table import Table
+from podcast_generator import load_config, set_config
+
+def _json(path, payload):
+    return lambda client, i: client.post(path, json=payload(i))
+
+def _form(path, payload):
+    return lambda client, i: client.post(path, data=payload(i))
+
+def _stream(path, payload):
+    return lambda client, i: client.post(path, json=dict(payload(i), stream=True), buffered=False)
+
+# Each target builds one request for iteration i; topics vary with i so
+# every request misses the response cache unless --repeat is given
+TARGETS = {
+    'outline': _json('/api/generate/outline', lambda i: {'topic': f'topic {i}', 'duration': 30, 'style': 'deep'}),
+    'questions': _json('/api/generate/questions', lambda i: {'topic': f'topic {i}', 'guest_expertise': 'historian', 'style': 'casual'}),
+    'title': _json('/api/generate/title', lambda i: {'topic': f'topic {i}', 'style': 'educational'}),
+    'research': _form('/generate_research', lambda i: {'topic': f'topic {i}', 'keywords': 'growth, audience', 'analysisType': 'trends'}),
+    'outline_json': _json('/api/generate/outline', lambda i: {'topic': f'topic {i}', 'duration': 30, 'style': 'deep', 'format': 'json'}),
+    'outline_stream': _stream('/api/generate/outline', lambda i: {'topic': f'topic {i}', 'duration': 30, 'style': 'deep'}),
+    'package': _json('/api/generate/package', lambda i: {'topic': f'topic {i}', 'guest_expertise': 'historian'}),
+}
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+def bench_config(args):
+    """Load config.yaml and point it at the fake backend for an offline run."""
+    config = load_config()
+    config['backend'] = {'type': 'fake', 'fake': dict((config.get('backend') or {}).get('fake') or {})}
+    config['backend']['fake'].update({
+        'latency_seconds': args.latency,
+        'latency_jitter': args.jitter,
+        'chunk_delay_seconds': args.chunk_delay,
+        'error_rate': args.error_rate,
+        'seed': args.seed,
+    })
+    # Measure the app, not the quota: no client-side rate limit or backoff
+    config['client'] = dict(config.get('client') or {}, requests_per_minute=0, backoff_base=0.01)
+    config['cache'] = {'backend': 'memory'} if args.repeat else {'backend': 'none'}
+    # Keep the write cost of the history store and documents, but not the
+    # benchmark rows; nothing from data/ is loaded into the run
+    scratch = tempfile.mkdtemp(prefix='podcast-bench-')
+    config['store'] = dict(config.get('store') or {}, path=os.path.join(scratch, 'generations.sqlite3'))
+    config['generation'] = dict(config.get('generation') or {},
+                                documents_path=os.path.join(scratch, 'documents.sqlite3'))
+    config['tokens'] = dict(config.get('tokens') or {}, quota={'enabled': False})
+    config['similarity'] = dict(config.get('similarity') or {}, enabled=False)
+    config['jobs'] = dict(config.get('jobs') or {}, enabled=False)
+    config['prefetch'] = dict(config.get('prefetch') or {}, enabled=False)
+    config['tenants'] = dict(config.get('tenants') or {}, enabled=False)
+    return config
+
+def build_app(config):
+    """Import the app with the benchmark config, so it is the only generator built."""
+    if 'app' in sys.modules:
+        raise RuntimeError("app was imported before the benchmark config was set")
+    set_config(config)
+    import app as app_module
+    return app_module.app
+
+def run_one(flask_app, target, i, repeat):
+    client = flask_app.test_client()
+    started = time.perf_counter()
+    response = TARGETS[target](client, 0 if repeat else i)
+    first_byte = None
+    for _ in response.response:
+        if first_byte is None:
+            first_byte = time.perf_counter() - started
+    elapsed = time.perf_counter() - started
+    response.close()
+    return elapsed, first_byte if first_byte is not None else elapsed, response.status_code < 400
+
+def run_level(flask_app, target, concurrency, requests, repeat, memory=False):
+    if memory:
+        gc.collect()
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda i: run_one(flask_app, target, i, repeat), range(requests)))
+    wall = time.perf_counter() - started
+    latencies = [elapsed for elapsed, _, _ in results]
+    first_bytes = [first_byte for _, first_byte, _ in results]
+    row = {
+        'target': target,
+        'concurrency': concurrency,
+        'requests': requests,
+        'errors': sum(1 for _, _, ok in results if not ok),
+        'throughput': requests / wall if wall else 0.0,
+        'p50': percentile(latencies, 0.50),
+        'p95': percentile(latencies, 0.95),
+        'p99': percentile(latencies, 0.99),
+        'ttfb_p50': percentile(first_bytes, 0.50),
+    }
+    if memory:
+        peak = tracemalloc.get_traced_memory()[1] - before
+        row['peak_kb'] = peak / 1024
+        # Roughly what each concurrent request held at the peak
+        row['kb_per_request'] = peak / 1024 / min(concurrency, requests)
+    return row
+
+def memory_report(console, limit=10):
+    """Print the source lines holding the most memory still allocated after the run."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    snapshot = tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+    ])
+    table = Table(title="Largest allocations still held after the run")
+    for column in ('source', 'KB', 'blocks'):
+        table.add_column(column, justify='left' if column == 'source' else 'right')
+    for stat in snapshot.statistics('lineno')[:limit]:
+        frame = stat.traceback[0]
+        table.add_row(f"{os.path.relpath(frame.filename, here)}:{frame.lineno}", f"{stat.size / 1024:.1f}",
+                      str(stat.count))
+    console.print(table)
+
+def compare(results, baseline_path, tolerance):
+    """Return the result rows whose p95 regressed beyond tolerance."""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {(row['target'], row['concurrency']): row for row in json.load(f)['results']}
+    regressions = []
+    for row in results:
+        before = baseline.get((row['target'], row['concurrency']))
+        if before and row['p95'] > before['p95'] * (1 + tolerance):
+            regressions.append((row, before))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Flask routes against the fake Gemini backend.")
+    parser.add_argument('--targets', default='outline,questions,title,research,outline_stream',
+                        help=f"Comma-separated targets ({', '.join(TARGETS)})")
+    parser.add_argument('--concurrency', default='1,4,16', help="Comma-separated concurrency levels")
+    parser.add_argument('--requests', type=int, default=50, help="Requests per target and level")
+    parser.add_argument('--latency', type=float, default=0.2, help="Simulated model latency in seconds")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Random +/- latency in seconds")
+    parser.add_argument('--chunk-delay', type=float, default=0.01, help="Seconds between streamed chunks")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of model calls that fail")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', action='store_true', help="Send identical requests to measure cache hits")
+    parser.add_argument('--json', help="Write results to this file")
+    parser.add_argument('--baseline', help="Fail if p95 regressed against this earlier --json file")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed p95 regression (fraction)")
+    parser.add_argument('--memory', action='store_true',
+                        help="Trace allocations: peak memory per level and the largest allocation sites "
+                             "(slows the run down)")
+    args = parser.parse_args(argv)
+
+    if args.memory:
+        tracemalloc.start()
+    flask_app = build_app(bench_config(args))
+    results = []
+    for target in args.targets.split(','):
+        for concurrency in [int(level) for level in args.concurrency.split(',')]:
+            results.append(run_level(flask_app, target, concurrency, args.requests, args.repeat, args.memory))
+
+    table = Table(title=f"Fake backend, {args.latency * 1000:.0f}ms model latency")
+    columns = ['target', 'conc', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'ttfb p50 ms', 'errors']
+    if args.memory:
+        columns += ['peak KB', 'KB/req']
+    for column in columns:
+        table.add_column(column, justify='left' if column == 'target' else 'right')
+    for row in results:
+        cells = [
+            row['target'], str(row['concurrency']), f"{row['throughput']:.1f}",
+            f"{row['p50'] * 1000:.1f}", f"{row['p95'] * 1000:.1f}", f"{row['p99'] * 1000:.1f}",
+            f"{row['ttfb_p50'] * 1000:.1f}", str(row['errors']),
+        ]
+        if args.memory:
+            cells += [f"{row['peak_kb']:.0f}", f"{row['kb_per_request']:.1f}"]
+        table.add_row(*cells)
+    console = Console()
+    console.print(table)
+    if args.memory:
+        memory_report(console)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'settings': vars(args), 'results': results}, f, indent=2)
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        for row, before in regressions:
+            console.print(f"[red]{row['target']} @ {row['concurrency']}: p95 {row['p95'] * 1000:.1f}ms "
+                          f"vs baseline {before['p95'] * 1000:.1f}ms[/red]")
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,30 @@
+import os
+import sqlite3
+import threading
+
+class LocalConnections:
+    """Connections to one SQLite file, one per thread and per process.
+
+    SQLite connections must not be shared between threads or used across a
+    fork, and the app builds its stores at import, before gunicorn forks.
+    connect() opens this thread's connection on first use in each process.
+    """
+
+    def __init__(self, path, isolation_level="", row_factory=None):
+        self.path = path
+        self.isolation_level = isolation_level
+        self.row_factory = row_factory
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+
+    def connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=self.isolation_level)
+            if self.row_factory is not None:
+                conn.row_factory = self.row_factory
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
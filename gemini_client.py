@@ -0,0 +1,256 @@
+import inspect
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+import metrics
+from limits import describe_error
+
+# HTTP status codes that signal a transient problem worth retrying
+RETRYABLE_CODES = {429, 500, 502, 503, 504}
+
+class RateLimitTimeout(Exception):
+    """No request slot became free before the call's deadline."""
+
+class CircuitOpenError(Exception):
+    """The circuit breaker is open, so the call was not attempted."""
+
+class DeadlineExceeded(Exception):
+    """The call, including retries, ran past its deadline."""
+
+def is_retryable(error):
+    """Return True for quota, overload and transient network errors."""
+    code = getattr(error, 'code', None)
+    if callable(code):
+        # grpc errors expose the status as a method
+        code = getattr(code(), 'value', (None,))[0]
+        return code in (4, 8, 13, 14)  # DEADLINE_EXCEEDED, RESOURCE_EXHAUSTED, INTERNAL, UNAVAILABLE
+    if isinstance(code, int):
+        return code in RETRYABLE_CODES
+    return isinstance(error, (ConnectionError, TimeoutError))
+
+class TokenBucket:
+    """Token bucket refilled at `rate` tokens per second up to `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, deadline=None):
+        """Take one token, waiting for a refill if needed.
+
+        Raises RateLimitTimeout if the token would not arrive before deadline
+        (a time.monotonic() value).
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                raise RateLimitTimeout("Rate limit wait would exceed the call deadline")
+            time.sleep(wait)
+
+class CircuitBreaker:
+    """Fails fast after repeated retryable failures, then lets one trial through."""
+
+    def __init__(self, failure_threshold=5, reset_seconds=30):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return 'half-open'
+        return 'open'
+
+    def before_call(self):
+        with self._lock:
+            state = self.state
+            if state == 'open' or (state == 'half-open' and self._trial_running):
+                raise CircuitOpenError("Gemini circuit breaker is open; try again shortly")
+            if state == 'half-open':
+                self._trial_running = True
+
+    def cancel_trial(self):
+        """Give back a half-open trial that never reached the model."""
+        with self._lock:
+            self._trial_running = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                self.opened_at = time.monotonic()
+
+def takes_request_options(model):
+    """Return True if the model's generate_content() accepts request_options."""
+    try:
+        return 'request_options' in inspect.signature(model.generate_content).parameters
+    except (AttributeError, TypeError, ValueError):
+        return False
+
+class GeminiClient:
+    """Wraps a GenerativeModel with rate limiting, retries and a circuit breaker.
+
+    It exposes the same generate_content() call as the model, so the
+    generator can use it in place of the model. The deadline covers the
+    whole call: waiting for a rate-limit token, every attempt and the
+    backoff sleeps between them.
+
+    A call that passes its deadline raises DeadlineExceeded at once, but a
+    running request can't be cancelled. Models that take request_options
+    (newer SDKs and the fake backend) get the time left as the request's
+    timeout, so the request ends at the deadline too. With the SDK pinned in
+    requirements.txt (0.3.x), which has no per-request timeout, a timed-out
+    request keeps its `max_in_flight` thread until the API answers.
+    """
+
+    def __init__(self, model, config=None):
+        client_config = (config or {}).get('client') or {}
+        self.model = model
+        rpm = client_config.get('requests_per_minute', 60)
+        self.bucket = TokenBucket(rpm / 60.0, client_config.get('burst', 10)) if rpm else None
+        self.breaker = CircuitBreaker(
+            client_config.get('circuit_failure_threshold', 5),
+            client_config.get('circuit_reset_seconds', 30),
+        )
+        self.max_retries = client_config.get('max_retries', 4)
+        self.backoff_base = client_config.get('backoff_base', 1.0)
+        self.backoff_max = client_config.get('backoff_max', 30.0)
+        self.deadline_seconds = client_config.get('deadline_seconds', 120)
+        self.retries = 0
+        self._request_timeouts = takes_request_options(model)
+        self._executor = ThreadPoolExecutor(
+            max_workers=client_config.get('max_in_flight', 32),
+            thread_name_prefix='gemini-call',
+        )
+
+    @property
+    def model_name(self):
+        return getattr(self.model, 'model_name', None)
+
+    def _backoff(self, attempt):
+        # Full jitter: a random wait between zero and the exponential cap
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _call(self, deadline, prompt, kwargs):
+        if deadline is None:
+            return self.model.generate_content(prompt, **kwargs)
+        if self._request_timeouts:
+            # future.cancel() can't stop a request that is already running, so
+            # the SDK's own timeout bounds it to the deadline as well
+            options = dict(kwargs.get('request_options') or {})
+            options.setdefault('timeout', max(0.001, deadline - time.monotonic()))
+            kwargs = dict(kwargs, request_options=options)
+        future = self._executor.submit(self.model.generate_content, prompt, **kwargs)
+        try:
+            return future.result(timeout=max(0, deadline - time.monotonic()))
+        except FutureTimeout:
+            future.cancel()
+            raise DeadlineExceeded(f"Gemini call exceeded its {self.deadline_seconds}s deadline") from None
+
+    def generate_content(self, prompt, **kwargs):
+        deadline = time.monotonic() + self.deadline_seconds if self.deadline_seconds else None
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            if self.bucket:
+                try:
+                    self.bucket.acquire(deadline)
+                except RateLimitTimeout:
+                    # Nothing was learned about the service; let another call try
+                    self.breaker.cancel_trial()
+                    raise
+            try:
+                response = self._call(deadline, prompt, kwargs)
+            except DeadlineExceeded:
+                self.breaker.record_failure()
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    # The request itself was bad; the service is fine
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                if deadline is not None and time.monotonic() + delay > deadline:
+                    raise
+                attempt += 1
+                self.retries += 1
+                metrics.MODEL_RETRIES.inc()
+                print(f"Retrying Gemini call in {delay:.1f}s after error: {describe_error(e)}")
+                time.sleep(delay)
+                continue
+            self.breaker.record_success()
+            return response
+
+class KeyPool:
+    """Spreads one model's calls across clients holding different API keys.
+
+    Each key has its own client, so its own rate limit and circuit
+    breaker. A call goes to the key with the fewest calls in flight,
+    skipping keys whose breaker is open, with ties taken in turn; a key
+    that fails fast with an open breaker hands the call to the next.
+    """
+
+    def __init__(self, clients):
+        self.clients = list(clients)
+        self._in_flight = [0] * len(self.clients)
+        self._next = 0
+        self._lock = threading.Lock()
+
+    @property
+    def model_name(self):
+        return self.clients[0].model_name
+
+    @property
+    def retries(self):
+        return sum(client.retries for client in self.clients)
+
+    def _order(self):
+        count = len(self.clients)
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % count
+            return sorted(range(count), key=lambda i: (
+                self.clients[i].breaker.state == 'open', self._in_flight[i], (i - start) % count))
+
+    def generate_content(self, prompt, **kwargs):
+        order = self._order()
+        for position, index in enumerate(order):
+            with self._lock:
+                self._in_flight[index] += 1
+            try:
+                return self.clients[index].generate_content(prompt, **kwargs)
+            except CircuitOpenError:
+                if position == len(order) - 1:
+                    raise
+            finally:
+                with self._lock:
+                    self._in_flight[index] -= 1
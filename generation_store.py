@@ -0,0 +1,187 @@
+import json
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from db import LocalConnections
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS generations (
+    id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL,
+    method TEXT NOT NULL,
+    topic TEXT,
+    style TEXT,
+    analysis_type TEXT,
+    inputs TEXT NOT NULL,
+    prompt TEXT NOT NULL,
+    output TEXT,
+    model TEXT,
+    generation_config TEXT,
+    latency REAL,
+    prompt_tokens INTEGER,
+    output_tokens INTEGER,
+    source TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS generations_method ON generations (method, created_at);
+CREATE INDEX IF NOT EXISTS generations_topic ON generations (topic COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS generations_style ON generations (style);
+CREATE INDEX IF NOT EXISTS generations_analysis_type ON generations (analysis_type);
+CREATE VIRTUAL TABLE IF NOT EXISTS generations_fts USING fts5(
+    topic, inputs, output, content='generations', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS generations_ai AFTER INSERT ON generations BEGIN
+    INSERT INTO generations_fts (rowid, topic, inputs, output)
+    VALUES (new.id, new.topic, new.inputs, new.output);
+END;
+CREATE TRIGGER IF NOT EXISTS generations_ad AFTER DELETE ON generations BEGIN
+    INSERT INTO generations_fts (generations_fts, rowid, topic, inputs, output)
+    VALUES ('delete', old.id, old.topic, old.inputs, old.output);
+END;
+"""
+
+SUMMARY_COLUMNS = ("id, created_at, method, topic, style, analysis_type, model, latency, "
+                   "prompt_tokens, output_tokens, source")
+
+def fts_query(text):
+    """Quote each word so user input can't break FTS5 query syntax."""
+    words = re.findall(r"\w+", text)
+    return " ".join(f'"{word}"' for word in words)
+
+class GenerationStore:
+    """SQLite record of every generation, with full-text search.
+
+    Writes go through a queue to a background thread so requests never wait
+    on the disk; call flush() to wait for pending writes. The thread and
+    the connections are created on first use in each process, so a store
+    built before gunicorn forks works in every worker.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._db = LocalConnections(path, row_factory=sqlite3.Row)
+        self._writer_pid = None
+        self._start_lock = threading.Lock()
+        self._queue = queue.Queue()
+        conn = self._db.connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        conn.commit()
+
+    def _start_writer(self):
+        """Start this process's writer thread; threads don't survive a fork."""
+        pid = os.getpid()
+        if self._writer_pid == pid:
+            return
+        with self._start_lock:
+            if self._writer_pid == pid:
+                return
+            # Rows queued before a fork belong to the parent's writer
+            self._queue = queue.Queue()
+            threading.Thread(target=self._write_loop, args=(self._queue,), name="generation-store",
+                             daemon=True).start()
+            self._writer_pid = pid
+
+    def record(self, method, inputs, prompt, output, model=None, generation_config=None,
+               latency=None, prompt_tokens=None, output_tokens=None, source='model'):
+        """Queue one generation for storage."""
+        self._start_writer()
+        self._queue.put((
+            time.time(), method, inputs.get('topic'), inputs.get('style'), inputs.get('analysis_type'),
+            json.dumps(inputs, default=str), prompt, output, model,
+            json.dumps(generation_config or {}), latency, prompt_tokens, output_tokens, source,
+        ))
+
+    def _write_loop(self, rows_queue):
+        conn = self._db.connect()
+        while True:
+            rows = [rows_queue.get()]
+            # Write whatever else is already waiting in the same transaction
+            while True:
+                try:
+                    rows.append(rows_queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                conn.executemany(
+                    "INSERT INTO generations (created_at, method, topic, style, analysis_type, inputs, "
+                    "prompt, output, model, generation_config, latency, prompt_tokens, output_tokens, source) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                conn.commit()
+            except Exception as e:
+                print(f"Error writing generation records: {str(e)}")
+            finally:
+                for _ in rows:
+                    rows_queue.task_done()
+
+    def flush(self):
+        self._queue.join()
+
+    def search(self, q=None, method=None, topic=None, style=None, analysis_type=None,
+               source=None, limit=20, offset=0):
+        """Find past generations, newest first.
+
+        q is matched against topic, inputs and output text; topic is a
+        full-text match on the topic alone. The other filters are exact.
+        """
+        clauses, params = [], []
+        match = []
+        if q and fts_query(q):
+            match.append(fts_query(q))
+        if topic and fts_query(topic):
+            match.append(f"topic : ({fts_query(topic)})")
+        if match:
+            clauses.append("g.id IN (SELECT rowid FROM generations_fts WHERE generations_fts MATCH ?)")
+            params.append(" AND ".join(match))
+        for column, value in (('method', method), ('style', style), ('analysis_type', analysis_type), ('source', source)):
+            if value:
+                clauses.append(f"g.{column} = ?")
+                params.append(value)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = (f"SELECT {', '.join('g.' + c.strip() for c in SUMMARY_COLUMNS.split(','))}, "
+               f"substr(g.output, 1, 200) AS preview FROM generations g {where} "
+               f"ORDER BY g.created_at DESC LIMIT ? OFFSET ?")
+        rows = self._db.connect().execute(sql, params + [limit, offset]).fetchall()
+        return [dict(row) for row in rows]
+
+    def get(self, generation_id):
+        row = self._db.connect().execute("SELECT * FROM generations WHERE id = ?", (generation_id,)).fetchone()
+        if row is None:
+            return None
+        record = dict(row)
+        record['inputs'] = json.loads(record['inputs'])
+        record['generation_config'] = json.loads(record['generation_config'] or '{}')
+        return record
+
+    def recent_outputs(self, methods, limit=5000):
+        """Return (method, inputs, output) for the latest successful model calls, oldest first."""
+        methods = list(methods)
+        if not methods:
+            return []
+        placeholders = ", ".join("?" for _ in methods)
+        rows = self._db.connect().execute(
+            f"SELECT method, inputs, output FROM generations WHERE source = 'model' AND output IS NOT NULL "
+            f"AND method IN ({placeholders}) ORDER BY id DESC LIMIT ?",
+            methods + [limit],
+        ).fetchall()
+        return [(row['method'], json.loads(row['inputs']), row['output']) for row in reversed(rows)]
+
+    def stats(self):
+        """Call counts, tokens and latency per method and source."""
+        rows = self._db.connect().execute(
+            "SELECT method, source, COUNT(*) AS calls, SUM(prompt_tokens) AS prompt_tokens, "
+            "SUM(output_tokens) AS output_tokens, AVG(latency) AS avg_latency "
+            "FROM generations GROUP BY method, source ORDER BY method, source"
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+def create_store(config):
+    """Build the generation store from the `store` config section, or None."""
+    store_config = config.get('store') or {}
+    if not store_config.get('enabled', False):
+        return None
+    return GenerationStore(store_config.get('path', 'data/generations.sqlite3'))
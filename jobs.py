@@ -0,0 +1,300 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+import requests
+from batch import BatchRunner, normalize_record, validate_record
+import token_budget
+from limits import describe_error
+from db import LocalConnections
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    input TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    use_cache INTEGER NOT NULL DEFAULT 1,
+    webhook TEXT,
+    user TEXT,
+    result TEXT,
+    error TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    worker_pid INTEGER,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority DESC, created_at);
+"""
+
+FINISHED = ('done', 'failed', 'cancelled')
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+class JobQueue:
+    """Persistent priority queue of generation jobs, run by a thread pool.
+
+    Jobs live in SQLite, so queued work survives a restart and every worker
+    process on the host can claim from the same queue. Each process runs
+    its own pool of `workers` threads; higher priority runs first, then
+    oldest first.
+
+    Each job belongs to the user who submitted it; passing `user` to
+    get(), list_jobs(), cancel() and wait() limits them to that user's
+    jobs. Webhooks may only go to hosts in `webhook_hosts`.
+    """
+
+    def __init__(self, generator, path, workers=4, poll_interval=2.0, webhook_timeout=10, webhook_attempts=3,
+                 webhook_hosts=()):
+        self.generator = generator
+        self.path = path
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.webhook_timeout = webhook_timeout
+        self.webhook_attempts = webhook_attempts
+        self.webhook_hosts = {host.lower() for host in webhook_hosts}
+        self._db = LocalConnections(path, isolation_level=None, row_factory=sqlite3.Row)
+        self._changed = threading.Condition()
+        self._started_pid = None
+        self._stopping = False
+        with self._db.connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            columns = [row['name'] for row in conn.execute("PRAGMA table_info(jobs)")]
+            if 'user' not in columns:
+                # Queues created before jobs were charged to their submitter
+                conn.execute("ALTER TABLE jobs ADD COLUMN user TEXT")
+
+    @classmethod
+    def from_config(cls, generator, config):
+        jobs_config = config.get('jobs') or {}
+        return cls(
+            generator,
+            jobs_config.get('path', 'data/jobs.sqlite3'),
+            workers=jobs_config.get('workers', 4),
+            poll_interval=jobs_config.get('poll_interval', 2.0),
+            webhook_timeout=jobs_config.get('webhook_timeout', 10),
+            webhook_attempts=jobs_config.get('webhook_attempts', 3),
+            webhook_hosts=jobs_config.get('webhook_hosts') or (),
+        )
+
+    def start(self):
+        """Start this process's worker threads; safe to call repeatedly and after fork."""
+        pid = os.getpid()
+        if self._started_pid == pid:
+            return
+        with self._changed:
+            if self._started_pid == pid:
+                return
+            self._started_pid = pid
+            self._stopping = False
+            self._recover()
+            for i in range(self.workers):
+                threading.Thread(target=self._work_loop, name=f"job-worker-{i}", daemon=True).start()
+
+    def stop(self):
+        with self._changed:
+            self._stopping = True
+            self._changed.notify_all()
+
+    def _recover(self):
+        """Requeue jobs left running by a process that no longer exists."""
+        conn = self._db.connect()
+        rows = conn.execute("SELECT id, worker_pid FROM jobs WHERE status = 'running'").fetchall()
+        for row in rows:
+            if row['worker_pid'] is None or not _pid_alive(row['worker_pid']):
+                conn.execute("UPDATE jobs SET status = 'queued', worker_pid = NULL, started_at = NULL "
+                             "WHERE id = ? AND status = 'running'", (row['id'],))
+
+    def submit(self, record, priority=0, webhook=None, use_cache=True):
+        """Queue one batch-style record; returns the job dict.
+
+        Raises ValueError for a record that could never succeed, so the
+        caller can reject it up front.
+        """
+        record = normalize_record(record, 0)
+        record.pop('id')
+        error = validate_record(record, self.generator.config)
+        if error:
+            raise ValueError(error)
+        if webhook:
+            self._check_webhook(webhook)
+        job_id = uuid.uuid4().hex
+        self._db.connect().execute(
+            "INSERT INTO jobs (id, kind, input, priority, status, use_cache, webhook, user, created_at) "
+            "VALUES (?, ?, ?, ?, 'queued', ?, ?, ?, ?)",
+            (job_id, record['kind'], json.dumps(record), int(priority), int(bool(use_cache)), webhook,
+             token_budget.current_user(), time.time()),
+        )
+        self.start()
+        self._notify()
+        return self.get(job_id)
+
+    def _check_webhook(self, url):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise ValueError('Webhook must be an http(s) URL')
+        # Otherwise any caller could make the server post to internal addresses
+        if parts.hostname.lower() not in self.webhook_hosts:
+            raise ValueError(f'Webhook host is not allowed: {parts.hostname}')
+
+    def get(self, job_id, user=None):
+        """Return the job dict, or None for an unknown id or another user's job."""
+        if user is None:
+            row = self._db.connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        else:
+            row = self._db.connect().execute("SELECT * FROM jobs WHERE id = ? AND user = ?", (job_id, user)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list_jobs(self, status=None, limit=50, user=None):
+        clauses, params = [], []
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if user is not None:
+            clauses.append("user = ?")
+            params.append(user)
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+        rows = self._db.connect().execute(f"SELECT * FROM jobs {where}ORDER BY created_at DESC LIMIT ?", params + [limit])
+        return [self._to_dict(row, include_result=False) for row in rows.fetchall()]
+
+    def cancel(self, job_id, user=None):
+        """Cancel a queued job now, or a running one once its model call returns.
+
+        Returns the job dict, or None for an unknown id or another user's job.
+        """
+        if self.get(job_id, user) is None:
+            return None
+        conn = self._db.connect()
+        conn.execute("UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status = 'queued'",
+                     (time.time(), job_id))
+        conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,))
+        self._notify()
+        return self.get(job_id)
+
+    def wait(self, job_id, last_status=None, timeout=30, user=None):
+        """Block until the job's status differs from last_status, or timeout.
+
+        Changes made in this process wake the caller at once; changes made
+        by other processes are picked up every poll_interval.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id, user)
+            remaining = deadline - time.monotonic()
+            if job is None or job['status'] != last_status or remaining <= 0:
+                return job
+            with self._changed:
+                self._changed.wait(min(remaining, self.poll_interval))
+
+    def _notify(self):
+        with self._changed:
+            self._changed.notify_all()
+
+    def _claim(self):
+        """Atomically take the highest-priority queued job, or return None."""
+        conn = self._db.connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' ORDER BY priority DESC, created_at LIMIT 1"
+            ).fetchone()
+            if row is not None:
+                conn.execute("UPDATE jobs SET status = 'running', started_at = ?, worker_pid = ? WHERE id = ?",
+                             (time.time(), os.getpid(), row['id']))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return row
+
+    def _work_loop(self):
+        while not self._stopping:
+            try:
+                row = self._claim()
+            except Exception as e:
+                print(f"Error claiming job: {str(e)}")
+                row = None
+            if row is None:
+                with self._changed:
+                    if not self._stopping:
+                        self._changed.wait(self.poll_interval)
+                continue
+            self._run(row)
+
+    def _run(self, row):
+        record = dict(json.loads(row['input']), id=row['id'])
+        runner = BatchRunner(self.generator, max_workers=1, requests_per_minute=0, use_cache=bool(row['use_cache']))
+        content, error = None, None
+        # Charge the job's tokens to whoever submitted it
+        token_budget.set_user(row['user'])
+        try:
+            content = runner.generate(record)
+            if content is None:
+                error = f"Failed to generate {record['kind']}"
+        except Exception as e:
+            error = describe_error(e)
+
+        conn = self._db.connect()
+        cancelled = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (row['id'],)).fetchone()[0]
+        if cancelled:
+            status, content, error = 'cancelled', None, None
+        else:
+            status = 'failed' if error else 'done'
+        conn.execute("UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+                     (status, content, error, time.time(), row['id']))
+        self._notify()
+        if row['webhook'] and status != 'cancelled':
+            self._send_webhook(row['webhook'], self.get(row['id']))
+
+    def _send_webhook(self, url, job):
+        for attempt in range(self.webhook_attempts):
+            try:
+                # A redirect could lead off the allowed hosts
+                response = requests.post(url, json=job, timeout=self.webhook_timeout, allow_redirects=False)
+                if response.status_code < 500:
+                    return
+            except requests.RequestException as e:
+                print(f"Error calling webhook for job {job['id']}: {str(e)}")
+            time.sleep(2 ** attempt)
+        print(f"Giving up on webhook for job {job['id']}")
+
+    def _to_dict(self, row, include_result=True):
+        job = {
+            'id': row['id'],
+            'kind': row['kind'],
+            'input': json.loads(row['input']),
+            'priority': row['priority'],
+            'status': row['status'],
+            'error': row['error'],
+            'created_at': row['created_at'],
+            'started_at': row['started_at'],
+            'finished_at': row['finished_at'],
+        }
+        if include_result:
+            job['result'] = row['result']
+        if row['status'] == 'queued':
+            job['position'] = self._db.connect().execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND "
+                "(priority > ? OR (priority = ? AND created_at < ?))",
+                (row['priority'], row['priority'], row['created_at']),
+            ).fetchone()[0]
+        return job
+
+def create_job_queue(generator, config):
+    """Build the background job queue from the `jobs` config section, or None."""
+    if not (config.get('jobs') or {}).get('enabled', False):
+        return None
+    return JobQueue.from_config(generator, config)
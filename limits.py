@@ -0,0 +1,38 @@
+DEFAULT_FIELD_CHARS = {
+    'topic': 500,
+    'keywords': 1000,
+    'guest_expertise': 300,
+}
+
+# Longest error message kept in logs, responses and job records
+MAX_ERROR_CHARS = 500
+
+def field_limits(config=None):
+    """Return the longest accepted text input per field, from `limits.max_field_chars`."""
+    configured = ((config or {}).get('limits') or {}).get('max_field_chars') or {}
+    return dict(DEFAULT_FIELD_CHARS, **configured)
+
+def field_error(values, config=None):
+    """Return an error message for the first text input over its size limit, or None.
+
+    Every input ends up in a prompt, and the prompt, the reply and their
+    copies live for the whole request, so the inputs bound its memory.
+    """
+    for name, limit in field_limits(config).items():
+        value = values.get(name)
+        if value is not None and len(str(value)) > limit:
+            return f"{name} must be at most {limit} characters"
+    return None
+
+def describe_error(error, limit=MAX_ERROR_CHARS):
+    """Describe an exception in at most `limit` characters.
+
+    API errors can quote the whole request back; a short message is all
+    anyone reads, and the full text would be kept by every log line, job
+    row and error page that repeats it.
+    """
+    text = str(error)
+    if len(text) <= limit:
+        return text
+    suffix = f"... ({len(text)} chars)"
+    return text[:limit - len(suffix)] + suffix
@@ -0,0 +1,167 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from token_budget import count_tokens
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    body = ",".join(f'{name}="{_escape(value)}"' for name, value in pairs)
+    return "{" + body + "}"
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels.get(name, "") for name in self.labelnames), 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}_total{_format_labels(self.labelnames, key)} {value}"
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', le)])} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}"
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Render all metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            name = metric.name + ("_total" if metric.kind == "counter" else "")
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+MODEL_LATENCY = REGISTRY.histogram(
+    "podcast_model_latency_seconds", "Time spent waiting on the model", ["method", "model"])
+FORMAT_LATENCY = REGISTRY.histogram(
+    "podcast_format_seconds", "Time spent formatting model output", ["method"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1))
+PROMPT_TOKENS = REGISTRY.counter(
+    "podcast_prompt_tokens", "Prompt tokens sent to the model", ["method"])
+OUTPUT_TOKENS = REGISTRY.counter(
+    "podcast_output_tokens", "Output tokens received from the model", ["method"])
+CACHE_REQUESTS = REGISTRY.counter(
+    "podcast_cache_requests", "Response cache lookups", ["method", "result"])
+SIMILAR_HITS = REGISTRY.counter(
+    "podcast_similar_hits", "Requests served by a reply for near-identical inputs", ["method"])
+COALESCED_REQUESTS = REGISTRY.counter(
+    "podcast_coalesced_requests", "Requests served by an identical in-flight call", ["method"])
+MODEL_RETRIES = REGISTRY.counter(
+    "podcast_model_retries", "Model calls retried after a transient error")
+MODEL_ESCALATIONS = REGISTRY.counter(
+    "podcast_model_escalations", "Cascade steps that failed a check or errored and moved to the next model",
+    ["method", "model"])
+MODEL_ERRORS = REGISTRY.counter(
+    "podcast_model_errors", "Failed model calls by error type", ["method", "error"])
+SCHEDULER_WAIT = REGISTRY.histogram(
+    "podcast_scheduler_wait_seconds", "Time model calls waited for a fair-queueing slot", ["tenant"])
+HTTP_LATENCY = REGISTRY.histogram(
+    "podcast_http_request_seconds", "HTTP request latency", ["endpoint", "status"])
+
+def estimate_tokens(text):
+    """Local token count for when the API gives none."""
+    return count_tokens(text)
+
+def response_token_counts(response, prompt, text):
+    """Return (prompt_tokens, output_tokens), preferring the API's usage data."""
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is not None and getattr(usage, 'prompt_token_count', None):
+        return usage.prompt_token_count, usage.candidates_token_count
+    return estimate_tokens(prompt), estimate_tokens(text)
+
+# Per-request timings, reported back to the client in the Server-Timing header
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+def start_request_timings():
+    _request_timings.set({})
+
+def request_timings():
+    return _request_timings.get() or {}
+
+def record_timing(name, seconds):
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+@contextmanager
+def timed(histogram, timing_name=None, **labels):
+    """Observe the block's duration, and add it to the request's timings."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        histogram.observe(elapsed, **labels)
+        if timing_name:
+            record_timing(timing_name, elapsed)
@@ -0,0 +1,97 @@
+import re
+import structured
+
+QUESTION_SECTIONS = ('Opening Questions', 'Main Discussion', 'Lightning Round', 'Closing Questions')
+
+def _headings(text, level):
+    return re.findall(rf"^{'#' * level}\s+(.+)$", text, re.MULTILINE)
+
+def _missing(text, required):
+    lowered = text.lower()
+    return [name for name in required if name.lower() not in lowered]
+
+def check_outline(text, inputs, config):
+    problems = []
+    structure = (config.get('podcast_templates') or {}).get(inputs.get('structure') or '') or {}
+    expected = len(structure.get('structure') or [])
+    found = len(_headings(text, 3))
+    if found < expected:
+        problems.append(f"{found} of {expected} timeline sections")
+    if 'production notes' not in text.lower():
+        problems.append("no production notes")
+    return problems
+
+def check_questions(text, inputs, config):
+    problems = [f"missing section {name}" for name in _missing(text, QUESTION_SECTIONS)]
+    if text.count('?') < 8:
+        problems.append("fewer than 8 questions")
+    return problems
+
+def check_title(text, inputs, config):
+    items = re.findall(r"^\s*(?:\d+[.)]|[-*•]|#+)\s+\S", text, re.MULTILINE)
+    return [] if len(items) >= 5 else ["fewer than 5 title entries"]
+
+def check_research(text, inputs, config):
+    required = structured.RESEARCH_SECTIONS.get(inputs.get('analysis_type'), [])
+    return [f"missing section {name}" for name in _missing(text, required)]
+
+# Structural checks that decide whether a cascade escalates; each returns a
+# list of problems, empty when the reply is usable
+CHECKS = {
+    'outline': check_outline,
+    'questions': check_questions,
+    'title': check_title,
+    'research': check_research,
+}
+
+class ModelRouter:
+    """Picks the model cascade for a request from the `routing` config.
+
+    Each rule matches on method, style, analysis type, structure and a
+    duration range; the first matching rule's `models` list is tried in
+    order, moving to the next model when a reply fails the method's
+    structural check or the call errors. Requests no rule matches use
+    `routing.default`.
+    """
+
+    def __init__(self, config, default_model):
+        routing = config.get('routing') or {}
+        self.config = config
+        self.enabled = routing.get('enabled', False)
+        self.default = list(routing.get('default') or [default_model])
+        self.rules = routing.get('routes') or []
+
+    def _matches(self, match, method, inputs):
+        for key, expected in match.items():
+            if key in ('min_duration', 'max_duration'):
+                try:
+                    duration = int(inputs.get('duration'))
+                except (TypeError, ValueError):
+                    return False
+                if key == 'min_duration' and duration < expected:
+                    return False
+                if key == 'max_duration' and duration > expected:
+                    return False
+                continue
+            actual = method if key == 'method' else inputs.get(key)
+            allowed = expected if isinstance(expected, list) else [expected]
+            if actual not in allowed:
+                return False
+        return True
+
+    def route(self, method, inputs=None):
+        """Return the ordered list of model names to try."""
+        if not self.enabled:
+            return self.default[:1]
+        inputs = inputs or {}
+        for rule in self.rules:
+            if self._matches(rule.get('match') or {}, method, inputs):
+                return list(rule['models'])
+        return self.default
+
+    def check(self, method, text, inputs=None):
+        """Return the structural problems with a reply; empty means keep it."""
+        if not text or not text.strip():
+            return ["empty reply"]
+        check = CHECKS.get(method)
+        return check(text, inputs or {}, self.config) if check else []
@@ -0,0 +1,187 @@
+import contextvars
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import yaml
+from limits import describe_error
+from validation import validate_request
+from token_budget import count_tokens
+
+METHODS = ('research', 'outline', 'questions', 'title')
+
+# Request values each method needs
+REQUIRED_INPUTS = {
+    'research': ('topic',),
+    'outline': ('topic',),
+    'questions': ('topic', 'guest_expertise'),
+    'title': ('topic',),
+}
+
+_KEY_LINE = re.compile(r"^(#{1,6}\s|[-*•]\s|\d+[.)]\s)")
+
+def summarize(text, max_tokens=300):
+    """Condense a stage's markdown to its headings and list items, within max_tokens.
+
+    Extractive, so it costs no model call: structural lines are kept in
+    document order until the budget is spent. Text without any falls back
+    to its opening words.
+    """
+    lines = []
+    used = 0
+    for line in text.splitlines():
+        line = line.strip()
+        if not _KEY_LINE.match(line):
+            continue
+        line = re.sub(r"[*_`]+", "", line).strip()
+        tokens = count_tokens(line)
+        if used + tokens > max_tokens:
+            break
+        lines.append(line)
+        used += tokens
+    if lines:
+        return "\n".join(lines)
+    words = []
+    for word in text.split():
+        used += count_tokens(word)
+        if used > max_tokens:
+            break
+        words.append(word)
+    return " ".join(words)
+
+class Stage:
+    def __init__(self, name, method, after=(), inputs=None):
+        self.name = name
+        self.method = method
+        self.after = list(after)
+        self.inputs = dict(inputs or {})
+
+class Pipeline:
+    """A DAG of generator stages, where each stage sees summaries of the ones it runs after.
+
+    Stages whose dependencies have finished run in parallel. Each stage's
+    prompt is its method's usual prompt plus the summaries of its `after`
+    stages, so rerunning a pipeline serves every stage whose inputs and
+    upstream replies are unchanged from the response cache; only changed
+    stages and the stages downstream of them go to the model.
+    """
+
+    def __init__(self, name, stages, summary_tokens=300):
+        self.name = name
+        self.stages = {stage.name: stage for stage in stages}
+        self.summary_tokens = summary_tokens
+        self.order = self._validate()
+
+    @classmethod
+    def from_dict(cls, name, definition):
+        stages = [
+            Stage(stage_name, spec.get('method', stage_name), spec.get('after') or [], spec.get('inputs'))
+            for stage_name, spec in (definition.get('stages') or {}).items()
+        ]
+        return cls(name, stages, definition.get('summary_tokens', 300))
+
+    def _validate(self):
+        """Check methods and dependencies; return the stage names in dependency order."""
+        if not self.stages:
+            raise ValueError(f"Pipeline '{self.name}' has no stages")
+        for stage in self.stages.values():
+            if stage.method not in METHODS:
+                raise ValueError(f"Pipeline '{self.name}' stage '{stage.name}' has unknown method: {stage.method}")
+            for dependency in stage.after:
+                if dependency not in self.stages:
+                    raise ValueError(f"Pipeline '{self.name}' stage '{stage.name}' runs after unknown stage: "
+                                     f"{dependency}")
+        order = []
+        remaining = dict(self.stages)
+        while remaining:
+            ready = [name for name, stage in remaining.items() if all(dep in order for dep in stage.after)]
+            if not ready:
+                raise ValueError(f"Pipeline '{self.name}' has a dependency cycle among: {', '.join(remaining)}")
+            for name in ready:
+                order.append(name)
+                del remaining[name]
+        return order
+
+    def missing_inputs(self, values):
+        """Return the request values some stage needs but didn't get."""
+        missing = []
+        for stage in self.stages.values():
+            for name in REQUIRED_INPUTS[stage.method]:
+                if not stage.inputs.get(name) and not values.get(name) and name not in missing:
+                    missing.append(name)
+        return missing
+
+    def describe(self):
+        return {
+            'name': self.name,
+            'summary_tokens': self.summary_tokens,
+            'stages': [{'name': name, 'method': self.stages[name].method, 'after': self.stages[name].after}
+                       for name in self.order],
+        }
+
+    def _context(self, stage, results):
+        parts = [f"{dependency} ({self.stages[dependency].method}):\n{results[dependency]['summary']}"
+                 for dependency in stage.after]
+        return "\n\n".join(parts) or None
+
+    def _run_stage(self, generator, stage, values, context, use_cache):
+        result = {'method': stage.method, 'status': 'ok', 'cached': False}
+        started = time.perf_counter()
+        try:
+            # The stage's own inputs haven't been checked like the request's were
+            inputs = dict(values, **stage.inputs)
+            if stage.method == 'research':
+                inputs.setdefault('keywords', inputs.get('topic'))
+            inputs = validate_request(stage.method, inputs, generator.config)
+            text, source = generator.generate_stage(stage.method, inputs, context, use_cache)
+            result.update(cached=source in ('cache', 'similar'), source=source)
+            if not text:
+                result.update(status='error', error='No content generated')
+            else:
+                result.update(output=text, summary=summarize(text, self.summary_tokens))
+        except Exception as e:
+            print(f"Error in pipeline stage {stage.name}: {describe_error(e)}")
+            result.update(status='error', error=describe_error(e))
+        result['seconds'] = round(time.perf_counter() - started, 3)
+        return result
+
+    def run(self, generator, values, use_cache=True, max_workers=4):
+        """Run every stage; returns {stage name: result}, in dependency order.
+
+        A stage whose dependency failed is skipped.
+        """
+        results = {}
+        running = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            while len(results) < len(self.stages):
+                for name in self.order:
+                    stage = self.stages[name]
+                    if name in results or name in running.values():
+                        continue
+                    if any(results.get(dep, {}).get('status') in ('error', 'skipped') for dep in stage.after):
+                        results[name] = {'method': stage.method, 'status': 'skipped',
+                                         'error': 'An earlier stage failed'}
+                    elif all(dep in results for dep in stage.after):
+                        # Each stage runs in a copy of the caller's context, so tokens
+                        # are charged to whoever started the pipeline
+                        future = pool.submit(contextvars.copy_context().run, self._run_stage, generator, stage,
+                                             values, self._context(stage, results), use_cache)
+                        running[future] = name
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[running.pop(future)] = future.result()
+        return {name: results[name] for name in self.order}
+
+def load_pipelines(path):
+    """Read and validate the pipeline definitions in a YAML file; {} when it doesn't exist."""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        definitions = yaml.safe_load(f) or {}
+    return {name: Pipeline.from_dict(name, definition) for name, definition in definitions.items()}
+
+def create_pipelines(config):
+    """Load the pipelines named by `pipelines.path`."""
+    return load_pipelines((config.get('pipelines') or {}).get('path', 'pipelines.yaml'))
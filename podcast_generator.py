@@ -1,45 +1,453 @@
+import hashlib
+import json
 import os
-import google.generativeai as genai
+import textwrap
+import threading
+import time
+from contextlib import contextmanager
+from functools import partial
 import yaml
 from rich.console import Console
 from rich.panel import Panel
 from rich.markdown import Markdown
 from rich.table import Table
 from datetime import datetime
+from markupsafe import escape
+from response_cache import create_cache, make_cache_key
+from generation_store import create_store
+from similarity import create_similarity_index
+from prompt_templates import PromptRegistry
+from gemini_client import GeminiClient, KeyPool
+from backends import create_model
+from model_router import ModelRouter
+from rendering import FragmentRenderer
+from limits import describe_error
+from singleflight import SingleFlight
+import metrics
+import token_budget
+import tenants
+import structured
+import sections
+
+MODEL_NAME = 'models/gemini-1.5-flash'
+
+ANALYSIS_TYPES = ('trends', 'competitors', 'audience', 'gaps')
+
+# Separates a streamed page preview from the sanitized rendering that replaces it
+RENDERED_MARKER = '<!--rendered-->'
+
+_config = None
+_configured = False
+_models = {}
+_clients = {}
+_setup_lock = threading.Lock()
 
 def load_config():
     """Load configuration from YAML file."""
-    with open("config.yaml", "r") as f:
+    with open("config.yaml", "r", encoding="utf-8") as f:
         return yaml.safe_load(f)
 
-# Load configuration
-config = load_config()
+def get_config():
+    """Return the process-wide configuration, loading it on first use."""
+    global _config
+    if _config is None:
+        with _setup_lock:
+            if _config is None:
+                _config = load_config()
+    return _config
+
+def set_config(config):
+    """Use config as the process-wide configuration instead of config.yaml.
+
+    The app builds its generator, stores and queues at import, so this
+    must be called before app is first imported.
+    """
+    global _config
+    _config = config
+
+def api_keys(config):
+    """Return the Gemini API keys: `api.gemini_keys`, or the single `api.gemini_key`."""
+    api = config.get('api') or {}
+    return [key for key in api.get('gemini_keys') or [] if key] or [api.get('gemini_key')]
+
+def configure_gemini(config=None):
+    """Configure the Gemini client once per process.
 
-# Configure Gemini
-try:
-    genai.configure(api_key=config['api']['gemini_key'])
-    # List available models to ensure we're using a valid one
+    This only stores the API key; no network call is made until the first
+    generation request.
+    """
+    global _configured
+    if _configured:
+        return
+    with _setup_lock:
+        if _configured:
+            return
+        config = config or get_config()
+        # Imported here because the SDK alone takes most of a second to load
+        import google.generativeai as genai
+        try:
+            genai.configure(api_key=api_keys(config)[0])
+        except Exception as e:
+            print(f"Error configuring Gemini: {str(e)}")
+            raise
+        _configured = True
+
+def validate_model(config=None):
+    """Check that MODEL_NAME is served by the API.
+
+    This lists the available models, which is a network round-trip, so it
+    only runs when `api.validate_on_startup` is enabled or when called
+    explicitly.
+    """
+    configure_gemini(config)
+    import google.generativeai as genai
     models = [m.name for m in genai.list_models()]
     print("Available models:", models)
-    
-    # Use Gemini 1.5 Flash
-    MODEL_NAME = 'models/gemini-1.5-flash'
+    if MODEL_NAME not in models:
+        raise ValueError(f"Model {MODEL_NAME} is not available for this API key")
     print(f"Using model: {MODEL_NAME}")
-except Exception as e:
-    print(f"Error configuring Gemini: {str(e)}")
-    raise
+    return models
+
+def get_model(config=None, model_name=MODEL_NAME, api_key=None):
+    """Return the shared backend for a model, creating it on first use.
+
+    One instance per model name and API key is kept for the life of the
+    process; without a key the model uses the configured default.
+    """
+    slot = (model_name, api_key)
+    if slot not in _models:
+        config = config or get_config()
+        if (config.get('backend') or {}).get('type', 'gemini') != 'fake':
+            configure_gemini(config)
+        with _setup_lock:
+            if slot not in _models:
+                try:
+                    model = create_model(config, model_name, api_key)
+                    print(f"Successfully initialized model: {model.model_name}")
+                except Exception as e:
+                    print(f"Error initializing model: {str(e)}")
+                    raise
+                _models[slot] = model
+    return _models[slot]
+
+def get_client(config=None, model_name=MODEL_NAME):
+    """Return the shared rate-limited, retrying client around a model.
+
+    Each model gets its own client per API key, so each has its own rate
+    limit and circuit breaker, matching the API's per-key, per-model
+    quotas. With several keys in `api.gemini_keys`, a KeyPool spreads the
+    model's calls across them.
+    """
+    if model_name not in _clients:
+        config = config or get_config()
+        keys = api_keys(config)
+        if len(keys) == 1:
+            models = [get_model(config, model_name)]
+        else:
+            models = [get_model(config, model_name, key) for key in keys]
+        with _setup_lock:
+            if model_name not in _clients:
+                clients = [GeminiClient(model, config) for model in models]
+                _clients[model_name] = clients[0] if len(clients) == 1 else KeyPool(clients)
+    return _clients[model_name]
 
 class PodcastContentGenerator:
-    def __init__(self):
+    def __init__(self, config=None, cache=None, prompts=None, store=None):
         self.console = Console()
+        self.config = config or get_config()
+        self._model = None
+        self.cache = cache if cache is not None else create_cache(self.config)
+        self.prompts = prompts or PromptRegistry.from_config(self.config)
+        self.store = store if store is not None else create_store(self.config)
+        self.similar = create_similarity_index(self.config)
+        self.quota = token_budget.create_quota(self.config)
+        self.router = ModelRouter(self.config, MODEL_NAME)
+        self.scheduler = tenants.create_scheduler(self.config)
+        self.renderer = FragmentRenderer(self.config.get('generation', {}).get('fragment_cache_entries', 256))
+        if self.similar is not None and self.store is not None:
+            # Warm the index from history so near-duplicates hit after a restart
+            self.similar.load(self.store.recent_outputs(
+                self.similar.methods, self.config.get('similarity', {}).get('preload', 5000)))
+        self.inflight = SingleFlight()
+        self.documents = sections.create_document_store(self.config)
+        self._active = 0
+        self._active_changed = threading.Condition()
+
+    @property
+    def model(self):
+        """The Gemini client, resolved lazily on the first generation."""
+        if self._model is None:
+            self._model = get_client(self.config)
+        return self._model
+
+    @model.setter
+    def model(self, model):
+        self._model = model
+
+    def _client_for(self, model_name):
+        """Return the client for a routed model name; MODEL_NAME is self.model."""
+        if model_name == MODEL_NAME:
+            return self.model
+        return get_client(self.config, model_name)
+
+    def _model_label(self, model_name):
+        if model_name == MODEL_NAME:
+            return getattr(self.model, 'model_name', MODEL_NAME)
+        return model_name
+        
+    @contextmanager
+    def _tracked(self):
+        """Count a model call as in flight for drain()."""
+        with self._active_changed:
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._active_changed:
+                self._active -= 1
+                self._active_changed.notify_all()
+
+    def drain(self, timeout=None):
+        """Wait for in-flight model calls to finish; True if none remain."""
+        with self._active_changed:
+            return self._active_changed.wait_for(lambda: self._active == 0, timeout)
+
+    def wait_until_quiet(self, max_active, timeout=None):
+        """Wait until fewer than max_active model calls are in flight; True if so."""
+        with self._active_changed:
+            return self._active_changed.wait_for(lambda: self._active < max_active, timeout)
+
+    def _cache_key(self, method, prompt, generation_config, inputs=None):
+        # A reply is keyed by the whole cascade, since any of its models may have written it
+        cascade = self.router.route(method, inputs)
+        return make_cache_key(prompt, ",".join(self._model_label(name) for name in cascade), generation_config)
+
+    def _cached(self, method, key, use_cache):
+        """Look the key up in the response cache unless bypassed."""
+        if not use_cache:
+            return None
+        cached = self.cache.get(key)
+        metrics.CACHE_REQUESTS.inc(method=method, result='miss' if cached is None else 'hit')
+        return cached
+
+    def _record(self, method, inputs, prompt, text, generation_config, source, latency=None,
+                prompt_tokens=None, output_tokens=None, model=None):
+        """Save one generation to the history store, if enabled."""
+        if self.store is None:
+            return
+        self.store.record(
+            method, inputs or {}, prompt, text,
+            model=model or self._model_label(self.router.route(method, inputs)[-1]),
+            generation_config=generation_config,
+            latency=latency,
+            prompt_tokens=prompt_tokens,
+            output_tokens=output_tokens,
+            source=source,
+        )
+
+    def _similar(self, method, inputs, use_cache):
+        """Return a stored reply for near-identical inputs, if the index has one."""
+        if not use_cache or not inputs or self.similar is None:
+            return None
+        match = self.similar.lookup(method, inputs)
+        if match is None:
+            return None
+        text, score, matched = match
+        metrics.SIMILAR_HITS.inc(method=method)
+        print(f"Reusing {method} for '{matched}' (similarity {score:.2f})")
+        return text
+
+    def _generate(self, method, prompt, generation_config, use_cache=True, inputs=None, cache_reply=True):
+        """Run the prompt through the model, serving repeats from the cache.
+
+        After an exact cache miss, a reply generated for near-identical
+        inputs is reused when the similarity index has one. Without
+        cache_reply the model's reply is returned but not cached.
+        """
+        return self._generate_sourced(method, prompt, generation_config, use_cache, inputs, cache_reply)[0]
+
+    def _generate_sourced(self, method, prompt, generation_config, use_cache=True, inputs=None, cache_reply=True):
+        """_generate, returning (text, source): 'cache', 'similar', 'coalesced' or 'model'."""
+        key = self._cache_key(method, prompt, generation_config, inputs)
+        cached = self._cached(method, key, use_cache)
+        if cached is not None:
+            self._record(method, inputs, prompt, cached, generation_config, 'cache')
+            return cached, 'cache'
+        similar = self._similar(method, inputs, use_cache)
+        if similar is not None:
+            self._record(method, inputs, prompt, similar, generation_config, 'similar')
+            return similar, 'similar'
+
+        # Identical requests already in flight share that model call. Each
+        # caller is held to its own quota, and another user's quota or queue
+        # errors are not passed on to it.
+        self._check_quota()
+        text, shared = self.inflight.do(key, lambda: self._call_model(method, key, prompt, generation_config, inputs,
+                                                                            cache_reply),
+                                        private=(token_budget.QuotaExceeded, tenants.QueueTimeout))
+        if shared:
+            metrics.COALESCED_REQUESTS.inc(method=method)
+            self._charge(token_budget.count_tokens(prompt), token_budget.count_tokens(text))
+            self._record(method, inputs, prompt, text, generation_config, 'coalesced')
+            return text, 'coalesced'
+        return text, 'model'
+
+    @contextmanager
+    def _turn(self, prompt, generation_config):
+        """Wait for the current user's fair share of model slots, if scheduling is on."""
+        if self.scheduler is None:
+            yield
+            return
+        cost = token_budget.count_tokens(prompt) + (generation_config or {}).get('max_output_tokens', 0)
+        with self.scheduler.slot(token_budget.current_user(), cost):
+            yield
+
+    def _check_quota(self):
+        if self.quota is not None:
+            self.quota.check(token_budget.current_user())
+
+    def _charge(self, prompt_tokens, output_tokens):
+        if self.quota is not None:
+            self.quota.charge(token_budget.current_user(), prompt_tokens + output_tokens)
+        if self.scheduler is not None:
+            self.scheduler.charge(token_budget.current_user(), prompt_tokens + output_tokens)
+
+    def _call_model(self, method, key, prompt, generation_config, inputs=None, cache_reply=True):
+        """Run the request's model cascade, escalating until a reply passes its checks."""
+        cascade = self.router.route(method, inputs)
+        for i, route_name in enumerate(cascade):
+            last = i == len(cascade) - 1
+            try:
+                text = self._call_one(route_name, method, prompt, generation_config, inputs)
+            except (token_budget.QuotaExceeded, tenants.QueueTimeout):
+                # Another model wouldn't get the call through any sooner
+                raise
+            except Exception as e:
+                if last:
+                    raise
+                problems = [f"{type(e).__name__}: {describe_error(e)}"]
+            else:
+                problems = [] if last else self.router.check(method, text, inputs)
+            if not problems:
+                break
+            metrics.MODEL_ESCALATIONS.inc(method=method, model=self._model_label(route_name))
+            print(f"Escalating {method} from {route_name}: {'; '.join(problems)}")
+        
+        if text and cache_reply:
+            self.cache.set(key, text)
+            if self.similar is not None and inputs:
+                self.similar.add(method, inputs, text)
+        return text
+
+    def _call_one(self, route_name, method, prompt, generation_config, inputs=None):
+        client = self._client_for(route_name)
+        model_name = self._model_label(route_name)
+        self._check_quota()
+        started = time.perf_counter()
         try:
-            self.model = genai.GenerativeModel(MODEL_NAME)
-            print(f"Successfully initialized model: {MODEL_NAME}")
+            with self._tracked(), self._turn(prompt, generation_config), \
+                    metrics.timed(metrics.MODEL_LATENCY, 'model', method=method, model=model_name):
+                response = client.generate_content(
+                    prompt,
+                    generation_config=generation_config
+                )
+                text = response.text if response else None
         except Exception as e:
-            print(f"Error initializing model: {str(e)}")
+            metrics.MODEL_ERRORS.inc(method=method, error=type(e).__name__)
+            self._record(method, inputs, prompt, None, generation_config, 'error', time.perf_counter() - started,
+                         model=model_name)
             raise
-        self.config = config
-        
+        prompt_tokens, output_tokens = self._count_tokens(method, response, prompt, text)
+        self._charge(prompt_tokens, output_tokens)
+        self._record(method, inputs, prompt, text, generation_config, 'model', time.perf_counter() - started,
+                     prompt_tokens, output_tokens, model=model_name)
+        return text
+
+    def _count_tokens(self, method, response, prompt, text):
+        prompt_tokens, output_tokens = metrics.response_token_counts(response, prompt, text)
+        metrics.PROMPT_TOKENS.inc(prompt_tokens, method=method)
+        metrics.OUTPUT_TOKENS.inc(output_tokens, method=method)
+        return prompt_tokens, output_tokens
+
+    def _stream(self, method, prompt, generation_config, use_cache=True, inputs=None):
+        """Yield the model's reply in chunks as it is produced.
+
+        A cached reply is yielded as a single chunk; a fresh one is cached
+        once the stream completes. Chunks can't be taken back once sent, so
+        a stream uses the first model of its cascade and never escalates.
+        """
+        key = self._cache_key(method, prompt, generation_config, inputs)
+        cached = self._cached(method, key, use_cache)
+        if cached is not None:
+            self._record(method, inputs, prompt, cached, generation_config, 'cache')
+            yield cached
+            return
+        similar = self._similar(method, inputs, use_cache)
+        if similar is not None:
+            self._record(method, inputs, prompt, similar, generation_config, 'similar')
+            yield similar
+            return
+
+        route_name = self.router.route(method, inputs)[0]
+        client = self._client_for(route_name)
+        model_name = self._model_label(route_name)
+        self._check_quota()
+        parts = []
+        started = time.perf_counter()
+        try:
+            with self._tracked(), self._turn(prompt, generation_config):
+                # Time spent queueing for a slot isn't model latency
+                started = time.perf_counter()
+                response = client.generate_content(
+                    prompt,
+                    generation_config=generation_config,
+                    stream=True
+                )
+                for chunk in response:
+                    text = chunk.text
+                    if text:
+                        parts.append(text)
+                        yield text
+        except Exception as e:
+            metrics.MODEL_ERRORS.inc(method=method, error=type(e).__name__)
+            self._record(method, inputs, prompt, "".join(parts) or None, generation_config, 'error',
+                         time.perf_counter() - started, model=model_name)
+            raise
+        latency = time.perf_counter() - started
+        metrics.MODEL_LATENCY.observe(latency, method=method, model=model_name)
+        text = "".join(parts)
+        prompt_tokens, output_tokens = self._count_tokens(method, response, prompt, text)
+        self._charge(prompt_tokens, output_tokens)
+        self._record(method, inputs, prompt, text, generation_config, 'model', latency, prompt_tokens, output_tokens,
+                     model=model_name)
+        self.cache.set(key, text)
+        if self.similar is not None and inputs:
+            self.similar.add(method, inputs, text)
+
+    def _stream_formatted(self, what, method, prompt, generation_config, header, footer, use_cache, inputs=None,
+                          html=False, render=None):
+        """Yield header, streamed model output and footer for one request.
+
+        With html, the model's chunks are escaped, since the header and
+        footer are HTML. With render, a stream that completes ends with
+        RENDERED_MARKER and render() of the whole reply.
+        """
+        yield header
+        parts = []
+        try:
+            for chunk in self._stream(method, prompt, generation_config, use_cache, inputs):
+                parts.append(chunk)
+                yield str(escape(chunk)) if html else chunk
+        except Exception as e:
+            error_msg = f"Error generating {what}: {describe_error(e)}"
+            print(error_msg)
+            self.console.print(f"[red]{error_msg}[/red]")
+            yield f'<div class="error-message">{escape(error_msg)}</div>'
+            render = None
+        yield footer
+        if render is not None:
+            yield RENDERED_MARKER + render("".join(parts))
+
     def format_duration(self, minutes):
         """Convert minutes to a formatted duration string."""
         hours = minutes // 60
@@ -57,151 +465,150 @@ class PodcastContentGenerator:
         duration_str = self.format_duration(duration)
         return f"{timestamp} ({duration_str})"
 
-    def generate_outline(self, topic, duration, style):
-        prompt = f"""You are a professional podcast content creator. Create a clear and engaging podcast outline for:
-        
-        Topic: {topic}
-        Duration: {duration} minutes
-        Style: {style}
-        
-        Follow this EXACT format:
-        
-        # [Write a catchy title here - max 60 chars]
-        
-        ## 📝 Episode Summary
-        [Write 2-3 clear sentences about what this episode covers]
-        
-        ## ⏰ Episode Timeline
-        
-        ### 1. Introduction ({self.format_duration(5)})
-        • Opening Hook: [Write a strong hook]
-        • Topic Introduction
-        • Episode Goals
-        
-        ### 2. Main Segments
-        
-        #### Segment 1: [Title] ({self.format_duration(10)})
-        • Main Point 1
-        • Main Point 2
-        • Main Point 3
-        • Key Takeaway
-        
-        #### Segment 2: [Title] ({self.format_duration(15)})
-        • Main Point 1
-        • Main Point 2
-        • Main Point 3
-        • Key Takeaway
-        
-        #### Segment 3: [Title] ({self.format_duration(15)})
-        • Main Point 1
-        • Main Point 2
-        • Main Point 3
-        • Key Takeaway
-        
-        ### 3. Conclusion ({self.format_duration(5)})
-        • Recap Key Points
-        • Call to Action
-        • Next Episode Preview
+    def _structure(self, structure=None):
+        """Return (name, template) for a `podcast_templates` entry, or the default one."""
+        templates = self.config.get('podcast_templates') or {}
+        name = structure or self.config.get('generation', {}).get('outline_structure', 'solo_narrative')
+        if name not in templates:
+            raise ValueError(f"Unknown outline structure: {name}")
+        return name, templates[name]
+
+    def plan_timeline(self, duration, structure=None):
+        """Split the episode's minutes across a podcast template's sections.
+
+        Each section gets a share of the duration by its weight (the
+        template's `weights`, or 1 for the first and last sections and 2
+        for the rest), rounded to whole minutes that add up to the duration.
+        Returns a list of (section title, start minute, minutes).
+        """
+        _, template = self._structure(structure)
+        sections = template['structure']
+        weights = template.get('weights') or [1] + [2] * (len(sections) - 2) + [1]
+        if len(weights) != len(sections):
+            raise ValueError("Outline structure weights must match its sections")
+        duration = int(duration)
+        if duration < len(sections):
+            raise ValueError(f"Duration must be at least {len(sections)} minutes for this structure")
         
-        ## 🎵 Production Notes
-        • Music Type:
-        • Sound Effects:
-        • Special Elements:
+        # Largest remainder rounding, with at least one minute per section
+        spare = duration - len(sections)
+        shares = [spare * weight / sum(weights) for weight in weights]
+        minutes = [1 + int(share) for share in shares]
+        by_remainder = sorted(range(len(sections)), key=lambda i: shares[i] - int(shares[i]), reverse=True)
+        for i in by_remainder[:duration - sum(minutes)]:
+            minutes[i] += 1
         
-        Remember:
-        1. Be specific and clear
-        2. Use engaging language
-        3. Keep points concise
-        4. Maintain consistent formatting
-        """
+        plan = []
+        start = 0
+        for section, length in zip(sections, minutes):
+            plan.append((section.replace('_', ' ').title(), start, length))
+            start += length
+        return plan
+
+    def format_timeline(self, plan):
+        """Render a timeline plan as one line per section for the prompt."""
+        return "\n".join(f"- {self.create_timestamp(start, length)} {title}" for title, start, length in plan)
+
+    def _outline_request(self, topic, duration, style, structure=None):
+        """Build the prompt and generation config for an outline."""
+        _, template = self._structure(structure)
+        plan = self.plan_timeline(duration, structure)
+        prompt = self.prompts.render(
+            'outline',
+            topic=topic,
+            duration=duration,
+            style=style,
+            tone=template.get('tone', style),
+            timeline=self.format_timeline(plan),
+        )
         
-        try:
-            generation_config = {
-                "temperature": 0.7,  # Slightly lower for more focused content
-                "top_p": 0.8,
-                "top_k": 40,
-                "max_output_tokens": 2048,
-            }
-            
-            response = self.model.generate_content(
-                prompt,
-                generation_config=generation_config
-            )
-            
-            outline = response.text
-            
-            # Format the response with clear styling
-            formatted_response = f"""
+        generation_config = {
+            "temperature": 0.7,  # Slightly lower for more focused content
+            "top_p": 0.8,
+            "top_k": 40,
+            "max_output_tokens": token_budget.output_budget(
+                self.config, 'outline', duration=duration, segments=len(plan)),
+        }
+        return prompt, generation_config
+
+    def _outline_wrapper(self, topic, duration, style):
+        """Return the HTML placed before and after the generated outline."""
+        header = f"""
             <div style="color: #000000; font-family: Arial, sans-serif; line-height: 1.6; padding: 20px;">
             <div style="background-color: #f8f9fa; padding: 15px; border-radius: 5px; margin-bottom: 20px;">
             <h2 style="color: #1a73e8;">Podcast Episode Outline</h2>
             <p>Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}</p>
             <p>Duration: {self.format_duration(duration)}</p>
-            <p>Topic: {topic}</p>
-            <p>Style: {style.title()}</p>
+            <p>Topic: {escape(topic)}</p>
+            <p>Style: {escape(style.title())}</p>
             </div>
             
-            <div style="background-color: #ffffff; padding: 20px; border-radius: 5px; box-shadow: 0 2px 4px rgba(0,0,0,0.1);">
-            {outline}
+            <div style="background-color: #ffffff; padding: 20px; border-radius: 5px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); white-space: pre-wrap;">
+            """
+        footer = """
             </div>
             </div>
             """
+        return header, footer
+
+    def generate_outline(self, topic, duration, style, use_cache=True, structure=None):
+        try:
+            structure, _ = self._structure(structure)
+            prompt, generation_config = self._outline_request(topic, duration, style, structure)
+            outline = self._generate('outline', prompt, generation_config, use_cache,
+                                     inputs={'topic': topic, 'duration': duration, 'style': style, 'structure': structure})
+            
+            # Render the markdown into the outline fragment
+            with metrics.timed(metrics.FORMAT_LATENCY, 'format', method='outline'):
+                formatted_response = self.renderer.render(
+                    'outline', outline, topic=topic, duration_label=self.format_duration(duration), style=style)
             
             return formatted_response
             
         except Exception as e:
-            error_msg = f"Error generating outline: {str(e)}"
+            error_msg = f"Error generating outline: {describe_error(e)}"
             print(error_msg)  # Print to console for debugging
             self.console.print(f"[red]{error_msg}[/red]")
             return None
 
-    def generate_questions(self, topic, guest_expertise, style):
-        prompt = f"""Create engaging interview questions for a podcast episode with the following details:
-        Topic: {topic}
-        Guest Expertise: {guest_expertise}
-        Style: {style}
-        
-        Structure the response in this format using markdown:
-        
-        # Interview Questions for [Topic]
-        
-        ## 🤝 Opening Questions (5-7 minutes)
-        [Questions to build rapport and set the tone]
-        
-        ## 🎯 Main Discussion (30-40 minutes)
-        [Core questions about the topic]
-        
-        ## 🌟 Lightning Round (5 minutes)
-        [Quick, fun questions to energize the conversation]
-        
-        ## 🎬 Closing Questions (5-10 minutes)
-        [Questions to wrap up and leave a lasting impression]
-        
-        For each question, include:
-        - The question itself
-        - Purpose/goal of the question
-        - Potential follow-ups
-        
-        Add timestamps and pacing suggestions where appropriate.
+    def stream_outline(self, topic, duration, style, use_cache=True, structure=None, rendered=False):
+        """Yield the formatted outline in pieces as the model writes it.
+
+        The model's text is escaped as it streams. With rendered, the
+        stream ends with RENDERED_MARKER and the sanitized outline fragment.
         """
+        structure, _ = self._structure(structure)
+        prompt, generation_config = self._outline_request(topic, duration, style, structure)
+        header, footer = self._outline_wrapper(topic, duration, style)
+        render = None
+        if rendered:
+            render = partial(self.renderer.render, 'outline', topic=topic,
+                             duration_label=self.format_duration(duration), style=style)
+        return self._stream_formatted("outline", 'outline', prompt, generation_config, header, footer, use_cache,
+                                      inputs={'topic': topic, 'duration': duration, 'style': style, 'structure': structure},
+                                      html=True, render=render)
+
+    def _questions_request(self, topic, guest_expertise, style):
+        """Build the prompt and generation config for questions."""
+        prompt = self.prompts.render(
+            'interview_questions',
+            topic=topic,
+            guest_expertise=guest_expertise,
+            style=style,
+        )
         
-        try:
-            generation_config = {
-                "temperature": 0.8,
-                "top_p": 1,
-                "top_k": 40,
-                "max_output_tokens": 2048,
-            }
-            
-            response = self.model.generate_content(
-                prompt,
-                generation_config=generation_config
-            )
-            
-            questions = response.text
-            
-            # Add header with metadata
-            metadata = f"""
+        generation_config = {
+            "temperature": 0.8,
+            "top_p": 1,
+            "top_k": 40,
+            "max_output_tokens": token_budget.output_budget(self.config, 'questions'),
+        }
+        return prompt, generation_config
+
+    def _questions_wrapper(self, topic, guest_expertise, style):
+        """Return the metadata header placed before the generated questions."""
+        # Unindented, so the header stays markdown rather than a code block
+        header = textwrap.dedent(f"""
             # Interview Questions
             
             - Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}
@@ -211,56 +618,71 @@ class PodcastContentGenerator:
             
             ---
             
-            {questions}
+            """)
+        footer = """
             """
+        return header, footer
+
+    def generate_questions(self, topic, guest_expertise, style, use_cache=True):
+        try:
+            prompt, generation_config = self._questions_request(topic, guest_expertise, style)
+            questions = self._generate('questions', prompt, generation_config, use_cache,
+                                       inputs={'topic': topic, 'guest_expertise': guest_expertise, 'style': style})
+            
+            # Add header with metadata
+            with metrics.timed(metrics.FORMAT_LATENCY, 'format', method='questions'):
+                header, footer = self._questions_wrapper(topic, guest_expertise, style)
+                metadata = header + questions + footer
             
             return metadata
             
         except Exception as e:
-            error_msg = f"Error generating questions: {str(e)}"
+            error_msg = f"Error generating questions: {describe_error(e)}"
             print(error_msg)  # Print to console for debugging
             self.console.print(f"[red]{error_msg}[/red]")
             return None
 
-    def generate_title(self, topic, style):
-        prompt = f"""Create 5 engaging podcast episode titles for the following topic:
-        Topic: {topic}
-        Style: {style}
-        
-        Structure the response in this format using markdown:
-        
-        # Title Options for [Topic]
-        
-        For each title:
-        - The title (under 60 characters)
-        - Brief explanation of its appeal
-        - Style elements used
-        - Emotional hook
-        
-        Make titles:
-        - Attention-grabbing
-        - SEO-friendly
-        - Easy to remember
-        - Mix of question-based and statement titles
+    def stream_questions(self, topic, guest_expertise, style, use_cache=True):
+        """Yield the questions in pieces as the model writes them."""
+        prompt, generation_config = self._questions_request(topic, guest_expertise, style)
+        header, footer = self._questions_wrapper(topic, guest_expertise, style)
+        return self._stream_formatted("questions", 'questions', prompt, generation_config, header, footer, use_cache,
+                                      inputs={'topic': topic, 'guest_expertise': guest_expertise, 'style': style})
+
+    def follow_on_request(self, method, topic, style, guest_expertise=None):
+        """Return (prompt, generation_config, inputs) for the title or questions that follow an outline."""
+        if method == 'questions':
+            prompt, generation_config = self._questions_request(topic, guest_expertise, style)
+            return prompt, generation_config, {'topic': topic, 'guest_expertise': guest_expertise, 'style': style}
+        prompt, generation_config = self._title_request(topic, style)
+        return prompt, generation_config, {'topic': topic, 'style': style}
+
+    def warm_cache(self, method, prompt, generation_config, inputs):
+        """Generate a reply into the cache ahead of the request for it.
+
+        Returns False without calling the model when the reply is already cached.
         """
+        if self.cache.get(self._cache_key(method, prompt, generation_config, inputs)) is not None:
+            return False
+        self._generate(method, prompt, generation_config, True, inputs)
+        return True
+
+    def _title_request(self, topic, style):
+        """Build the prompt and generation config for titles."""
+        prompt = self.prompts.render('title_options', topic=topic, style=style)
         
-        try:
-            generation_config = {
-                "temperature": 0.9,  # Higher temperature for more creative titles
-                "top_p": 1,
-                "top_k": 40,
-                "max_output_tokens": 1024,
-            }
-            
-            response = self.model.generate_content(
-                prompt,
-                generation_config=generation_config
-            )
-            
-            titles = response.text
-            
-            # Add header with metadata
-            metadata = f"""
+        generation_config = {
+            "temperature": 0.9,  # Higher temperature for more creative titles
+            "top_p": 1,
+            "top_k": 40,
+            "max_output_tokens": token_budget.output_budget(self.config, 'title'),
+        }
+        return prompt, generation_config
+
+    def _title_wrapper(self, topic, style):
+        """Return the metadata header placed before the generated titles."""
+        # Unindented, so the header stays markdown rather than a code block
+        header = textwrap.dedent(f"""
             # Episode Title Options
             
             - Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}
@@ -269,318 +691,353 @@ class PodcastContentGenerator:
             
             ---
             
-            {titles}
+            """)
+        footer = """
             """
+        return header, footer
+
+    def generate_title(self, topic, style, use_cache=True):
+        try:
+            prompt, generation_config = self._title_request(topic, style)
+            titles = self._generate('title', prompt, generation_config, use_cache,
+                                    inputs={'topic': topic, 'style': style})
+            
+            # Add header with metadata
+            with metrics.timed(metrics.FORMAT_LATENCY, 'format', method='title'):
+                header, footer = self._title_wrapper(topic, style)
+                metadata = header + titles + footer
             
             return metadata
             
         except Exception as e:
-            error_msg = f"Error generating titles: {str(e)}"
+            error_msg = f"Error generating titles: {describe_error(e)}"
             print(error_msg)  # Print to console for debugging
             self.console.print(f"[red]{error_msg}[/red]")
             return None
 
-    def generate_research(self, topic, keywords, analysis_type):
-        """Generate content research and analysis based on topic and type."""
+    def stream_title(self, topic, style, use_cache=True):
+        """Yield the titles in pieces as the model writes them."""
+        prompt, generation_config = self._title_request(topic, style)
+        header, footer = self._title_wrapper(topic, style)
+        return self._stream_formatted("titles", 'title', prompt, generation_config, header, footer, use_cache,
+                                      inputs={'topic': topic, 'style': style})
+
+    def _research_request(self, topic, keywords, analysis_type):
+        """Build the prompt and generation config for a research analysis."""
+        prompt = self.prompts.render(f'research_{analysis_type}', topic=topic, keywords=keywords)
         
-        analysis_prompts = {
-            'trends': f"""Create a clear, structured analysis of trends for the podcast topic:
-            Topic: {topic}
-            Keywords/Areas: {keywords}
-            
-            Format your response in these clear sections:
+        generation_config = {
+            "temperature": 0.7,
+            "top_p": 0.8,
+            "top_k": 40,
+            "max_output_tokens": token_budget.output_budget(
+                self.config, 'research', keywords=keywords, sections=len(structured.RESEARCH_SECTIONS[analysis_type])),
+        }
+        return prompt, generation_config
 
-            # Executive Summary
-            • Brief overview of the topic (2-3 sentences)
-            • Key findings highlight (3-4 bullet points)
-            
-            # Current Trends Analysis
-            ## Major Trend 1: [Name]
-            • What it is
-            • Why it matters
-            • Key statistics
-            • Impact on the industry
-            
-            ## Major Trend 2: [Name]
-            • What it is
-            • Why it matters
-            • Key statistics
-            • Impact on the industry
-            
-            ## Major Trend 3: [Name]
-            • What it is
-            • Why it matters
-            • Key statistics
-            • Impact on the industry
-            
-            # Emerging Patterns
-            ## Pattern 1: [Name]
-            • Description
-            • Expected impact
-            • Timeline
-            
-            ## Pattern 2: [Name]
-            • Description
-            • Expected impact
-            • Timeline
-            
-            # Content Opportunities
-            ## Opportunity 1: [Name]
-            • Description
-            • Target audience
-            • Potential format
-            • Expected impact
-            
-            ## Opportunity 2: [Name]
-            • Description
-            • Target audience
-            • Potential format
-            • Expected impact
-            
-            # Expert Insights
-            • Quote 1: [Expert name] - [Key point]
-            • Quote 2: [Expert name] - [Key point]
-            • Quote 3: [Expert name] - [Key point]
-            
-            # Action Items
-            ## Immediate Steps
-            • Action 1
-            • Action 2
-            • Action 3
-            
-            ## Long-term Strategy
-            • Strategy point 1
-            • Strategy point 2
-            • Strategy point 3""",
-            
-            'competitors': f"""Create a clear, structured analysis of competitor content:
-            Topic: {topic}
-            Keywords/Areas: {keywords}
-            
-            Format your response in these clear sections:
+    def _research_wrapper(self, topic, analysis_type):
+        """Return the HTML placed before and after the generated analysis."""
+        header = f"""
+            <div style="color: #000000; font-family: Arial, sans-serif; line-height: 1.6; padding: 20px;">
+                <div style="background-color: #f8f9fa; padding: 15px; border-radius: 5px; margin-bottom: 20px;">
+                    <h2 style="color: #1a73e8; margin-bottom: 15px;">Content Research & Analysis</h2>
+                    <p style="margin: 5px 0;"><strong>Generated:</strong> {datetime.now().strftime('%Y-%m-%d %H:%M')}</p>
+                    <p style="margin: 5px 0;"><strong>Topic:</strong> {escape(topic)}</p>
+                    <p style="margin: 5px 0;"><strong>Analysis Type:</strong> {escape(analysis_type.title())}</p>
+                </div>
+                
+                <div style="background-color: #ffffff; padding: 20px; border-radius: 5px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); white-space: pre-wrap;">
+                    <div style="max-width: 800px; margin: 0 auto;">
+                        """
+        footer = """
+                    </div>
+                </div>
+            </div>
+            """
+        return header, footer
 
-            # Executive Summary
-            • Overview of competitive landscape
-            • Key findings (3-4 bullet points)
-            
-            # Top Performing Content Analysis
-            ## Category 1: [Content Type]
-            • What works
-            • Why it works
-            • Key examples
-            • Success metrics
-            
-            ## Category 2: [Content Type]
-            • What works
-            • Why it works
-            • Key examples
-            • Success metrics
-            
-            # Content Gap Analysis
-            ## Gap 1: [Area]
-            • Description
-            • Market need
-            • Opportunity size
-            • Potential approach
-            
-            ## Gap 2: [Area]
-            • Description
-            • Market need
-            • Opportunity size
-            • Potential approach
-            
-            # Differentiation Opportunities
-            ## Opportunity 1: [Name]
-            • Unique angle
-            • Target audience
-            • Content format
-            • Expected impact
-            
-            ## Opportunity 2: [Name]
-            • Unique angle
-            • Target audience
-            • Content format
-            • Expected impact
+    def generate_research(self, topic, keywords, analysis_type, use_cache=True):
+        """Generate content research and analysis based on topic and type; None on failure."""
+        
+        if analysis_type not in ANALYSIS_TYPES:
+            error_msg = f"Invalid analysis type: {analysis_type}"
+            print(error_msg)
+            self.console.print(f"[red]{error_msg}[/red]")
+            return None
+        
+        try:
+            prompt, generation_config = self._research_request(topic, keywords, analysis_type)
+            analysis = self._generate('research', prompt, generation_config, use_cache,
+                                      inputs={'topic': topic, 'keywords': keywords, 'analysis_type': analysis_type})
             
-            # Strategic Recommendations
-            ## Short-term Actions
-            • Action 1
-            • Action 2
-            • Action 3
+            if not analysis:
+                error_msg = "No content generated from the AI model"
+                print(error_msg)
+                self.console.print(f"[red]{error_msg}[/red]")
+                return None
             
-            ## Long-term Strategy
-            • Strategy 1
-            • Strategy 2
-            • Strategy 3""",
+            # Render the markdown into the research fragment
+            with metrics.timed(metrics.FORMAT_LATENCY, 'format', method='research'):
+                formatted_response = self.renderer.render('research', analysis, topic=topic, analysis_type=analysis_type)
             
-            'audience': f"""Create a clear, structured analysis of audience interests:
-            Topic: {topic}
-            Keywords/Areas: {keywords}
+            return formatted_response
             
-            Format your response in these clear sections:
+        except Exception as e:
+            error_msg = f"Error generating research analysis: {describe_error(e)}"
+            print(error_msg)
+            self.console.print(f"[red]{error_msg}[/red]")
+            return None
 
-            # Executive Summary
-            • Overview of audience analysis
-            • Key insights (3-4 bullet points)
-            
-            # Audience Segments
-            ## Segment 1: [Name]
-            • Demographics
-            • Key interests
-            • Content preferences
-            • Engagement patterns
-            
-            ## Segment 2: [Name]
-            • Demographics
-            • Key interests
-            • Content preferences
-            • Engagement patterns
-            
-            # Common Questions Analysis
-            ## Category 1: [Topic Area]
-            • Question 1
-            • Question 2
-            • Question 3
-            • How to address
-            
-            ## Category 2: [Topic Area]
-            • Question 1
-            • Question 2
-            • Question 3
-            • How to address
-            
-            # Platform Analysis
-            ## Platform 1: [Name]
-            • Audience presence
-            • Content performance
-            • Engagement metrics
-            • Best practices
-            
-            ## Platform 2: [Name]
-            • Audience presence
-            • Content performance
-            • Engagement metrics
-            • Best practices
-            
-            # Content Strategy
-            ## Content Types
-            • Type 1: [Description and approach]
-            • Type 2: [Description and approach]
-            • Type 3: [Description and approach]
-            
-            ## Engagement Strategy
-            • Strategy 1
-            • Strategy 2
-            • Strategy 3""",
-            
-            'gaps': f"""Create a clear, structured analysis of content gaps:
-            Topic: {topic}
-            Keywords/Areas: {keywords}
-            
-            Format your response in these clear sections:
+    def stream_research(self, topic, keywords, analysis_type, use_cache=True, rendered=False):
+        """Yield the formatted research analysis in pieces as the model writes it.
 
-            # Executive Summary
-            • Overview of content gap analysis
-            • Key findings (3-4 bullet points)
-            
-            # Market Overview
-            ## Current State
-            • Key players
-            • Content types
-            • Market trends
-            • Audience needs
-            
-            # Content Gaps
-            ## Gap 1: [Area]
-            • Description
-            • Market need
-            • Competition level
-            • Opportunity size
-            
-            ## Gap 2: [Area]
-            • Description
-            • Market need
-            • Competition level
-            • Opportunity size
-            
-            # Opportunity Analysis
-            ## Opportunity 1: [Name]
-            • Description
-            • Target audience
-            • Content approach
-            • Expected impact
-            
-            ## Opportunity 2: [Name]
-            • Description
-            • Target audience
-            • Content approach
-            • Expected impact
-            
-            # Implementation Strategy
-            ## Quick Wins
-            • Action 1
-            • Action 2
-            • Action 3
-            
-            ## Long-term Plan
-            • Strategy 1
-            • Strategy 2
-            • Strategy 3
-            
-            # Success Metrics
-            • Metric 1: [Description and target]
-            • Metric 2: [Description and target]
-            • Metric 3: [Description and target]"""
-        }
-        
-        if analysis_type not in analysis_prompts:
+        The model's text is escaped as it streams. With rendered, the
+        stream ends with RENDERED_MARKER and the sanitized research fragment.
+        """
+        if analysis_type not in ANALYSIS_TYPES:
             error_msg = f"Invalid analysis type: {analysis_type}"
             print(error_msg)
-            return f'<div class="error-message">{error_msg}</div>'
-        
-        prompt = analysis_prompts[analysis_type]
+            return iter([f'<div class="error-message">{escape(error_msg)}</div>'])
         
+        prompt, generation_config = self._research_request(topic, keywords, analysis_type)
+        header, footer = self._research_wrapper(topic, analysis_type)
+        render = None
+        if rendered:
+            render = partial(self.renderer.render, 'research', topic=topic, analysis_type=analysis_type)
+        return self._stream_formatted("research analysis", 'research', prompt, generation_config, header, footer, use_cache,
+                                      inputs={'topic': topic, 'keywords': keywords, 'analysis_type': analysis_type},
+                                      html=True, render=render)
+
+    def _generate_structured(self, method, prompt, schema, max_output_tokens, use_cache=True, inputs=None):
+        """Generate JSON for a schema, re-asking only for the fields that fail.
+
+        Only the validated document is cached, never the raw reply, so a
+        repeat request skips the repair round-trips and a reply that
+        couldn't be repaired is asked for afresh. `max_output_tokens` is
+        the request's token_budget.output_budget.
+        """
+        generation_config = {
+            "temperature": 0.4,
+            "top_p": 0.8,
+            "top_k": 40,
+            "max_output_tokens": max_output_tokens,
+        }
+        repair_config = {
+            "temperature": 0.2,
+            "top_p": 0.8,
+            "top_k": 40,
+            "max_output_tokens": max_output_tokens,
+        }
+        text = self._generate(method, prompt, generation_config, use_cache, inputs, cache_reply=False)
         try:
-            generation_config = {
-                "temperature": 0.7,
-                "top_p": 0.8,
-                "top_k": 40,
-                "max_output_tokens": 2048,
-            }
-            
-            response = self.model.generate_content(
-                prompt,
-                generation_config=generation_config
+            data = structured.parse_json(text)
+        except ValueError:
+            # Not JSON at all, so there are no fields to repair; ask once more
+            text = self._generate(method, prompt + "\nYour previous reply was not valid JSON. Reply with the JSON object only.",
+                                  generation_config, use_cache=False, inputs=inputs, cache_reply=False)
+            data = structured.parse_json(text)
+
+        max_repairs = self.config.get('generation', {}).get('structured_repair_attempts', 2)
+        errors = structured.validate(data, schema)
+        for _ in range(max_repairs):
+            if not errors or any(path == "$" for path, _ in errors):
+                break
+            fixes = structured.parse_json(self._generate(
+                f'{method}_repair', structured.repair_prompt(data, errors), repair_config,
+                use_cache=False, inputs=inputs, cache_reply=False,
+            ))
+            for path, _ in errors:
+                if path in fixes:
+                    structured.set_path(data, path, fixes[path])
+            errors = structured.validate(data, schema)
+        if errors:
+            listed = ", ".join(f"{path} ({message})" for path, message in errors)
+            raise structured.StructuredOutputError(f"Invalid fields after repair: {listed}")
+
+        self.cache.set(self._cache_key(method, prompt, generation_config, inputs), json.dumps(data))
+        return data
+
+    def generate_stage(self, method, inputs, context=None, use_cache=True):
+        """Generate one pipeline stage's markdown, informed by earlier stages.
+
+        `context` is the earlier stages' summaries; it is added to the
+        method's usual prompt, so a stage whose inputs and context are
+        unchanged is served from the response cache. Returns (text, source),
+        where source is where the text came from, as for _generate_sourced.
+        """
+        topic = inputs['topic']
+        style = inputs.get('style', 'deep')
+        if method == 'outline':
+            duration = int(inputs.get('duration', 30))
+            structure, _ = self._structure(inputs.get('structure'))
+            prompt, generation_config = self._outline_request(topic, duration, style, structure)
+            inputs = {'topic': topic, 'duration': duration, 'style': style, 'structure': structure}
+        elif method == 'questions':
+            prompt, generation_config = self._questions_request(topic, inputs['guest_expertise'], style)
+            inputs = {'topic': topic, 'guest_expertise': inputs['guest_expertise'], 'style': style}
+        elif method == 'title':
+            prompt, generation_config = self._title_request(topic, style)
+            inputs = {'topic': topic, 'style': style}
+        elif method == 'research':
+            keywords = inputs.get('keywords') or topic
+            analysis_type = inputs.get('analysis_type', 'trends')
+            if analysis_type not in ANALYSIS_TYPES:
+                raise ValueError(f"Invalid analysis type: {analysis_type}")
+            prompt, generation_config = self._research_request(topic, keywords, analysis_type)
+            inputs = {'topic': topic, 'keywords': keywords, 'analysis_type': analysis_type}
+        else:
+            raise ValueError(f"Unknown pipeline method: {method}")
+        if context:
+            prompt = prompt + "\n\n" + self.prompts.render('pipeline_context', context=context)
+            # Keeps the similarity index from matching a reply written for other context
+            inputs['context'] = hashlib.sha256(context.encode('utf-8')).hexdigest()[:16]
+        return self._generate_sourced(method, prompt, generation_config, use_cache, inputs)
+
+    def generate_outline_structured(self, topic, duration, style, use_cache=True, structure=None):
+        """Generate an outline as a validated structured.Outline."""
+        try:
+            structure, template = self._structure(structure)
+            plan = self.plan_timeline(duration, structure)
+            prompt = self.prompts.render(
+                'outline_json',
+                topic=topic,
+                duration=duration,
+                style=style,
+                tone=template.get('tone', style),
+                timeline=self.format_timeline(plan),
+                schema=structured.OUTLINE_SHAPE,
             )
+            budget = token_budget.output_budget(self.config, 'outline', duration=duration, segments=len(plan))
+            data = self._generate_structured('outline_json', prompt, structured.OUTLINE_SCHEMA, budget, use_cache,
+                                             inputs={'topic': topic, 'duration': duration, 'style': style, 'structure': structure})
+            return structured.Outline.from_dict(data)
             
-            if not response or not response.text:
-                error_msg = "No content generated from the AI model"
-                print(error_msg)
-                return f'<div class="error-message">{error_msg}</div>'
-            
-            analysis = response.text
-            
-            # Format the response with clear styling and sections
-            formatted_response = f"""
-            <div style="color: #000000; font-family: Arial, sans-serif; line-height: 1.6; padding: 20px;">
-                <div style="background-color: #f8f9fa; padding: 15px; border-radius: 5px; margin-bottom: 20px;">
-                    <h2 style="color: #1a73e8; margin-bottom: 15px;">Content Research & Analysis</h2>
-                    <p style="margin: 5px 0;"><strong>Generated:</strong> {datetime.now().strftime('%Y-%m-%d %H:%M')}</p>
-                    <p style="margin: 5px 0;"><strong>Topic:</strong> {topic}</p>
-                    <p style="margin: 5px 0;"><strong>Analysis Type:</strong> {analysis_type.title()}</p>
-                </div>
-                
-                <div style="background-color: #ffffff; padding: 20px; border-radius: 5px; box-shadow: 0 2px 4px rgba(0,0,0,0.1);">
-                    <div style="max-width: 800px; margin: 0 auto;">
-                        {analysis}
-                    </div>
-                </div>
-            </div>
-            """
+        except Exception as e:
+            error_msg = f"Error generating structured outline: {describe_error(e)}"
+            print(error_msg)
+            self.console.print(f"[red]{error_msg}[/red]")
+            return None
+
+    def generate_title_structured(self, topic, style, use_cache=True):
+        """Generate title candidates as a validated structured.TitleOptions."""
+        try:
+            prompt = self.prompts.render('title_json', topic=topic, style=style, schema=structured.TITLES_SHAPE)
+            budget = token_budget.output_budget(self.config, 'title')
+            data = self._generate_structured('title_json', prompt, structured.TITLES_SCHEMA, budget, use_cache,
+                                             inputs={'topic': topic, 'style': style})
+            return structured.TitleOptions.from_dict(data)
             
-            return formatted_response
+        except Exception as e:
+            error_msg = f"Error generating structured titles: {describe_error(e)}"
+            print(error_msg)
+            self.console.print(f"[red]{error_msg}[/red]")
+            return None
+
+    def generate_research_structured(self, topic, keywords, analysis_type, use_cache=True):
+        """Generate a research analysis as a validated structured.ResearchReport.
+
+        Sections the model leaves out are requested on their own and
+        appended, instead of regenerating the whole report.
+        """
+        if analysis_type not in ANALYSIS_TYPES:
+            print(f"Invalid analysis type: {analysis_type}")
+            return None
+        
+        try:
+            required = structured.RESEARCH_SECTIONS[analysis_type]
+            prompt = self.prompts.render(
+                'research_json',
+                topic=topic,
+                keywords=keywords,
+                analysis_type=analysis_type,
+                sections=", ".join(required),
+                schema=structured.RESEARCH_SHAPE,
+            )
+            inputs = {'topic': topic, 'keywords': keywords, 'analysis_type': analysis_type}
+            budget = token_budget.output_budget(self.config, 'research', keywords=keywords, sections=len(required))
+            data = self._generate_structured('research_json', prompt, structured.RESEARCH_SCHEMA, budget, use_cache,
+                                             inputs)
+            
+            present = {section['heading'].strip().lower() for section in data['sections']}
+            missing = [heading for heading in required if heading.lower() not in present]
+            if missing:
+                sections_schema = {'sections': structured.RESEARCH_SCHEMA['sections']}
+                extra = self._generate_structured(
+                    'research_json_sections',
+                    structured.missing_sections_prompt(topic, keywords, analysis_type, missing),
+                    sections_schema,
+                    token_budget.output_budget(self.config, 'research', keywords=keywords, sections=len(missing)),
+                    use_cache,
+                    inputs,
+                )
+                data['sections'].extend(extra['sections'])
+            
+            return structured.ResearchReport.from_dict(data, analysis_type)
             
         except Exception as e:
-            error_msg = f"Error generating research analysis: {str(e)}"
+            error_msg = f"Error generating structured research analysis: {describe_error(e)}"
             print(error_msg)
-            return f'<div class="error-message">{error_msg}</div>' 
\ No newline at end of file
+            self.console.print(f"[red]{error_msg}[/red]")
+            return None
+
+    def create_document(self, kind, inputs, use_cache=True):
+        """Generate an outline or research report as an editable sections.Document."""
+        if kind == 'outline':
+            prompt, generation_config = self._outline_request(inputs['topic'], inputs['duration'], inputs['style'],
+                                                              inputs.get('structure'))
+        elif kind == 'research':
+            if inputs['analysis_type'] not in ANALYSIS_TYPES:
+                raise ValueError(f"Invalid analysis type: {inputs['analysis_type']}")
+            prompt, generation_config = self._research_request(inputs['topic'], inputs['keywords'], inputs['analysis_type'])
+        else:
+            raise ValueError(f"Documents can be outlines or research reports, not {kind}")
+        
+        markdown = self._generate(kind, prompt, generation_config, use_cache, inputs)
+        if not markdown:
+            raise ValueError("No content generated from the AI model")
+        return self.documents.put(sections.new_document(kind, dict(inputs), markdown))
+
+    def render_document(self, document):
+        """Render a document the same way generate_outline/generate_research do."""
+        inputs = document.inputs
+        if document.kind == 'outline':
+            return self.renderer.render('outline', document.markdown, topic=inputs['topic'],
+                                        duration_label=self.format_duration(inputs['duration']), style=inputs['style'])
+        return self.renderer.render('research', document.markdown, topic=inputs['topic'],
+                                    analysis_type=inputs['analysis_type'])
+
+    def regenerate_section(self, document_id, section_id, instructions=None):
+        """Rewrite one section of a stored document, leaving the rest as-is.
+
+        Only the target section is sent in full; the other sections are
+        summarized to one line each, and the reply is capped at a section's
+        worth of tokens.
+        """
+        document = self.documents.get(document_id)
+        section = document.section(section_id)
+        heading = f"{'#' * section.level} {section.heading}" if section.level else ""
+        prompt = self.prompts.render(
+            'section_regeneration',
+            kind='outline' if document.kind == 'outline' else 'research report',
+            topic=document.inputs['topic'],
+            context=document.context(exclude=section_id),
+            section=section.markdown.strip(),
+            instructions=f"Editor's instructions: {instructions}\n" if instructions else "",
+            heading=heading or "(no heading)",
+        )
+        generation_config = {
+            "temperature": 0.8,
+            "top_p": 0.9,
+            "top_k": 40,
+            "max_output_tokens": 512,
+        }
+        
+        # A regeneration should always produce a new take, so skip the cache
+        markdown = self._generate(f'{document.kind}_section', prompt, generation_config, use_cache=False,
+                                  inputs=dict(document.inputs, section_id=section_id, instructions=instructions))
+        if not markdown:
+            raise ValueError("No content generated from the AI model")
+        # Re-read, so an edit saved by another worker during the call is kept
+        document = self.documents.get(document_id)
+        sections.replace_section(document, section_id, markdown)
+        return self.documents.put(document)
@@ -0,0 +1,147 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import token_budget
+
+class Prefetcher:
+    """Generates titles and questions in the background after an outline.
+
+    Most users ask for titles and interview questions on an outline's
+    topic next, so once an outline is sent they are generated into the
+    response cache and the follow-up request is a cache hit. Questions
+    need the guest's expertise, so they are only prefetched when the
+    outline request included it.
+
+    Prefetches are speculative: they run on a small pool, only while
+    fewer than `max_busy` model calls are in flight, and each session may
+    spend at most `max_tokens_per_session` estimated tokens on them.
+    Ending a session cancels its prefetches that have not reached the
+    model; a session unseen for `session_ttl` seconds ends on its own.
+    """
+
+    def __init__(self, generator, workers=2, max_pending=100, max_tokens_per_session=10000,
+                 max_busy=8, idle_wait=30, session_ttl=1800):
+        self.generator = generator
+        self.max_pending = max_pending
+        self.max_tokens_per_session = max_tokens_per_session
+        self.max_busy = max_busy
+        self.idle_wait = idle_wait
+        self.session_ttl = session_ttl
+        self.counts = {'queued': 0, 'generated': 0, 'already_cached': 0, 'skipped': 0, 'cancelled': 0,
+                       'failed': 0}
+        self._pending = 0
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='prefetch')
+
+    @classmethod
+    def from_config(cls, generator, config):
+        prefetch_config = config.get('prefetch') or {}
+        return cls(
+            generator,
+            workers=prefetch_config.get('workers', 2),
+            max_pending=prefetch_config.get('max_pending', 100),
+            max_tokens_per_session=prefetch_config.get('max_tokens_per_session', 10000),
+            max_busy=prefetch_config.get('max_busy', 8),
+            idle_wait=prefetch_config.get('idle_wait', 30),
+            session_ttl=prefetch_config.get('session_ttl', 1800),
+        )
+
+    def _key(self, session):
+        # Sessions belong to a user, so nobody can end someone else's
+        return (token_budget.current_user(), session)
+
+    def after_outline(self, session, topic, style, guest_expertise=None):
+        """Queue the follow-on generations for an outline just sent to the session."""
+        self._expire()
+        methods = ['title', 'questions'] if guest_expertise else ['title']
+        key = self._key(session)
+        with self._lock:
+            state = self._sessions.setdefault(key, {'spent': 0, 'futures': []})
+            state['seen'] = time.monotonic()
+            state['futures'] = [future for future in state['futures'] if not future.done()]
+            for method in methods:
+                prompt, generation_config, inputs = self.generator.follow_on_request(
+                    method, topic, style, guest_expertise)
+                cost = token_budget.count_tokens(prompt) + generation_config['max_output_tokens']
+                if state['spent'] + cost > self.max_tokens_per_session or self._pending >= self.max_pending:
+                    self.counts['skipped'] += 1
+                    continue
+                state['spent'] += cost
+                self._pending += 1
+                self.counts['queued'] += 1
+                # Carries the user along, so the tokens are charged to them
+                context = contextvars.copy_context()
+                state['futures'].append(self._executor.submit(
+                    context.run, self._run, key, method, prompt, generation_config, inputs))
+
+    def touch(self, session):
+        """Keep a session's prefetches alive."""
+        with self._lock:
+            state = self._sessions.get(self._key(session))
+            if state is not None:
+                state['seen'] = time.monotonic()
+
+    def end_session(self, session):
+        """Cancel the session's prefetches; returns how many were cancelled."""
+        return self._end(self._key(session))
+
+    def _end(self, key):
+        with self._lock:
+            state = self._sessions.pop(key, None)
+            if state is None:
+                return 0
+            cancelled = sum(1 for future in state['futures'] if future.cancel())
+            self._pending -= cancelled
+            self.counts['cancelled'] += cancelled
+        return cancelled
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.session_ttl
+        with self._lock:
+            expired = [key for key, state in self._sessions.items() if state['seen'] < cutoff]
+        for key in expired:
+            self._end(key)
+
+    def _live(self, key):
+        with self._lock:
+            return key in self._sessions
+
+    def _run(self, key, method, prompt, generation_config, inputs):
+        outcome = 'skipped'
+        try:
+            # Real requests go first; give up if the model stays busy
+            if self._live(key) and self.generator.wait_until_quiet(self.max_busy, self.idle_wait):
+                if not self._live(key):
+                    outcome = 'cancelled'
+                elif self.generator.warm_cache(method, prompt, generation_config, inputs):
+                    outcome = 'generated'
+                else:
+                    outcome = 'already_cached'
+            elif not self._live(key):
+                outcome = 'cancelled'
+        except Exception as e:
+            outcome = 'failed'
+            print(f"Error prefetching {method}: {str(e)}")
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self.counts[outcome] += 1
+
+    def stop(self):
+        """Cancel every queued prefetch; running ones finish in the background."""
+        with self._lock:
+            keys = list(self._sessions)
+        for key in keys:
+            self._end(key)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counts, pending=self._pending, sessions=len(self._sessions))
+
+def create_prefetcher(generator, config):
+    """Build the prefetcher from the `prefetch` config section, or None when disabled."""
+    if not (config.get('prefetch') or {}).get('enabled', False):
+        return None
+    return Prefetcher.from_config(generator, config)
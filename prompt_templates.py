@@ -0,0 +1,112 @@
+import os
+import string
+import threading
+import time
+import yaml
+
+class PromptTemplate:
+    """A prompt parsed once into literal text and field slots."""
+
+    def __init__(self, name, text):
+        self.name = name
+        self.text = text.rstrip("\n")
+        self._parts = []
+        for literal, field, format_spec, conversion in string.Formatter().parse(self.text):
+            if field is not None and (not field.isidentifier() or format_spec or conversion):
+                raise ValueError(f"Prompt template '{name}' has an unsupported field: {{{field}}}")
+            self._parts.append((literal, field))
+        self.fields = frozenset(field for _, field in self._parts if field)
+
+    def render(self, **values):
+        """Fill in the template's fields; extra values are ignored."""
+        missing = self.fields - values.keys()
+        if missing:
+            raise KeyError(f"Prompt template '{self.name}' is missing values for: {', '.join(sorted(missing))}")
+        chunks = []
+        for literal, field in self._parts:
+            chunks.append(literal)
+            if field:
+                chunks.append(str(values[field]))
+        return "".join(chunks)
+
+class PromptRegistry:
+    """Compiled prompt templates from the `prompt_templates` config section.
+
+    Templates are compiled when the registry is created. With hot reload on,
+    the config file's modification time is checked at most once every
+    `check_interval` seconds and the templates are recompiled when it
+    changes. A file that fails to parse leaves the previous templates in place.
+    """
+
+    def __init__(self, path="config.yaml", templates=None, hot_reload=True, check_interval=2):
+        self.path = path
+        self.hot_reload = hot_reload
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._last_check = time.monotonic()
+        self._mtime = self._current_mtime()
+        if templates is None:
+            templates = self._read_templates()
+        self._templates = self._compile(templates)
+
+    @classmethod
+    def from_config(cls, config, path="config.yaml"):
+        registry_config = config.get('prompt_registry') or {}
+        return cls(
+            path,
+            templates=config.get('prompt_templates') or {},
+            hot_reload=registry_config.get('hot_reload', True),
+            check_interval=registry_config.get('check_interval', 2),
+        )
+
+    def _current_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime
+        except OSError:
+            return None
+
+    def _read_templates(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            return (yaml.safe_load(f) or {}).get('prompt_templates') or {}
+
+    def _compile(self, templates):
+        return {name: PromptTemplate(name, text) for name, text in templates.items()}
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        with self._lock:
+            if now - self._last_check < self.check_interval:
+                return
+            self._last_check = now
+            mtime = self._current_mtime()
+            if mtime is None or mtime == self._mtime:
+                return
+            self._mtime = mtime
+            try:
+                self._templates = self._compile(self._read_templates())
+                print(f"Reloaded prompt templates from {self.path}")
+            except Exception as e:
+                print(f"Error reloading prompt templates: {str(e)}")
+
+    def reload(self):
+        """Recompile the templates from disk now."""
+        with self._lock:
+            self._mtime = self._current_mtime()
+            self._templates = self._compile(self._read_templates())
+
+    def get(self, name):
+        if self.hot_reload:
+            self._maybe_reload()
+        try:
+            return self._templates[name]
+        except KeyError:
+            raise KeyError(f"Unknown prompt template: {name}") from None
+
+    def render(self, name, **values):
+        """Render a single template by name."""
+        return self.get(name).render(**values)
+
+    def names(self):
+        return sorted(self._templates)
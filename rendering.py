@@ -0,0 +1,102 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+import brotli
+from jinja2 import Environment, FileSystemLoader
+from markupsafe import Markup
+from markdown_it import MarkdownIt
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+
+FRAGMENTS = ('outline', 'research')
+
+class FragmentRenderer:
+    """Turns model markdown into finished HTML fragments.
+
+    The fragment templates in templates/fragments/ are compiled once when
+    the renderer is built. Raw HTML in the model's markdown is escaped and
+    unsafe link schemes are dropped, so the output is safe to insert into a
+    page. Recently rendered fragments are kept in a small LRU of their own,
+    so a repeat render skips markdown and templating without taking room
+    from, or counting towards, the response cache.
+    """
+
+    def __init__(self, max_entries=256, template_dir=TEMPLATE_DIR):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        env = Environment(loader=FileSystemLoader(template_dir), autoescape=True, auto_reload=False)
+        self.templates = {name: env.get_template(f'fragments/{name}.html') for name in FRAGMENTS}
+        self.markdown = MarkdownIt('commonmark', {'html': False}).enable('table')
+
+    def markdown_to_html(self, text):
+        return self.markdown.render(text)
+
+    def render(self, name, text, **context):
+        """Render model markdown into the named fragment with its metadata."""
+        key = hashlib.sha256(json.dumps([name, context, text], sort_keys=True, default=str).encode('utf-8')).digest()
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+                return html
+        html = self.templates[name].render(
+            body=Markup(self.markdown_to_html(text)),
+            # Kept with the cached fragment, so repeat views are byte-identical
+            generated=datetime.now().strftime('%Y-%m-%d %H:%M'),
+            **context,
+        )
+        with self._lock:
+            self._entries[key] = html
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return html
+
+class CompressionCache:
+    """LRU of compressed response bodies, keyed by ETag and encoding.
+
+    Repeat views of the same body skip the compressor entirely.
+    """
+
+    def __init__(self, max_entries=256, min_size=1024):
+        self.max_entries = max_entries
+        self.min_size = min_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def compress(self, etag, body, encoding):
+        key = (etag, encoding)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        if encoding == 'br':
+            compressed = brotli.compress(body, quality=5)
+        else:
+            compressed = gzip.compress(body, compresslevel=6)
+        with self._lock:
+            self._entries[key] = compressed
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return compressed
+
+def choose_encoding(accept_encoding):
+    """Pick br over gzip from an Accept-Encoding header, or None."""
+    offered = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        offered[name.strip().lower()] = quality
+    for encoding in ('br', 'gzip'):
+        if offered.get(encoding, offered.get('*', 0)) > 0:
+            return encoding
+    return None
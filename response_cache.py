@@ -0,0 +1,167 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from db import LocalConnections
+
+def normalize_prompt(prompt):
+    """Collapse whitespace so indentation changes don't split cache entries."""
+    return "\n".join(" ".join(line.split()) for line in prompt.strip().splitlines())
+
+def make_cache_key(prompt, model_name, generation_config):
+    """Build a stable key from the prompt, model and generation config."""
+    payload = json.dumps({
+        "prompt": normalize_prompt(prompt),
+        "model": model_name,
+        "generation_config": generation_config or {},
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """Base class for response caches; counts hits and misses."""
+
+    def __init__(self, ttl_seconds=None):
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        value = self._get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value):
+        if value:
+            self._set(key, value)
+
+    def _expired(self, created_at):
+        return bool(self.ttl_seconds) and time.time() - created_at > self.ttl_seconds
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "backend": self.backend,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "entries": len(self),
+        }
+
+class NullCache(ResponseCache):
+    """Cache that never stores anything."""
+
+    backend = "none"
+
+    def _get(self, key):
+        return None
+
+    def _set(self, key, value):
+        pass
+
+    def clear(self):
+        pass
+
+    def __len__(self):
+        return 0
+
+class MemoryCache(ResponseCache):
+    """In-process LRU cache with a per-entry time-to-live."""
+
+    backend = "memory"
+
+    def __init__(self, max_entries=512, ttl_seconds=None):
+        super().__init__(ttl_seconds)
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, created_at = entry
+            if self._expired(created_at):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def _set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+class SQLiteCache(ResponseCache):
+    """On-disk cache that survives restarts and is shared between workers."""
+
+    backend = "sqlite"
+
+    def __init__(self, path, ttl_seconds=None):
+        super().__init__(ttl_seconds)
+        self.path = path
+        self._db = LocalConnections(path)
+        conn = self._db.connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS response_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        conn.commit()
+
+    def _get(self, key):
+        conn = self._db.connect()
+        row = conn.execute(
+            "SELECT value, created_at FROM response_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, created_at = row
+        if self._expired(created_at):
+            conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+            conn.commit()
+            return None
+        return value
+
+    def _set(self, key, value):
+        conn = self._db.connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO response_cache (key, value, created_at) VALUES (?, ?, ?)",
+            (key, value, time.time()),
+        )
+        conn.commit()
+
+    def clear(self):
+        conn = self._db.connect()
+        conn.execute("DELETE FROM response_cache")
+        conn.commit()
+
+    def __len__(self):
+        return self._db.connect().execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+
+def create_cache(config):
+    """Build the response cache described by the `cache` config section."""
+    cache_config = config.get('cache') or {}
+    backend = cache_config.get('backend', 'memory')
+    ttl = cache_config.get('ttl_seconds')
+    if backend == 'memory':
+        return MemoryCache(cache_config.get('max_entries', 512), ttl)
+    if backend == 'sqlite':
+        return SQLiteCache(cache_config.get('sqlite_path', 'cache/responses.sqlite3'), ttl)
+    if backend == 'none':
+        return NullCache()
+    raise ValueError(f"Unknown cache backend: {backend}")
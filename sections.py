@@ -0,0 +1,188 @@
+import json
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from db import LocalConnections
+
+HEADING = re.compile(r"^(#{1,6})\s+(.*\S)\s*$")
+
+@dataclass
+class Section:
+    id: str
+    heading: str
+    level: int
+    body: str
+
+    @property
+    def markdown(self):
+        heading = f"{'#' * self.level} {self.heading}\n" if self.level else ""
+        return heading + self.body
+
+    def summary(self, width=100):
+        """Heading plus the first line of the body, for compact context."""
+        first_line = next((line.strip() for line in self.body.splitlines() if line.strip()), "")
+        if len(first_line) > width:
+            first_line = first_line[:width - 3] + "..."
+        heading = f"{'#' * self.level} {self.heading}" if self.level else "(preamble)"
+        return f"{heading}: {first_line}" if first_line else heading
+
+@dataclass
+class Document:
+    """Generated markdown split into addressable sections."""
+
+    id: str
+    kind: str
+    inputs: dict
+    sections: list = field(default_factory=list)
+
+    @property
+    def markdown(self):
+        return "".join(section.markdown for section in self.sections)
+
+    def section(self, section_id):
+        for section in self.sections:
+            if section.id == section_id:
+                return section
+        raise KeyError(f"Unknown section: {section_id}")
+
+    def context(self, exclude=None):
+        """One line per section, used instead of the full text when regenerating."""
+        return "\n".join(section.summary() for section in self.sections if section.id != exclude)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'inputs': self.inputs,
+            'sections': [
+                {'id': section.id, 'heading': section.heading, 'level': section.level, 'markdown': section.markdown}
+                for section in self.sections
+            ],
+        }
+
+def slugify(text):
+    slug = re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")
+    return slug or "section"
+
+def parse_sections(markdown):
+    """Split markdown at every heading; text before the first heading is a preamble."""
+    sections = []
+    seen = {}
+    current = None
+    lines = []
+
+    def flush():
+        if current is not None or "".join(lines).strip():
+            heading, level = current or ("", 0)
+            slug = slugify(heading) if level else "preamble"
+            seen[slug] = seen.get(slug, 0) + 1
+            section_id = slug if seen[slug] == 1 else f"{slug}-{seen[slug]}"
+            sections.append(Section(section_id, heading, level, "".join(lines)))
+
+    for line in markdown.splitlines(keepends=True):
+        match = HEADING.match(line)
+        if match:
+            flush()
+            current = (match.group(2), len(match.group(1)))
+            lines = []
+        else:
+            lines.append(line)
+    flush()
+    return sections
+
+def replace_section(document, section_id, markdown):
+    """Swap one section's content for regenerated markdown, keeping its id."""
+    section = document.section(section_id)
+    parsed = parse_sections(markdown.strip() + "\n\n")
+    if parsed and parsed[0].level:
+        # Keep the heading level where it was, whatever the model used
+        section.heading = parsed[0].heading
+        section.body = parsed[0].body + "".join(extra.markdown for extra in parsed[1:])
+    else:
+        section.body = markdown.strip() + "\n\n"
+    return section
+
+def new_document(kind, inputs, markdown):
+    return Document(uuid.uuid4().hex, kind, inputs, parse_sections(markdown))
+
+class DocumentStore:
+    """In-process LRU of documents open for section edits.
+
+    Only for a single server process; other workers can't see these
+    documents, so multi-worker servers use SQLiteDocumentStore.
+    """
+
+    def __init__(self, max_documents=500):
+        self.max_documents = max_documents
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, document):
+        with self._lock:
+            self._documents[document.id] = document
+            self._documents.move_to_end(document.id)
+            while len(self._documents) > self.max_documents:
+                self._documents.popitem(last=False)
+        return document
+
+    def get(self, document_id):
+        with self._lock:
+            document = self._documents.get(document_id)
+            if document is None:
+                raise KeyError(f"Unknown document: {document_id}")
+            self._documents.move_to_end(document_id)
+            return document
+
+class SQLiteDocumentStore:
+    """Documents kept in SQLite, so every worker process can edit any of them.
+
+    Under gunicorn a document's GET or regenerate call can reach a
+    different worker than the one that created it. Only the
+    `max_documents` most recently used are kept.
+    """
+
+    def __init__(self, path, max_documents=500):
+        self.path = path
+        self.max_documents = max_documents
+        self._db = LocalConnections(path, isolation_level=None)
+        conn = self._db.connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "id TEXT PRIMARY KEY, kind TEXT NOT NULL, inputs TEXT NOT NULL, sections TEXT NOT NULL, "
+            "used_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS documents_used_at ON documents (used_at)")
+
+    def put(self, document):
+        conn = self._db.connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO documents (id, kind, inputs, sections, used_at) VALUES (?, ?, ?, ?, ?)",
+            (document.id, document.kind, json.dumps(document.inputs),
+             json.dumps([asdict(section) for section in document.sections]), time.time()),
+        )
+        conn.execute("DELETE FROM documents WHERE id NOT IN "
+                     "(SELECT id FROM documents ORDER BY used_at DESC LIMIT ?)", (self.max_documents,))
+        return document
+
+    def get(self, document_id):
+        conn = self._db.connect()
+        row = conn.execute("SELECT kind, inputs, sections FROM documents WHERE id = ?", (document_id,)).fetchone()
+        if row is None:
+            raise KeyError(f"Unknown document: {document_id}")
+        conn.execute("UPDATE documents SET used_at = ? WHERE id = ?", (time.time(), document_id))
+        kind, inputs, stored_sections = row
+        return Document(document_id, kind, json.loads(inputs),
+                        [Section(**section) for section in json.loads(stored_sections)])
+
+def create_document_store(config):
+    """Build the document store: SQLite at `generation.documents_path`, or in memory when it is null."""
+    generation = config.get('generation') or {}
+    max_documents = generation.get('max_open_documents', 500)
+    path = generation.get('documents_path', 'data/documents.sqlite3')
+    if not path:
+        return DocumentStore(max_documents)
+    return SQLiteDocumentStore(path, max_documents)
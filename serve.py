@@ -0,0 +1,79 @@
+import gc
+from gunicorn.app.base import BaseApplication
+from podcast_generator import load_config
+
+def gunicorn_options(config):
+    """Translate the `server` config section into gunicorn settings."""
+    server = config['server']
+    return {
+        'bind': f"{server['host']}:{server['port']}",
+        # Model calls are I/O-bound, so each process runs many threads
+        'worker_class': 'gthread',
+        'workers': server.get('workers', 2),
+        'threads': server.get('threads', 16),
+        'keepalive': server.get('keepalive', 5),
+        # Generations can take minutes; don't kill workers mid-call
+        'timeout': server.get('timeout', 180),
+        'graceful_timeout': server.get('graceful_timeout', 120),
+        'max_requests': server.get('max_requests', 0),
+        'max_requests_jitter': server.get('max_requests_jitter', 0),
+        # Import app once in the master so workers share its pages after
+        # fork; the Gemini client is only created on first use in each worker
+        'preload_app': server.get('preload_app', True),
+        'pre_fork': freeze_heap,
+        'post_worker_init': start_jobs,
+        'worker_exit': drain_worker,
+        'accesslog': '-',
+    }
+
+def freeze_heap(server, worker):
+    """Keep the preloaded app's objects out of the garbage collector's reach.
+
+    A collection writes to every object it scans, which would copy the
+    compiled prompt templates, config and fragment templates into each
+    worker. Frozen objects are never scanned, so their pages stay shared.
+    """
+    if server.cfg.preload_app:
+        gc.freeze()
+
+def start_jobs(worker):
+    """Start the job workers in each forked process, resuming queued jobs."""
+    import app
+    if app.jobs is not None:
+        app.jobs.start()
+
+def drain_worker(server, worker):
+    """Let model calls started by this worker finish before it exits."""
+    import app
+    timeout = server.cfg.graceful_timeout
+    if app.jobs is not None:
+        app.jobs.stop()
+    if app.prefetch is not None:
+        app.prefetch.stop()
+    if not app.generator.drain(timeout):
+        server.log.warning("Worker %s exited with generations still running", worker.pid)
+
+class PodcastServer(BaseApplication):
+    """Runs the Flask app under gunicorn with settings from config.yaml."""
+
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from app import app
+        return app
+
+def main(config=None):
+    config = config or load_config()
+    options = gunicorn_options(config)
+    print(f"Starting production server on {options['bind']} "
+          f"({options['workers']} workers x {options['threads']} threads)")
+    PodcastServer(options).run()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+import json
+import math
+import re
+import threading
+import zlib
+import numpy as np
+
+# Inputs that are compared by similarity; every other input must match exactly
+TEXT_INPUTS = ('topic', 'keywords')
+
+# Abbreviations spelled out before comparing, so "AI" and "artificial intelligence" meet
+ABBREVIATIONS = {
+    'ai': 'artificial intelligence',
+    'ml': 'machine learning',
+    'nlp': 'natural language processing',
+    'llm': 'large language model',
+    'llms': 'large language models',
+    'iot': 'internet of things',
+    'vr': 'virtual reality',
+}
+
+def normalize_text(text, abbreviations=None):
+    words = re.findall(r"[a-z0-9]+", str(text).lower())
+    if abbreviations:
+        words = [abbreviations.get(word, word) for word in words]
+    return " ".join(words)
+
+def ngram_counts(text, n, dim):
+    """Count character n-grams of normalized text, hashed into `dim` buckets.
+
+    crc32 rather than hash() so every worker process agrees on the buckets.
+    """
+    text = f" {text} "
+    counts = {}
+    for i in range(max(1, len(text) - n + 1)):
+        index = zlib.crc32(text[i:i + n].encode("utf-8")) % dim
+        counts[index] = counts.get(index, 0) + 1
+    return counts
+
+def bucket_key(method, inputs, text):
+    """Group entries by method, the inputs that must match exactly and the numbers in the text.
+
+    Numbers are one token among many to the n-grams, so "Climate change
+    in 2023" and "... in 2024" would otherwise look like the same topic.
+    """
+    exact = {key: value for key, value in inputs.items() if key not in TEXT_INPUTS}
+    exact['numbers'] = sorted(set(re.findall(r"\d+", text)))
+    return method + ":" + json.dumps(exact, sort_keys=True, default=str)
+
+def input_text(inputs):
+    return " ".join(str(inputs[key]) for key in TEXT_INPUTS if inputs.get(key))
+
+class _Bucket:
+    """Term-frequency rows for one bucket, plus document frequencies."""
+
+    def __init__(self, dim, max_entries):
+        self.max_entries = max_entries
+        self.tf = np.zeros((min(64, max_entries), dim), dtype=np.float32)
+        self.df = np.zeros(dim, dtype=np.float32)
+        self.texts = []
+        self.outputs = []
+        self._norms = None
+
+    def add(self, row, text, output):
+        if len(self.outputs) == self.max_entries:
+            # Forget the oldest quarter at once rather than shifting every time
+            drop = max(1, self.max_entries // 4)
+            self.df -= (self.tf[:drop] > 0).sum(axis=0)
+            self.tf[:-drop] = self.tf[drop:].copy()
+            self.tf[-drop:] = 0
+            del self.texts[:drop], self.outputs[:drop]
+        size = len(self.outputs)
+        if size == len(self.tf):
+            grown = np.zeros((min(len(self.tf) * 2, self.max_entries), self.tf.shape[1]), dtype=np.float32)
+            grown[:size] = self.tf
+            self.tf = grown
+        self.tf[size] = row
+        self.df += row > 0
+        self.texts.append(text)
+        self.outputs.append(output)
+        self._norms = None
+
+    def best(self, row):
+        """Return (index, cosine) of the closest entry by TF-IDF cosine."""
+        size = len(self.outputs)
+        idf = np.log((1 + size) / (1 + self.df)) + 1
+        if self._norms is None:
+            # Row norms depend on every document frequency, so they are only
+            # rebuilt after an add; queries only touch their own n-gram columns
+            self._norms = np.linalg.norm(self.tf[:size] * idf, axis=1)
+        columns = np.flatnonzero(row)
+        weights = row[columns] * idf[columns]
+        scores = (self.tf[:size, columns] @ (weights * idf[columns]))
+        scores /= np.maximum(self._norms * np.linalg.norm(weights), 1e-12)
+        index = int(np.argmax(scores))
+        return index, float(scores[index])
+
+class SimilarityIndex:
+    """Finds past generations whose topic and keywords are close to a new request.
+
+    Inputs are embedded as sublinear TF-IDF vectors of hashed character
+    n-grams, so spelling variants such as "health care" and "healthcare"
+    land close together, and common abbreviations are spelled out first.
+    Entries are only compared within the same method, the same exact-match
+    inputs (style, duration, analysis type, ...) and the same numbers.
+    """
+
+    def __init__(self, methods, threshold=0.85, ngram=3, dim=1024, max_entries=1000, abbreviations=None):
+        self.methods = set(methods)
+        self.abbreviations = dict(ABBREVIATIONS, **(abbreviations or {}))
+        self.threshold = threshold
+        self.ngram = ngram
+        self.dim = dim
+        self.max_entries = max_entries
+        self.hits = 0
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        similarity_config = config.get('similarity') or {}
+        return cls(
+            methods=similarity_config.get('methods', ['outline', 'questions', 'title', 'research']),
+            threshold=similarity_config.get('threshold', 0.85),
+            ngram=similarity_config.get('ngram', 3),
+            dim=similarity_config.get('dimensions', 1024),
+            max_entries=similarity_config.get('max_entries_per_bucket', 1000),
+            abbreviations=similarity_config.get('abbreviations'),
+        )
+
+    def _text(self, inputs):
+        return normalize_text(input_text(inputs), self.abbreviations)
+
+    def _row(self, text):
+        row = np.zeros(self.dim, dtype=np.float32)
+        for index, count in ngram_counts(text, self.ngram, self.dim).items():
+            row[index] = 1 + math.log(count)
+        return row
+
+    def add(self, method, inputs, output):
+        if method not in self.methods or not output:
+            return
+        text = self._text(inputs)
+        if not text:
+            return
+        row = self._row(text)
+        key = bucket_key(method, inputs, text)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = _Bucket(self.dim, self.max_entries)
+            bucket.add(row, text, output)
+
+    def lookup(self, method, inputs):
+        """Return (output, score, matched_text) for the closest entry above the threshold, or None."""
+        if method not in self.methods:
+            return None
+        text = self._text(inputs)
+        if not text:
+            return None
+        row = self._row(text)
+        with self._lock:
+            bucket = self._buckets.get(bucket_key(method, inputs, text))
+            if bucket is None or not bucket.outputs:
+                return None
+            index, score = bucket.best(row)
+            if score < self.threshold:
+                return None
+            self.hits += 1
+            return bucket.outputs[index], score, bucket.texts[index]
+
+    def load(self, records):
+        """Add (method, inputs, output) records, oldest first."""
+        for method, inputs, output in records:
+            self.add(method, inputs, output)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'buckets': len(self._buckets),
+                'entries': sum(len(bucket.outputs) for bucket in self._buckets.values()),
+                'hits': self.hits,
+                'threshold': self.threshold,
+            }
+
+def create_similarity_index(config):
+    """Build the near-duplicate index from the `similarity` config section, or None."""
+    if not (config.get('similarity') or {}).get('enabled', False):
+        return None
+    return SimilarityIndex.from_config(config)
@@ -0,0 +1,57 @@
+import threading
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key into one execution.
+
+    The first caller for a key runs the function; callers arriving while it
+    is still running wait and receive the same result (or exception). Once
+    the call finishes the key is released, so later callers run afresh.
+
+    do() returns (result, shared), where shared is True for callers that
+    joined another caller's execution. Exceptions of the `private` types
+    belong to the caller that raised them (a quota naming that user, say):
+    callers that joined it run the call again instead.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def do(self, key, fn, private=()):
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+                else:
+                    self.coalesced += 1
+            if leader:
+                break
+            call.done.wait()
+            if call.error is None:
+                return call.result, True
+            if not isinstance(call.error, private):
+                raise call.error
+
+        try:
+            call.result = fn()
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
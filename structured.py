@@ -0,0 +1,241 @@
+import json
+import re
+from dataclasses import dataclass, field, asdict
+
+# Schemas are written as example values: a type stands for a required field
+# of that type, a one-element list for a non-empty list of that shape and a
+# dict for a nested object.
+OUTLINE_SCHEMA = {
+    'title': str,
+    'summary': str,
+    'segments': [{
+        'title': str,
+        'duration_minutes': int,
+        'points': [str],
+        'takeaway': str,
+    }],
+    'production_notes': {
+        'music': str,
+        'sound_effects': str,
+        'special_elements': str,
+    },
+}
+
+TITLES_SCHEMA = {
+    'titles': [{
+        'title': str,
+        'appeal': str,
+        'style_elements': str,
+        'emotional_hook': str,
+    }],
+}
+
+RESEARCH_SCHEMA = {
+    'executive_summary': [str],
+    'sections': [{
+        'heading': str,
+        'subsections': [{
+            'title': str,
+            'points': [str],
+        }],
+    }],
+}
+
+# Top-level sections each research report must contain
+RESEARCH_SECTIONS = {
+    'trends': ['Current Trends Analysis', 'Emerging Patterns', 'Content Opportunities', 'Expert Insights', 'Action Items'],
+    'competitors': ['Top Performing Content Analysis', 'Content Gap Analysis', 'Differentiation Opportunities', 'Strategic Recommendations'],
+    'audience': ['Audience Segments', 'Common Questions Analysis', 'Platform Analysis', 'Content Strategy'],
+    'gaps': ['Market Overview', 'Content Gaps', 'Opportunity Analysis', 'Implementation Strategy', 'Success Metrics'],
+}
+
+@dataclass
+class OutlineSegment:
+    title: str
+    duration_minutes: int
+    points: list
+    takeaway: str
+
+@dataclass
+class ProductionNotes:
+    music: str
+    sound_effects: str
+    special_elements: str
+
+@dataclass
+class Outline:
+    title: str
+    summary: str
+    segments: list
+    production_notes: ProductionNotes
+
+    @property
+    def total_minutes(self):
+        return sum(segment.duration_minutes for segment in self.segments)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            title=data['title'],
+            summary=data['summary'],
+            segments=[OutlineSegment(**segment) for segment in data['segments']],
+            production_notes=ProductionNotes(**data['production_notes']),
+        )
+
+@dataclass
+class TitleCandidate:
+    title: str
+    appeal: str
+    style_elements: str
+    emotional_hook: str
+
+@dataclass
+class TitleOptions:
+    titles: list
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(titles=[TitleCandidate(**title) for title in data['titles']])
+
+@dataclass
+class ResearchSubsection:
+    title: str
+    points: list
+
+@dataclass
+class ResearchSection:
+    heading: str
+    subsections: list
+
+@dataclass
+class ResearchReport:
+    analysis_type: str
+    executive_summary: list
+    sections: list = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, data, analysis_type):
+        return cls(
+            analysis_type=analysis_type,
+            executive_summary=data['executive_summary'],
+            sections=[
+                ResearchSection(section['heading'], [ResearchSubsection(**sub) for sub in section['subsections']])
+                for section in data['sections']
+            ],
+        )
+
+def to_dict(obj):
+    return asdict(obj)
+
+class StructuredOutputError(Exception):
+    """The model's reply could not be turned into a valid object."""
+
+def schema_example(schema):
+    """Render a schema as the JSON shape shown to the model."""
+    def example(node):
+        if isinstance(node, dict):
+            return {key: example(value) for key, value in node.items()}
+        if isinstance(node, list):
+            return [example(node[0])]
+        return {str: "string", int: 0}[node]
+    return json.dumps(example(schema), indent=2)
+
+def parse_json(text):
+    """Parse a JSON object from a reply, tolerating markdown code fences.
+
+    Decoding starts at the first "{" and stops where that object ends, so
+    any text after it is ignored, braces included.
+    """
+    text = (text or "").strip()
+    fenced = re.match(r"^```(?:json)?\s*(.*?)\s*```$", text, re.DOTALL)
+    if fenced:
+        text = fenced.group(1)
+    start = text.find('{')
+    if start == -1:
+        raise ValueError("No JSON object in reply")
+    data, _ = json.JSONDecoder().raw_decode(text, start)
+    return data
+
+def _coerce(value, expected):
+    """Fix common near-misses such as "10 minutes" for an integer."""
+    if expected is int and isinstance(value, str):
+        match = re.search(r"\d+", value)
+        if match:
+            return int(match.group())
+    if expected is int and isinstance(value, float):
+        return round(value)
+    if expected is str and isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    if expected is str and isinstance(value, list) and all(isinstance(item, str) for item in value):
+        return "; ".join(value)
+    if expected == [str] and isinstance(value, str) and value.strip():
+        return [value]
+    return value
+
+def validate(data, schema, path=""):
+    """Check data against a schema, repairing simple type slips in place.
+
+    Returns a list of (path, message) for the fields that are still wrong.
+    """
+    errors = []
+    if isinstance(schema, dict):
+        if not isinstance(data, dict):
+            return [(path or "$", "expected an object")]
+        for key in [key for key in data if key not in schema]:
+            del data[key]
+        for key, sub_schema in schema.items():
+            sub_path = f"{path}.{key}" if path else key
+            if key not in data:
+                errors.append((sub_path, "missing"))
+                continue
+            data[key] = _coerce(data[key], sub_schema)
+            errors.extend(validate(data[key], sub_schema, sub_path))
+        return errors
+    if isinstance(schema, list):
+        if not isinstance(data, list) or not data:
+            return [(path, "expected a non-empty list")]
+        for i, item in enumerate(data):
+            item = data[i] = _coerce(item, schema[0])
+            errors.extend(validate(item, schema[0], f"{path}[{i}]"))
+        return errors
+    if schema is int and (isinstance(data, bool) or not isinstance(data, int)):
+        return [(path, "expected an integer")]
+    if schema is str and (not isinstance(data, str) or not data.strip()):
+        return [(path, "expected a non-empty string")]
+    return errors
+
+def _split_path(path):
+    return [int(part) if part.isdigit() else part for part in re.findall(r"[^.\[\]]+", path)]
+
+def set_path(data, path, value):
+    """Set a value at a path such as 'segments[1].duration_minutes'."""
+    parts = _split_path(path)
+    target = data
+    for part in parts[:-1]:
+        target = target[part]
+    target[parts[-1]] = value
+
+def repair_prompt(data, errors):
+    """Ask for corrected values of the failing fields only."""
+    listed = "\n".join(f"- {path}: {message}" for path, message in errors)
+    return (
+        "The JSON document below has invalid or missing fields:\n"
+        f"{listed}\n\n"
+        "Reply with JSON only: an object whose keys are exactly the paths listed above "
+        "and whose values are the corrected values for those fields.\n\n"
+        f"{json.dumps(data, indent=2)}"
+    )
+
+def missing_sections_prompt(topic, keywords, analysis_type, missing):
+    """Ask for just the research sections the model left out."""
+    return (
+        f"For a {analysis_type} analysis of the podcast topic '{topic}' (keywords: {keywords}), "
+        f"write only these sections: {', '.join(missing)}.\n"
+        "Reply with JSON only, matching this shape:\n"
+        f"{schema_example({'sections': RESEARCH_SCHEMA['sections']})}"
+    )
+
+# Rendered once; these are sent with every structured request
+OUTLINE_SHAPE = schema_example(OUTLINE_SCHEMA)
+TITLES_SHAPE = schema_example(TITLES_SCHEMA)
+RESEARCH_SHAPE = schema_example(RESEARCH_SCHEMA)
@@ -0,0 +1,242 @@
+import hmac
+import threading
+import time
+from contextlib import contextmanager
+import metrics
+
+# Users authenticated by a tenant token are charged as "tenant:<name>"
+TENANT_PREFIX = 'tenant:'
+
+class QueueTimeout(Exception):
+    """A model call waited longer than the queue timeout for its turn."""
+
+class Tenant:
+    """One caller's share of the model: weight, concurrency and token rate.
+
+    `tokens` is the tokens-per-minute allowance. Calls are charged after
+    they return, so one large call can take it below zero; the tenant is
+    then held back until it has refilled.
+    """
+
+    def __init__(self, name, weight=1, max_concurrency=4, tokens_per_minute=None, label='default'):
+        self.name = name
+        self.weight = max(float(weight), 0.01)
+        self.max_concurrency = max_concurrency
+        self.tokens_per_minute = tokens_per_minute
+        self.label = label
+        self.active = 0
+        self.waiting = 0
+        self.finish_tag = 0.0
+        self.tokens = tokens_per_minute or 0
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        if self.tokens_per_minute:
+            self.tokens = min(self.tokens_per_minute,
+                              self.tokens + (now - self.updated) * self.tokens_per_minute / 60.0)
+        self.updated = now
+
+    def throttled_for(self):
+        """Seconds until the tenant is back within its token rate; 0 when it is."""
+        if not self.tokens_per_minute or self.tokens >= 0:
+            return 0
+        return -self.tokens * 60.0 / self.tokens_per_minute
+
+    def idle(self):
+        return not self.active and not self.waiting and self.throttled_for() == 0
+
+def _share(limit, processes):
+    """This process's part of a limit split evenly between `processes` server processes."""
+    if not limit:
+        return limit
+    return max(1, int(limit) // processes)
+
+class TenantRegistry:
+    """Tenants from the `tenants.clients` config, looked up by client token.
+
+    Callers without a token are scheduled as their own tenant, keyed by
+    their user id, with the `tenants.default` limits. Each server process
+    schedules on its own, so with `processes` > 1 every concurrency and
+    token-rate limit is divided between them.
+    """
+
+    def __init__(self, clients=(), default=None, max_anonymous=10000, processes=1):
+        self.default = default or {}
+        self.max_anonymous = max_anonymous
+        self.processes = max(1, processes)
+        self._tokens = []
+        self._configured = {}
+        self._anonymous = {}
+        for client in clients:
+            name = client['name']
+            self._tokens.append((str(client['token']), name))
+            self._configured[TENANT_PREFIX + name] = Tenant(
+                name,
+                weight=client.get('weight', 1),
+                max_concurrency=_share(client.get('max_concurrency', 4), self.processes),
+                tokens_per_minute=_share(client.get('tokens_per_minute'), self.processes),
+                label=name,
+            )
+
+    def authenticate(self, token):
+        """Return the user id for a client token, or None if it is unknown."""
+        user = None
+        # Compare against every token, so the time taken doesn't reveal a prefix
+        for known, name in self._tokens:
+            if hmac.compare_digest(known.encode('utf-8'), token.encode('utf-8')):
+                user = TENANT_PREFIX + name
+        return user
+
+    def tenant(self, user):
+        tenant = self._configured.get(user)
+        if tenant is not None:
+            return tenant
+        tenant = self._anonymous.get(user)
+        if tenant is None:
+            if len(self._anonymous) >= self.max_anonymous:
+                self._anonymous = {key: value for key, value in self._anonymous.items() if not value.idle()}
+            tenant = self._anonymous[user] = Tenant(
+                user,
+                weight=self.default.get('weight', 1),
+                max_concurrency=_share(self.default.get('max_concurrency', 2), self.processes),
+                tokens_per_minute=_share(self.default.get('tokens_per_minute'), self.processes),
+            )
+        return tenant
+
+class _Ticket:
+    def __init__(self, tenant, start, finish):
+        self.tenant = tenant
+        self.start = start
+        self.finish = finish
+
+class FairScheduler:
+    """Weighted fair queueing of model calls across tenants.
+
+    At most `max_concurrency` calls run at once. When calls are waiting,
+    the next free slot goes to the one with the smallest virtual finish
+    time: its tenant's previous finish time, or the scheduler's virtual
+    time if later, plus the call's estimated tokens divided by the
+    tenant's weight. A light tenant's first call therefore goes ahead of
+    a heavy tenant's backlog. Tenants at their own concurrency limit, or
+    over their tokens-per-minute rate, are skipped until they are back
+    under it.
+    """
+
+    def __init__(self, registry, max_concurrency=16, queue_timeout=60):
+        self.registry = registry
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.virtual_time = 0.0
+        self._waiting = []
+        self._cond = threading.Condition()
+
+    def _next_ticket(self, now):
+        best = None
+        for ticket in self._waiting:
+            tenant = ticket.tenant
+            tenant.refill(now)
+            if tenant.active >= tenant.max_concurrency or tenant.throttled_for():
+                continue
+            if best is None or ticket.finish < best.finish:
+                best = ticket
+        return best
+
+    def _recheck_after(self, remaining):
+        # A throttled tenant becomes eligible by refilling, not by a release
+        waits = [ticket.tenant.throttled_for() for ticket in self._waiting]
+        return min([remaining] + [wait for wait in waits if wait > 0])
+
+    @contextmanager
+    def slot(self, user, cost):
+        """Wait for the user's turn to call the model, holding a slot until exit.
+
+        Raises QueueTimeout if the turn doesn't come within queue_timeout.
+        """
+        started = time.monotonic()
+        deadline = started + self.queue_timeout if self.queue_timeout else None
+        with self._cond:
+            tenant = self.registry.tenant(user)
+            start = max(self.virtual_time, tenant.finish_tag)
+            ticket = _Ticket(tenant, start, start + max(1, cost) / tenant.weight)
+            tenant.finish_tag = ticket.finish
+            tenant.waiting += 1
+            self._waiting.append(ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    if self.active < self.max_concurrency and self._next_ticket(now) is ticket:
+                        break
+                    remaining = deadline - now if deadline is not None else 60.0
+                    if remaining <= 0:
+                        raise QueueTimeout(f"Timed out after {self.queue_timeout}s waiting for a model slot")
+                    self._cond.wait(self._recheck_after(remaining))
+            finally:
+                self._waiting.remove(ticket)
+                tenant.waiting -= 1
+                # Whoever is next may have been waiting behind this ticket
+                self._cond.notify_all()
+            self.active += 1
+            tenant.active += 1
+            self.virtual_time = max(self.virtual_time, ticket.start)
+        metrics.SCHEDULER_WAIT.observe(time.monotonic() - started, tenant=tenant.label)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.active -= 1
+                tenant.active -= 1
+                self._cond.notify_all()
+
+    def charge(self, user, tokens):
+        """Take a finished call's tokens from the user's per-minute allowance."""
+        if not tokens:
+            return
+        with self._cond:
+            tenant = self.registry.tenant(user)
+            if tenant.tokens_per_minute:
+                tenant.refill(time.monotonic())
+                tenant.tokens -= tokens
+
+    def stats(self):
+        with self._cond:
+            waiting = {}
+            for ticket in self._waiting:
+                waiting[ticket.tenant.label] = waiting.get(ticket.tenant.label, 0) + 1
+            return {
+                'active': self.active,
+                'max_concurrency': self.max_concurrency,
+                'waiting': len(self._waiting),
+                'waiting_by_tenant': waiting,
+            }
+
+def server_processes(config):
+    """How many server processes share the tenant limits.
+
+    `tenants.processes` when set, else `server.workers` in production mode,
+    else 1.
+    """
+    configured = (config.get('tenants') or {}).get('processes')
+    if configured:
+        return int(configured)
+    server = config.get('server') or {}
+    if server.get('mode', 'development') == 'production':
+        return int(server.get('workers', 2))
+    return 1
+
+def create_scheduler(config):
+    """Build the tenant registry and fair scheduler from `tenants`, or None when disabled."""
+    tenants_config = config.get('tenants') or {}
+    if not tenants_config.get('enabled', False):
+        return None
+    processes = server_processes(config)
+    registry = TenantRegistry(
+        tenants_config.get('clients') or [],
+        default=tenants_config.get('default'),
+        processes=processes,
+    )
+    return FairScheduler(
+        registry,
+        max_concurrency=_share(tenants_config.get('max_concurrency', 16), processes),
+        queue_timeout=tenants_config.get('queue_timeout', 60),
+    )
@@ -0,0 +1,57 @@
+import os
+import sys
+import pytest
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The modules live at the top of the repository, not in a package
+sys.path.insert(0, ROOT)
+
+@pytest.fixture(autouse=True)
+def fresh_models(monkeypatch):
+    """Build each test's models and clients from its own config."""
+    import podcast_generator
+    monkeypatch.setattr(podcast_generator, '_models', {})
+    monkeypatch.setattr(podcast_generator, '_clients', {})
+
+@pytest.fixture
+def config(tmp_path):
+    """config.yaml pointed at an instant fake backend, with nothing written to data/."""
+    with open(os.path.join(ROOT, 'config.yaml'), encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    config['backend'] = {'type': 'fake', 'fake': {'latency_seconds': 0, 'chunk_delay_seconds': 0,
+                                                  'response_chars': 400}}
+    config['cache'] = {'backend': 'memory'}
+    config['store'] = {'enabled': False}
+    config['generation']['documents_path'] = None
+    config['tokens']['quota'] = {'enabled': False}
+    config['jobs']['path'] = str(tmp_path / 'jobs.sqlite3')
+    config['prompt_registry']['hot_reload'] = False
+    return config
+
+@pytest.fixture
+def generator(config):
+    from podcast_generator import PodcastContentGenerator
+    return PodcastContentGenerator(config)
+
+@pytest.fixture
+def app_module_factory(config):
+    """Import a fresh app built from the `config` fixture, after the test has edited it."""
+    from podcast_generator import set_config
+    def build():
+        set_config(config)
+        sys.modules.pop('app', None)
+        import app
+        return app
+    yield build
+    sys.modules.pop('app', None)
+    set_config(None)
+
+@pytest.fixture
+def app_module(app_module_factory):
+    return app_module_factory()
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
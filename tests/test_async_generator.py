@@ -0,0 +1,29 @@
+import asyncio
+from async_generator import AsyncPodcastContentGenerator
+
+def test_package_generates_every_part(generator):
+    package = asyncio.run(AsyncPodcastContentGenerator(generator).generate_episode_package(
+        'Coral reefs', 30, 'deep', 'marine biologist', 'tourism'))
+    assert set(package) == {'outline', 'titles', 'questions', 'research'}
+    assert all(package.values())
+
+def test_package_outline_uses_the_structure(generator, monkeypatch):
+    structures = []
+    monkeypatch.setattr(generator, 'generate_outline',
+                        lambda topic, duration, style, use_cache=True, structure=None: structures.append(structure))
+    asyncio.run(AsyncPodcastContentGenerator(generator).generate_episode_package(
+        'Coral reefs', 30, 'deep', 'marine biologist', structure='interview'))
+    assert structures == ['interview']
+
+def test_package_route_passes_the_structure(client, app_module, monkeypatch):
+    structures = []
+    generate_outline = app_module.generator.generate_outline
+    def spy(topic, duration, style, use_cache=True, structure=None):
+        structures.append(structure)
+        return generate_outline(topic, duration, style, use_cache, structure)
+    monkeypatch.setattr(app_module.generator, 'generate_outline', spy)
+    body = {'topic': 'Coral reefs', 'guest_expertise': 'marine biologist', 'structure': 'interview'}
+    assert client.post('/api/generate/package', json=body).status_code == 200
+    assert structures == ['interview']
+    body['structure'] = 'panel'
+    assert client.post('/api/generate/package', json=body).status_code == 400
@@ -0,0 +1,136 @@
+import time
+import pytest
+from backends import FakeAPIError, FakeGeminiModel
+from gemini_client import CircuitBreaker, CircuitOpenError, DeadlineExceeded, GeminiClient, RateLimitTimeout, TokenBucket
+
+def make_client(**client_config):
+    model = FakeGeminiModel(latency_seconds=0, chunk_delay_seconds=0, response_chars=50)
+    return GeminiClient(model, {'client': client_config})
+
+def test_rate_limit_timeout_in_half_open_releases_the_trial():
+    client = make_client(requests_per_minute=60, burst=1, deadline_seconds=0.1,
+                         circuit_failure_threshold=1, circuit_reset_seconds=0)
+    client.breaker.record_failure()
+    assert client.breaker.state == 'half-open'
+    client.bucket._tokens = 0
+    with pytest.raises(RateLimitTimeout):
+        client.generate_content("prompt")
+    assert not client.breaker._trial_running
+    # A later call still gets the trial, and its success closes the breaker
+    client.bucket._tokens = 1
+    client.generate_content("prompt")
+    assert client.breaker.state == 'closed'
+
+def test_open_breaker_fails_fast():
+    client = make_client(circuit_failure_threshold=1, circuit_reset_seconds=60)
+    client.breaker.record_failure()
+    started = time.monotonic()
+    with pytest.raises(CircuitOpenError):
+        client.generate_content("prompt")
+    assert time.monotonic() - started < 0.1
+    assert client.model.calls == 0
+
+def test_breaker_opens_after_threshold():
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=60)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == 'closed'
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+def test_half_open_lets_one_trial_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0)
+    breaker.record_failure()
+    assert breaker.state == 'half-open'
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == 'closed'
+    breaker.before_call()
+
+def test_failed_trial_reopens():
+    breaker = CircuitBreaker(failure_threshold=5, reset_seconds=0.05)
+    for _ in range(5):
+        breaker.record_failure()
+    time.sleep(0.06)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+
+def test_success_resets_failure_count():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == 'closed'
+
+def test_bucket_raises_when_token_would_miss_deadline():
+    bucket = TokenBucket(rate=1, capacity=1)
+    bucket.acquire()
+    with pytest.raises(RateLimitTimeout):
+        bucket.acquire(deadline=time.monotonic() + 0.1)
+
+def test_retryable_errors_are_retried():
+    client = make_client(max_retries=2, backoff_base=0.001, requests_per_minute=0)
+    client.model.error_rate = 1.0
+    with pytest.raises(FakeAPIError):
+        client.generate_content("prompt")
+    assert client.model.calls == 3
+    assert client.retries == 2
+
+def test_bad_requests_are_not_retried():
+    client = make_client(max_retries=2, backoff_base=0.001, requests_per_minute=0)
+    client.model.error_rate = 1.0
+    client.model.error_code = 400
+    with pytest.raises(FakeAPIError):
+        client.generate_content("prompt")
+    assert client.model.calls == 1
+    assert client.breaker.state == 'closed'
+
+class TrackedModel(FakeGeminiModel):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.finished = 0
+
+    def generate_content(self, prompt, request_options=None, **kwargs):
+        try:
+            return super().generate_content(prompt, request_options=request_options, **kwargs)
+        finally:
+            self.finished += 1
+
+def test_deadline_bounds_the_running_request():
+    model = TrackedModel(latency_seconds=2, chunk_delay_seconds=0, response_chars=50)
+    client = GeminiClient(model, {'client': {'deadline_seconds': 0.1, 'max_retries': 0, 'requests_per_minute': 0}})
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        client.generate_content("prompt")
+    assert time.monotonic() - started < 0.5
+    # The request ended with the deadline, so its thread is free again
+    deadline = time.monotonic() + 0.5
+    while not model.finished and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert model.finished == 1
+
+def test_models_without_request_options_are_called_as_before():
+    calls = []
+    class OldModel:
+        model_name = 'models/old'
+        def generate_content(self, prompt, **kwargs):
+            calls.append(kwargs)
+            return FakeGeminiModel(latency_seconds=0, response_chars=10).generate_content(prompt)
+    GeminiClient(OldModel(), {'client': {'deadline_seconds': 5}}).generate_content("prompt")
+    assert calls == [{}]
+
+def test_retry_log_shortens_long_errors(capsys):
+    client = make_client(max_retries=1, backoff_base=0.001, requests_per_minute=0)
+    client.model.generate_content = lambda prompt, **kwargs: (_ for _ in ()).throw(FakeAPIError("x" * 5000, 503))
+    with pytest.raises(FakeAPIError):
+        client.generate_content("prompt")
+    line = capsys.readouterr().out.strip()
+    assert line.startswith("Retrying Gemini call") and line.endswith("(5000 chars)")
+    assert len(line) < 1000
@@ -0,0 +1,67 @@
+import pytest
+from generation_store import GenerationStore, create_store, fts_query
+
+@pytest.fixture
+def store(tmp_path):
+    store = GenerationStore(str(tmp_path / 'data' / 'generations.sqlite3'))
+    store.record('outline', {'topic': 'Coral reefs', 'style': 'deep'}, 'p1', 'Reef tourism and bleaching',
+                 model='m', latency=0.5, prompt_tokens=10, output_tokens=20)
+    store.record('research', {'topic': 'Coral reefs', 'analysis_type': 'gaps'}, 'p2', 'Fishing gaps', model='m')
+    store.record('outline', {'topic': 'Urban beekeeping', 'style': 'casual'}, 'p3', 'Bees and reef-safe honey',
+                 model='m')
+    store.record('outline', {'topic': 'Coral reefs', 'style': 'deep'}, 'p1', 'Reef tourism and bleaching',
+                 source='cache')
+    store.flush()
+    return store
+
+def topics(results):
+    return [(result['method'], result['topic'], result['source']) for result in results]
+
+def test_full_text_search_matches_outputs(store):
+    assert {result['topic'] for result in store.search(q='reef')} == {'Coral reefs', 'Urban beekeeping'}
+    assert topics(store.search(q='bleaching', source='model')) == [('outline', 'Coral reefs', 'model')]
+
+def test_topic_filter_matches_the_topic_only(store):
+    # "reef" appears in the beekeeping output, but not in its topic
+    results = store.search(q='reef', topic='coral')
+    assert {result['topic'] for result in results} == {'Coral reefs'}
+    assert topics(store.search(topic='coral reefs', method='research')) == [('research', 'Coral reefs', 'model')]
+    assert store.search(topic='beekeeping', style='deep') == []
+
+def test_search_is_newest_first_and_paged(store):
+    results = store.search(topic='coral')
+    assert [result['source'] for result in results] == ['cache', 'model', 'model']
+    assert store.search(topic='coral', limit=1, offset=1)[0]['method'] == 'research'
+
+def test_query_syntax_in_user_input_is_quoted(store):
+    assert fts_query('reef" OR topic:*') == '"reef" "OR" "topic"'
+    assert store.search(q='"unbalanced AND (') == []
+    assert len(store.search(q='***')) == 4
+
+def test_get_and_stats(store):
+    record = store.get(store.search(q='tourism', source='model')[0]['id'])
+    assert record['inputs'] == {'topic': 'Coral reefs', 'style': 'deep'}
+    assert record['output'] == 'Reef tourism and bleaching'
+    assert store.get(999) is None
+    stats = {(row['method'], row['source']): row['calls'] for row in store.stats()}
+    assert stats == {('outline', 'cache'): 1, ('outline', 'model'): 2, ('research', 'model'): 1}
+
+def test_recent_outputs_are_model_calls_oldest_first(store):
+    assert [output for _, _, output in store.recent_outputs(['outline'])] == [
+        'Reef tourism and bleaching', 'Bees and reef-safe honey']
+
+def test_history_routes(config, tmp_path, app_module_factory):
+    config['store'] = {'enabled': True, 'path': str(tmp_path / 'generations.sqlite3')}
+    app_module = app_module_factory()
+    client = app_module.app.test_client()
+    client.post('/api/generate/title', json={'topic': 'Coral reefs'})
+    client.post('/api/generate/title', json={'topic': 'Urban beekeeping'})
+    app_module.generator.store.flush()
+    results = client.get('/api/history/search?topic=coral&method=title').get_json()['results']
+    assert [result['topic'] for result in results] == ['Coral reefs']
+    assert client.get(f"/api/history/{results[0]['id']}").get_json()['method'] == 'title'
+    assert client.get('/api/history/search?limit=x').status_code == 400
+
+def test_history_is_off_by_default_in_tests(client):
+    assert client.get('/api/history/search?q=x').status_code == 404
+    assert create_store({'store': {'enabled': False}}) is None
@@ -0,0 +1,74 @@
+import pytest
+from jobs import JobQueue
+
+ALICE = {'REMOTE_ADDR': '10.0.0.1'}
+BOB = {'REMOTE_ADDR': '10.0.0.2'}
+
+@pytest.fixture
+def idle_jobs(monkeypatch):
+    """Keep submitted jobs queued by never starting the workers."""
+    monkeypatch.setattr(JobQueue, 'start', lambda self: None)
+
+def submit(client, environ=ALICE, **fields):
+    response = client.post('/api/jobs', json=dict({'topic': 'Coral reefs', 'duration': 20}, **fields),
+                           environ_base=environ)
+    assert response.status_code == 202
+    return response.get_json()
+
+def test_job_runs_to_done(client):
+    job = submit(client)
+    assert job['status'] in ('queued', 'running')
+    for _ in range(5):
+        if job['status'] in ('done', 'failed', 'cancelled'):
+            break
+        job = client.get(f"/api/jobs/{job['id']}?wait=2", environ_base=ALICE).get_json()
+    assert job['status'] == 'done'
+    assert job['result']
+
+def test_jobs_are_scoped_to_their_submitter(client, idle_jobs):
+    job = submit(client)
+    assert client.get(f"/api/jobs/{job['id']}", environ_base=BOB).status_code == 404
+    assert client.get(f"/api/jobs/{job['id']}/events", environ_base=BOB).status_code == 404
+    assert client.delete(f"/api/jobs/{job['id']}", environ_base=BOB).status_code == 404
+    assert client.get('/api/jobs', environ_base=BOB).get_json() == {'jobs': []}
+
+    # Bob's cancel did nothing
+    mine = client.get(f"/api/jobs/{job['id']}", environ_base=ALICE).get_json()
+    assert mine['status'] == 'queued'
+    assert [listed['id'] for listed in client.get('/api/jobs', environ_base=ALICE).get_json()['jobs']] == [job['id']]
+
+def test_cancel_queued_job(client, idle_jobs):
+    first = submit(client)
+    second = submit(client, priority=5)
+    assert second['position'] == 0
+    assert client.get(f"/api/jobs/{first['id']}", environ_base=ALICE).get_json()['position'] == 1
+
+    response = client.delete(f"/api/jobs/{second['id']}", environ_base=ALICE)
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'cancelled'
+    assert response.get_json()['finished_at'] is not None
+    # The cancelled job no longer holds a place in the queue
+    assert client.get(f"/api/jobs/{first['id']}", environ_base=ALICE).get_json()['position'] == 0
+    statuses = client.get('/api/jobs?status=cancelled', environ_base=ALICE).get_json()['jobs']
+    assert [job['id'] for job in statuses] == [second['id']]
+
+def test_cancel_running_job_discards_its_result(config, generator):
+    queue = JobQueue(generator, config['jobs']['path'], workers=1)
+    queue.start = lambda: None
+    job = queue.submit({'topic': 'Coral reefs', 'duration': 20})
+    row = queue._claim()
+    assert queue.get(job['id'])['status'] == 'running'
+
+    assert queue.cancel(job['id'])['status'] == 'running'
+    queue._run(row)
+    job = queue.get(job['id'])
+    assert job['status'] == 'cancelled'
+    assert job['result'] is None
+
+def test_job_validation_and_webhook_hosts(client):
+    response = client.post('/api/jobs', json={'kind': 'limerick', 'topic': 'Coral reefs'}, environ_base=ALICE)
+    assert response.status_code == 400
+    response = client.post('/api/jobs', json={'topic': 'Coral reefs', 'webhook': 'http://169.254.169.254/'},
+                           environ_base=ALICE)
+    assert response.status_code == 400
+    assert 'not allowed' in response.get_json()['error']
@@ -0,0 +1,84 @@
+import pytest
+import metrics
+from model_router import ModelRouter
+
+SMALL = 'models/gemini-1.5-flash-8b'
+LARGE = 'models/gemini-1.5-flash'
+GOOD_TITLES = "\n".join(f"{i}. Reef Talk {i}" for i in range(1, 6))
+
+class Reply:
+    def __init__(self, text):
+        self.text = text
+
+class ScriptedModel:
+    def __init__(self, model_name, reply):
+        self.model_name = model_name
+        self.reply = reply
+        self.calls = 0
+
+    def generate_content(self, prompt, generation_config=None):
+        self.calls += 1
+        if isinstance(self.reply, Exception):
+            raise self.reply
+        return Reply(self.reply)
+
+@pytest.fixture
+def cascade(generator, monkeypatch):
+    """Answer each routed model name from a scripted model."""
+    models = {}
+    monkeypatch.setattr(generator, '_client_for', lambda name: models[name])
+    def script(**replies):
+        models.update({name: ScriptedModel(name, reply) for name, reply in replies.items()})
+        return models
+    return script
+
+def test_route_picks_first_matching_rule(config):
+    router = ModelRouter(config, LARGE)
+    assert router.route('title') == [SMALL, LARGE]
+    assert router.route('outline', {'duration': 20}) == [SMALL, LARGE]
+    assert router.route('outline', {'duration': 90}) == [LARGE, 'models/gemini-1.5-pro']
+    assert router.route('outline', {'duration': 45}) == [LARGE]
+    assert router.route('outline', {'duration': 'soon'}) == [LARGE]
+    assert router.route('research', {'analysis_type': 'gaps'}) == [LARGE, 'models/gemini-1.5-pro']
+
+    config['routing']['enabled'] = False
+    assert ModelRouter(config, LARGE).route('title') == [LARGE]
+
+def test_checks(config):
+    router = ModelRouter(config, LARGE)
+    assert router.check('title', GOOD_TITLES) == []
+    assert router.check('title', "1. Only one") == ["fewer than 5 title entries"]
+    assert router.check('title', "   ") == ["empty reply"]
+    assert router.check('questions', "Opening Questions?") == [
+        "missing section Main Discussion", "missing section Lightning Round",
+        "missing section Closing Questions", "fewer than 8 questions"]
+    assert router.check('unknown', "anything") == []
+
+def test_failed_check_escalates_to_next_model(generator, cascade):
+    models = cascade(**{SMALL: "1. Only one title", LARGE: GOOD_TITLES})
+    before = metrics.MODEL_ESCALATIONS.value(method='title', model=SMALL)
+    text, source = generator._generate_sourced('title', 'Titles for Coral reefs', {}, inputs={'style': 'deep'})
+    assert text == GOOD_TITLES
+    assert source == 'model'
+    assert (models[SMALL].calls, models[LARGE].calls) == (1, 1)
+    assert metrics.MODEL_ESCALATIONS.value(method='title', model=SMALL) == before + 1
+    # Only the reply that passed is cached
+    assert generator._generate_sourced('title', 'Titles for Coral reefs', {},
+                                       inputs={'style': 'deep'}) == (GOOD_TITLES, 'cache')
+
+def test_passing_reply_does_not_escalate(generator, cascade):
+    models = cascade(**{SMALL: GOOD_TITLES, LARGE: GOOD_TITLES})
+    before = metrics.MODEL_ESCALATIONS.value(method='title', model=SMALL)
+    assert generator._generate('title', 'Titles for Coral reefs', {}, inputs={'style': 'deep'}) == GOOD_TITLES
+    assert models[LARGE].calls == 0
+    assert metrics.MODEL_ESCALATIONS.value(method='title', model=SMALL) == before
+
+def test_error_escalates_but_last_model_is_final(generator, cascade):
+    models = cascade(**{SMALL: RuntimeError("model overloaded"), LARGE: "1. Only one title"})
+    # The last model's reply is kept even when it fails the check
+    assert generator._generate('title', 'Titles for Coral reefs', {}, inputs={'style': 'deep'}) == "1. Only one title"
+    assert (models[SMALL].calls, models[LARGE].calls) == (1, 1)
+
+    cascade(**{SMALL: "1. Only one title", LARGE: RuntimeError("model overloaded")})
+    with pytest.raises(RuntimeError):
+        generator._generate('title', 'Titles for Reef fish', {}, inputs={'style': 'deep'})
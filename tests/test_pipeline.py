@@ -0,0 +1,71 @@
+import pytest
+from pipeline import Pipeline, Stage, summarize
+
+def episode():
+    return Pipeline.from_dict('episode', {'stages': {
+        'research': {'method': 'research'},
+        'outline': {'method': 'outline', 'after': ['research']},
+        'titles': {'method': 'title', 'after': ['outline']},
+    }})
+
+def model_calls(generator):
+    return generator.model.model.calls
+
+def test_stages_run_in_dependency_order():
+    assert episode().order == ['research', 'outline', 'titles']
+
+@pytest.mark.parametrize('stages, message', [
+    ({}, 'no stages'),
+    ({'a': {'method': 'poem'}}, 'unknown method'),
+    ({'a': {'method': 'title', 'after': ['b']}}, 'unknown stage'),
+    ({'a': {'method': 'title', 'after': ['b']}, 'b': {'method': 'title', 'after': ['a']}}, 'cycle'),
+])
+def test_bad_pipelines(stages, message):
+    with pytest.raises(ValueError, match=message):
+        Pipeline.from_dict('bad', {'stages': stages})
+
+def test_summary_keeps_headings_and_list_items_within_budget():
+    text = "# Title\nSome prose here.\n## Part\n- point one\n- point two\n" + "- more\n" * 100
+    summary = summarize(text, max_tokens=12)
+    assert summary.startswith("# Title\n## Part\n- point one")
+    assert "prose" not in summary
+
+def test_rerun_serves_unchanged_stages_from_the_cache(generator):
+    pipeline = episode()
+    values = {'topic': 'Coral reefs', 'keywords': 'tourism', 'duration': 30, 'style': 'deep',
+              'analysis_type': 'trends'}
+    first = pipeline.run(generator, values)
+    assert [stage['source'] for stage in first.values()] == ['model'] * 3
+    calls = model_calls(generator)
+    hits, misses = generator.cache.hits, generator.cache.misses
+
+    second = pipeline.run(generator, values)
+    assert [stage['source'] for stage in second.values()] == ['cache'] * 3
+    assert all(stage['cached'] for stage in second.values())
+    assert model_calls(generator) == calls
+    # One cache lookup per stage
+    assert (generator.cache.hits - hits, generator.cache.misses - misses) == (3, 0)
+
+    # Only the changed stage and those downstream of it go back to the model
+    third = pipeline.run(generator, dict(values, duration=20))
+    assert [third[name]['cached'] for name in pipeline.order] == [True, False, False]
+
+def test_stage_inputs_are_validated(generator):
+    pipeline = Pipeline('long', [Stage('outline', 'outline', inputs={'duration': 1000}),
+                                 Stage('titles', 'title', after=['outline'])])
+    results = pipeline.run(generator, {'topic': 'Coral reefs'})
+    assert results['outline']['status'] == 'error'
+    assert 'between 6 and 240' in results['outline']['error']
+    assert results['titles']['status'] == 'skipped'
+
+def test_stage_inputs_are_canonicalized(generator):
+    pipeline = Pipeline('casual', [Stage('titles', 'title', inputs={'style': ' Casual '})])
+    assert pipeline.run(generator, {'topic': '  Coral   reefs '})['titles']['status'] == 'ok'
+    assert generator.cache.misses == 1
+    assert pipeline.run(generator, {'topic': 'Coral reefs'})['titles']['source'] == 'cache'
+
+def test_pipeline_route(client):
+    response = client.post('/api/pipelines/episode', json={'topic': 'Coral reefs', 'guest_expertise': 'biologist'})
+    assert response.status_code == 200
+    assert set(response.get_json()['stages']) == {'research', 'outline', 'questions', 'titles'}
+    assert client.post('/api/pipelines/episode', json={'topic': 'Coral reefs'}).status_code == 400
@@ -0,0 +1,77 @@
+import threading
+import time
+import pytest
+from prefetch import Prefetcher
+
+ALICE = {'REMOTE_ADDR': '10.0.0.1'}
+BOB = {'REMOTE_ADDR': '10.0.0.2'}
+
+def wait_until(check, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not check():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.005)
+
+@pytest.fixture
+def gate(generator, monkeypatch):
+    """Hold prefetches at their wait for a quiet model until released."""
+    state = {'entered': threading.Event(), 'release': threading.Event()}
+    def wait_until_quiet(max_active, timeout=None):
+        state['entered'].set()
+        return state['release'].wait(5)
+    monkeypatch.setattr(generator, 'wait_until_quiet', wait_until_quiet)
+    yield state
+    state['release'].set()
+
+def test_prefetch_warms_the_cache(generator):
+    prefetcher = Prefetcher(generator, workers=1)
+    prefetcher.after_outline('s1', 'Coral reefs', 'deep', 'Marine biologist')
+    wait_until(lambda: prefetcher.stats()['pending'] == 0)
+    assert prefetcher.stats()['generated'] == 2
+
+    hits = generator.cache.hits
+    assert generator.generate_title('Coral reefs', 'deep')
+    assert generator.generate_questions('Coral reefs', 'Marine biologist', 'deep')
+    assert generator.cache.hits == hits + 2
+
+def test_end_session_cancels_queued_and_waiting_prefetches(generator, gate):
+    prefetcher = Prefetcher(generator, workers=1)
+    prefetcher.after_outline('s1', 'Coral reefs', 'deep', 'Marine biologist')
+    assert gate['entered'].wait(5)
+    # The title is waiting for a quiet model; the questions are still queued
+    assert prefetcher.end_session('s1') == 1
+    assert prefetcher.end_session('s1') == 0
+    gate['release'].set()
+    wait_until(lambda: prefetcher.stats()['pending'] == 0)
+    stats = prefetcher.stats()
+    assert (stats['cancelled'], stats['generated'], stats['sessions']) == (2, 0, 0)
+
+def test_session_token_budget(generator):
+    prefetcher = Prefetcher(generator, workers=1, max_tokens_per_session=1)
+    prefetcher.after_outline('s1', 'Coral reefs', 'deep', 'Marine biologist')
+    assert prefetcher.stats()['skipped'] == 2
+    assert prefetcher.stats()['queued'] == 0
+
+def test_only_the_owner_can_end_a_session(config, app_module_factory, monkeypatch):
+    config['prefetch'].update({'enabled': True, 'workers': 1})
+    app_module = app_module_factory()
+    entered, release = threading.Event(), threading.Event()
+    def wait_until_quiet(max_active, timeout=None):
+        entered.set()
+        return release.wait(5)
+    monkeypatch.setattr(app_module.generator, 'wait_until_quiet', wait_until_quiet)
+    client = app_module.app.test_client()
+    try:
+        response = client.post('/api/generate/outline', headers={'X-Session-Id': 's1'}, environ_base=ALICE,
+                               json={'topic': 'Coral reefs', 'duration': 30, 'guest_expertise': 'Marine biologist'})
+        assert response.status_code == 200
+        assert entered.wait(5)
+
+        response = client.delete('/api/sessions/s1', environ_base=BOB)
+        assert response.get_json() == {'session': 's1', 'cancelled': 0}
+        response = client.delete('/api/sessions/s1', environ_base=ALICE)
+        assert response.get_json() == {'session': 's1', 'cancelled': 1}
+    finally:
+        release.set()
+    wait_until(lambda: app_module.prefetch.stats()['pending'] == 0)
+    assert app_module.prefetch.stats()['cancelled'] == 2
@@ -0,0 +1,71 @@
+import gzip
+import pytest
+import backends
+from rendering import CompressionCache, FragmentRenderer, choose_encoding
+from podcast_generator import RENDERED_MARKER
+
+PAYLOAD = '# Reefs\n<script>alert(1)</script>\n\n- <img src=x onerror=alert(2)>\n\n[link](javascript:alert(3))\n'
+
+@pytest.fixture
+def hostile_model(monkeypatch):
+    """Every markdown reply from the fake backend tries to inject HTML."""
+    monkeypatch.setattr(backends, 'synthesize_response', lambda prompt, chars: PAYLOAD)
+
+def assert_inert(html):
+    assert '<script' not in html and '<img' not in html and 'href="javascript' not in html
+
+def test_markdown_is_rendered_without_raw_html():
+    html = FragmentRenderer().markdown_to_html(PAYLOAD)
+    assert '<h1>Reefs</h1>' in html
+    assert_inert(html)
+    assert '&lt;script&gt;' in html
+
+def test_fragments_are_kept_in_their_own_lru():
+    renderer = FragmentRenderer(max_entries=2)
+    first = renderer.render('research', '# A', topic='t', analysis_type='trends')
+    renderer.render('research', '# B', topic='t', analysis_type='trends')
+    assert renderer.render('research', '# A', topic='t', analysis_type='trends') is first
+    renderer.render('research', '# C', topic='t', analysis_type='trends')
+    assert len(renderer._entries) == 2
+    assert renderer.render('research', '# A', topic='t', analysis_type='trends') is first
+
+def test_topic_is_escaped_in_fragments():
+    html = FragmentRenderer().render('research', '# A', topic='<b>t</b>', analysis_type='trends')
+    assert '<b>t</b>' not in html and '&lt;b&gt;t&lt;/b&gt;' in html
+
+@pytest.mark.parametrize('path, form', [
+    ('/generate_research', {'topic': 'Reefs', 'keywords': 'tourism', 'analysisType': 'trends'}),
+    ('/generate_title', {'topic': 'Reefs'}),
+    ('/generate_questions', {'topic': 'Reefs', 'guest_expertise': 'biologist'}),
+])
+def test_streamed_page_output_is_escaped(client, hostile_model, path, form):
+    response = client.post(path, data=dict(form, stream='1'))
+    body = response.get_data(as_text=True)
+    assert response.status_code == 200
+    preview, rendered = body.split(RENDERED_MARKER)
+    assert_inert(preview)
+    assert '&lt;script&gt;' in preview
+    assert_inert(rendered)
+
+def test_whole_page_output_is_escaped(client, hostile_model):
+    body = client.post('/generate_research', data={'topic': '<i>Reefs</i>', 'keywords': 'tourism'}).get_data(as_text=True)
+    assert_inert(body)
+    assert '<i>Reefs</i>' not in body
+
+def test_compression_is_reused_by_etag():
+    cache = CompressionCache(min_size=0)
+    body = b'x' * 2000
+    compressed = cache.compress('etag', body, 'gzip')
+    assert gzip.decompress(compressed) == body
+    assert cache.compress('etag', b'ignored', 'gzip') is compressed
+    assert choose_encoding('gzip, br;q=0.9') == 'br'
+    assert choose_encoding('identity') is None
+
+def test_only_gets_become_304(client):
+    document = client.post('/api/documents', json={'topic': 'Reefs'})
+    url = f"/api/documents/{document.get_json()['document']['id']}"
+    etag = client.get(url).headers['ETag']
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+    title = client.post('/api/generate/title', json={'topic': 'Reefs'})
+    repeat = client.post('/api/generate/title', json={'topic': 'Reefs'}, headers={'If-None-Match': title.headers['ETag']})
+    assert repeat.status_code == 200 and repeat.get_json() == title.get_json()
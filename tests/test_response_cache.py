@@ -0,0 +1,75 @@
+import os
+import threading
+import pytest
+import response_cache
+from db import LocalConnections
+from response_cache import MemoryCache, NullCache, SQLiteCache, create_cache, make_cache_key
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, 'time', lambda: now[0])
+    return now
+
+def make(kind, tmp_path, **kwargs):
+    if kind == 'memory':
+        return MemoryCache(**kwargs)
+    kwargs.pop('max_entries', None)
+    return SQLiteCache(str(tmp_path / 'cache' / 'responses.sqlite3'), **kwargs)
+
+@pytest.mark.parametrize('kind', ['memory', 'sqlite'])
+def test_entries_expire_after_the_ttl(kind, tmp_path, clock):
+    cache = make(kind, tmp_path, ttl_seconds=60)
+    cache.set('k', 'v')
+    clock[0] += 59
+    assert cache.get('k') == 'v'
+    clock[0] += 2
+    assert cache.get('k') is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+@pytest.mark.parametrize('kind', ['memory', 'sqlite'])
+def test_empty_values_are_not_cached(kind, tmp_path):
+    cache = make(kind, tmp_path)
+    cache.set('k', '')
+    cache.set('n', None)
+    assert len(cache) == 0
+
+def test_memory_cache_evicts_the_least_recently_used():
+    cache = MemoryCache(max_entries=2)
+    cache.set('a', '1')
+    cache.set('b', '2')
+    assert cache.get('a') == '1'
+    cache.set('c', '3')
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == ('1', '3')
+    assert cache.stats() == {'backend': 'memory', 'hits': 3, 'misses': 1, 'hit_rate': 0.75, 'entries': 2}
+
+def test_sqlite_cache_survives_a_restart(tmp_path):
+    make('sqlite', tmp_path).set('k', 'v')
+    assert make('sqlite', tmp_path).get('k') == 'v'
+
+def test_cache_keys_ignore_indentation_but_not_settings():
+    key = make_cache_key("  Write  an\n    outline  ", 'model', {'temperature': 0.7})
+    assert key == make_cache_key("Write an\noutline", 'model', {'temperature': 0.7})
+    assert key != make_cache_key("Write an\noutline", 'model', {'temperature': 0.9})
+    assert key != make_cache_key("Write an\noutline", 'other-model', {'temperature': 0.7})
+
+@pytest.mark.parametrize('backend, cls', [('memory', MemoryCache), ('sqlite', SQLiteCache), ('none', NullCache)])
+def test_create_cache(backend, cls, tmp_path):
+    assert isinstance(create_cache({'cache': {'backend': backend, 'sqlite_path': str(tmp_path / 'c.sqlite3')}}), cls)
+    with pytest.raises(ValueError):
+        create_cache({'cache': {'backend': 'redis'}})
+
+def test_connections_are_per_thread_and_per_process(tmp_path, monkeypatch):
+    db = LocalConnections(str(tmp_path / 'new' / 'x.sqlite3'))
+    conn = db.connect()
+    assert db.connect() is conn
+    other = []
+    thread = threading.Thread(target=lambda: other.append(db.connect()))
+    thread.start()
+    thread.join()
+    assert other[0] is not conn
+    # As in a worker forked after the connection was opened
+    pid = os.getpid()
+    monkeypatch.setattr(os, 'getpid', lambda: pid + 1)
+    assert db.connect() is not conn
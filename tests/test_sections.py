@@ -0,0 +1,86 @@
+import pytest
+import sections
+from sections import DocumentStore, SQLiteDocumentStore, new_document, parse_sections, replace_section
+
+MARKDOWN = """Intro line
+
+# Coral Reefs
+## Summary
+Reefs are in trouble.
+
+## Timeline
+- one
+- two
+
+## Summary
+Again.
+"""
+
+def test_sections_are_split_at_headings_with_unique_ids():
+    parsed = parse_sections(MARKDOWN)
+    assert [section.id for section in parsed] == ['preamble', 'coral-reefs', 'summary', 'timeline', 'summary-2']
+    assert "".join(section.markdown for section in parsed) == MARKDOWN
+
+def test_replace_section_keeps_the_id_level_and_other_sections():
+    document = new_document('outline', {'topic': 'Coral reefs'}, MARKDOWN)
+    replace_section(document, 'timeline', "### New Timeline\n- three\n")
+    section = document.section('timeline')
+    assert (section.id, section.level, section.heading) == ('timeline', 2, 'New Timeline')
+    assert section.body.strip() == '- three'
+    assert document.section('summary').body == "Reefs are in trouble.\n\n"
+    assert document.markdown.startswith("Intro line\n\n# Coral Reefs\n")
+
+def test_replace_section_without_a_heading_keeps_the_old_one():
+    document = new_document('outline', {}, MARKDOWN)
+    replace_section(document, 'summary', "Reefs recover.")
+    assert document.section('summary').markdown == "## Summary\nReefs recover.\n\n"
+
+def test_unknown_section():
+    with pytest.raises(KeyError):
+        new_document('outline', {}, MARKDOWN).section('missing')
+
+@pytest.mark.parametrize('store', ['memory', 'sqlite'])
+def test_stores_keep_the_most_recently_used(store, tmp_path):
+    store = DocumentStore(2) if store == 'memory' else SQLiteDocumentStore(str(tmp_path / 'documents.sqlite3'), 2)
+    first, second, third = (store.put(new_document('outline', {'topic': str(i)}, MARKDOWN)) for i in range(3))
+    with pytest.raises(KeyError):
+        store.get(first.id)
+    assert store.get(third.id).markdown == MARKDOWN
+    assert store.get(second.id).inputs == {'topic': '1'}
+
+def test_create_document_store(config, tmp_path):
+    assert isinstance(sections.create_document_store(config), DocumentStore)
+    config['generation']['documents_path'] = str(tmp_path / 'documents.sqlite3')
+    assert isinstance(sections.create_document_store(config), SQLiteDocumentStore)
+
+def test_document_routes(client):
+    response = client.post('/api/documents', json={'topic': 'Coral reefs', 'duration': 30})
+    assert response.status_code == 200
+    document = response.get_json()['document']
+    section_id = document['sections'][-1]['id']
+    response = client.post(f"/api/documents/{document['id']}/sections/{section_id}/regenerate",
+                           json={'instructions': 'shorter'})
+    assert response.status_code == 200
+    assert response.get_json()['section']['id'] == section_id
+
+def test_bad_document_requests_are_400(client):
+    assert client.post('/api/documents', json={'kind': 'poem', 'topic': 't'}).status_code == 400
+    assert client.post('/api/documents', json={'topic': 't', 'duration': 1000}).status_code == 400
+
+def test_empty_replies_are_server_errors(client, app_module, monkeypatch):
+    monkeypatch.setattr(app_module.generator, '_generate', lambda *args, **kwargs: None)
+    response = client.post('/api/documents', json={'topic': 'Coral reefs'})
+    assert response.status_code == 500
+
+def test_unknown_documents_and_sections_are_404(client):
+    assert client.post('/api/documents/nope/sections/summary/regenerate').status_code == 404
+    document = client.post('/api/documents', json={'topic': 'Coral reefs'}).get_json()['document']
+    assert client.post(f"/api/documents/{document['id']}/sections/nope/regenerate").status_code == 404
+
+def test_key_errors_while_regenerating_are_500(client, app_module, monkeypatch):
+    document = client.post('/api/documents', json={'topic': 'Coral reefs'}).get_json()['document']
+    def fail(*args, **kwargs):
+        raise KeyError('section_regeneration')
+    monkeypatch.setattr(app_module.generator.prompts, 'render', fail)
+    response = client.post(f"/api/documents/{document['id']}/sections/{document['sections'][0]['id']}/regenerate")
+    assert response.status_code == 500
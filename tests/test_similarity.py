@@ -0,0 +1,44 @@
+from similarity import SimilarityIndex
+
+def make_index(*entries):
+    index = SimilarityIndex(['title', 'outline'])
+    for method, inputs, output in entries:
+        index.add(method, inputs, output)
+    return index
+
+def test_spelled_out_abbreviation_matches():
+    index = make_index(('title', {'topic': 'AI in healthcare', 'style': 'deep'}, 'titles'))
+    match = index.lookup('title', {'topic': 'artificial intelligence in health care', 'style': 'deep'})
+    assert match is not None
+    assert match[0] == 'titles'
+    assert match[1] >= index.threshold
+
+def test_numbers_must_match_exactly():
+    index = make_index(('title', {'topic': 'Climate change in 2023', 'style': 'deep'}, '2023 titles'))
+    assert index.lookup('title', {'topic': 'Climate change in 2024', 'style': 'deep'}) is None
+    assert index.lookup('title', {'topic': 'climate change in 2023', 'style': 'deep'})[0] == '2023 titles'
+
+def test_exact_inputs_and_method_must_match():
+    index = make_index(('title', {'topic': 'Coral reef bleaching', 'style': 'deep'}, 'titles'))
+    assert index.lookup('title', {'topic': 'Coral reef bleaching', 'style': 'casual'}) is None
+    assert index.lookup('outline', {'topic': 'Coral reef bleaching', 'style': 'deep'}) is None
+    assert index.lookup('research', {'topic': 'Coral reef bleaching', 'style': 'deep'}) is None
+
+def test_different_topics_do_not_match():
+    index = make_index(('title', {'topic': 'Artificial intelligence in healthcare'}, 'titles'))
+    assert index.lookup('title', {'topic': 'Artificial intelligence in finance'}) is None
+
+def test_closest_entry_wins():
+    index = make_index(
+        ('title', {'topic': 'Urban beekeeping'}, 'bees'),
+        ('title', {'topic': 'Urban gardening'}, 'gardens'),
+    )
+    assert index.lookup('title', {'topic': 'URBAN beekeeping'})[0] == 'bees'
+    assert index.stats()['hits'] == 1
+
+def test_oldest_entries_are_dropped_when_full():
+    index = SimilarityIndex(['title'], max_entries=4)
+    for i in range(6):
+        index.add('title', {'topic': f'topic {"x" * i}'}, f'output {i}')
+    assert index.stats()['entries'] <= 4
+    assert index.lookup('title', {'topic': 'topic xxxxx'})[0] == 'output 5'
@@ -0,0 +1,125 @@
+import threading
+import time
+import pytest
+import token_budget
+from singleflight import SingleFlight
+
+class Private(Exception):
+    pass
+
+def wait_until(check, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not check():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.001)
+
+def run_together(flight, key, fn, callers, private=()):
+    """Start `callers` threads on the same key once the first is inside fn."""
+    results, errors = [], []
+    def call():
+        try:
+            results.append(flight.do(key, fn, private=private))
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=call) for _ in range(callers)]
+    threads[0].start()
+    started.wait(2)
+    for thread in threads[1:]:
+        thread.start()
+    wait_until(lambda: flight.coalesced >= callers - 1)
+    release.set()
+    for thread in threads:
+        thread.join(2)
+    return results, errors
+
+started = threading.Event()
+release = threading.Event()
+
+@pytest.fixture(autouse=True)
+def reset_events():
+    started.clear()
+    release.clear()
+
+def test_concurrent_callers_share_one_call():
+    calls = []
+    def fn():
+        calls.append(1)
+        started.set()
+        release.wait(2)
+        return 'text'
+    results, errors = run_together(SingleFlight(), 'k', fn, 3)
+    assert not errors
+    assert len(calls) == 1
+    assert sorted(results) == [('text', False), ('text', True), ('text', True)]
+
+def test_followers_get_the_leaders_error():
+    def fn():
+        started.set()
+        release.wait(2)
+        raise ValueError('boom')
+    results, errors = run_together(SingleFlight(), 'k', fn, 3)
+    assert not results
+    assert len(errors) == 3 and all(isinstance(e, ValueError) for e in errors)
+
+def test_private_errors_make_followers_call_again():
+    calls = []
+    def fn():
+        calls.append(1)
+        if len(calls) == 1:
+            started.set()
+            release.wait(2)
+            raise Private('quota reached for the leader')
+        return 'text'
+    flight = SingleFlight()
+    results, errors = run_together(flight, 'k', fn, 3, private=(Private,))
+    assert len(errors) == 1 and isinstance(errors[0], Private)
+    assert [text for text, _ in results] == ['text', 'text']
+    assert flight.in_flight() == 0
+
+def test_key_is_released_after_the_call():
+    flight = SingleFlight()
+    assert flight.do('k', lambda: 1) == (1, False)
+    assert flight.do('k', lambda: 2) == (2, False)
+
+def test_identical_generations_share_a_model_call_and_each_user_is_charged(config, tmp_path):
+    config['backend']['fake']['latency_seconds'] = 0.3
+    config['routing']['enabled'] = False
+    config['tokens']['quota'] = {'enabled': True, 'path': str(tmp_path / 'usage.sqlite3'),
+                                 'daily_tokens_per_user': 100000, 'daily_tokens_total': None}
+    from podcast_generator import PodcastContentGenerator
+    generator = PodcastContentGenerator(config)
+    results = {}
+    def generate(user):
+        token_budget.set_user(user)
+        results[user] = generator.generate_title('Coral reefs', 'deep')
+    threads = [threading.Thread(target=generate, args=(user,)) for user in ('alice', 'bob')]
+    threads[0].start()
+    wait_until(generator.inflight.in_flight)
+    threads[1].start()
+    for thread in threads:
+        thread.join(5)
+    assert results['alice'] == results['bob']
+    assert generator.model.model.calls == 1
+    assert generator.inflight.coalesced == 1
+    assert generator.quota.usage('alice') > 0
+    assert generator.quota.usage('bob') == generator.quota.usage('alice')
+
+def test_user_over_quota_does_not_join_a_call(config, tmp_path):
+    config['backend']['fake']['latency_seconds'] = 0.3
+    config['tokens']['quota'] = {'enabled': True, 'path': str(tmp_path / 'usage.sqlite3'),
+                                 'daily_tokens_per_user': 10, 'daily_tokens_total': None}
+    from podcast_generator import PodcastContentGenerator
+    generator = PodcastContentGenerator(config)
+    generator.quota.charge('bob', 10)
+    prompt, generation_config = generator._title_request('Coral reefs', 'deep')
+    def lead():
+        token_budget.set_user('alice')
+        generator._generate('title', prompt, generation_config)
+    leader = threading.Thread(target=lead)
+    leader.start()
+    wait_until(generator.inflight.in_flight)
+    token_budget.set_user('bob')
+    with pytest.raises(token_budget.QuotaExceeded, match='for bob'):
+        generator._generate('title', prompt, generation_config)
+    leader.join(5)
+    assert generator.inflight.coalesced == 0
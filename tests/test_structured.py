@@ -0,0 +1,167 @@
+import json
+import pytest
+import structured
+from structured import OUTLINE_SCHEMA, TITLES_SCHEMA, parse_json, set_path, validate
+
+def outline():
+    return {
+        'title': 'Reefs',
+        'summary': 'About reefs',
+        'segments': [{'title': 'Intro', 'duration_minutes': 5, 'points': ['a'], 'takeaway': 'b'}],
+        'production_notes': {'music': 'm', 'sound_effects': 's', 'special_elements': 'e'},
+    }
+
+def test_valid_data_has_no_errors():
+    assert validate(outline(), OUTLINE_SCHEMA) == []
+
+def test_near_misses_are_repaired_in_place():
+    data = outline()
+    data['segments'][0].update(duration_minutes='10 minutes', points='one point', takeaway=3)
+    data['summary'] = ['first', 'second']
+    assert validate(data, OUTLINE_SCHEMA) == []
+    assert data['segments'][0]['duration_minutes'] == 10
+    assert data['segments'][0]['points'] == ['one point']
+    assert data['segments'][0]['takeaway'] == '3'
+    assert data['summary'] == 'first; second'
+
+def test_unknown_fields_are_dropped():
+    data = outline()
+    data['extra'] = 1
+    data['segments'][0]['notes'] = 'x'
+    assert validate(data, OUTLINE_SCHEMA) == []
+    assert 'extra' not in data and 'notes' not in data['segments'][0]
+
+def test_errors_name_the_failing_paths():
+    data = outline()
+    del data['title']
+    data['segments'].append({'title': '', 'duration_minutes': 'soon', 'points': [], 'takeaway': 't'})
+    data['production_notes'] = 'none'
+    assert sorted(validate(data, OUTLINE_SCHEMA)) == sorted([
+        ('title', 'missing'),
+        ('segments[1].title', 'expected a non-empty string'),
+        ('segments[1].duration_minutes', 'expected an integer'),
+        ('segments[1].points', 'expected a non-empty list'),
+        ('production_notes', 'expected an object'),
+    ])
+
+def test_booleans_are_not_integers():
+    data = outline()
+    data['segments'][0]['duration_minutes'] = True
+    assert validate(data, OUTLINE_SCHEMA) == [('segments[0].duration_minutes', 'expected an integer')]
+
+def test_empty_list_is_an_error():
+    assert validate({'titles': []}, TITLES_SCHEMA) == [('titles', 'expected a non-empty list')]
+
+def test_set_path_fills_a_repaired_field():
+    data = outline()
+    set_path(data, 'segments[0].duration_minutes', 7)
+    assert data['segments'][0]['duration_minutes'] == 7
+
+@pytest.mark.parametrize('text', [
+    '{"a": 1}',
+    '```json\n{"a": 1}\n```',
+    'Here you go:\n{"a": 1}\nThanks',
+])
+def test_parse_json_tolerates_fences_and_chatter(text):
+    assert parse_json(text) == {'a': 1}
+
+def test_parse_json_without_an_object():
+    with pytest.raises(ValueError):
+        parse_json('no json here')
+
+def test_outline_from_valid_data_totals_its_minutes():
+    data = outline()
+    data['segments'].append(dict(data['segments'][0], duration_minutes=20))
+    assert structured.Outline.from_dict(data).total_minutes == 25
+
+@pytest.mark.parametrize('text', [
+    '{"a": 1} and {b}',
+    'Sure: {"a": {"b": 1}}\nLet me know if you want {more}.',
+])
+def test_parse_json_ignores_braces_after_the_object(text):
+    assert parse_json(text)['a'] in (1, {'b': 1})
+
+class TamperedModel:
+    """The fake model with its first replies replaced by `replies`, in order."""
+
+    def __init__(self, model, replies):
+        self.model = model
+        self.model_name = model.model_name
+        self.replies = list(replies)
+        self.prompts = []
+
+    def generate_content(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        response = self.model.generate_content(prompt, **kwargs)
+        if self.replies:
+            response.text = self.replies.pop(0)(response.text)
+        return response
+
+def broken_outline(text):
+    data = json.loads(text)
+    del data['summary']
+    data['segments'][1]['duration_minutes'] = 'soon'
+    return json.dumps(data)
+
+@pytest.fixture
+def tampered(config):
+    from backends import FakeGeminiModel
+    from gemini_client import GeminiClient
+    from podcast_generator import PodcastContentGenerator
+    config['routing']['enabled'] = False
+    generator = PodcastContentGenerator(config)
+    def tamper(*replies):
+        generator.model = GeminiClient(TamperedModel(FakeGeminiModel.from_config(config), replies), config)
+        return generator.model.model
+    return generator, tamper
+
+def test_reask_and_field_repair_through_the_generator(tampered):
+    generator, tamper = tampered
+    model = tamper(lambda text: "Here is your outline!", broken_outline)
+    outline = generator.generate_outline_structured('Coral reefs', 30, 'deep')
+    assert outline is not None and outline.summary
+    assert outline.segments[1].duration_minutes == 5
+    assert len(model.prompts) == 3
+    assert 'not valid JSON' in model.prompts[1]
+    assert '- summary: missing' in model.prompts[2]
+    assert '- segments[1].duration_minutes: expected an integer' in model.prompts[2]
+
+    # The repaired document is cached, so a repeat costs no model calls
+    assert generator.generate_outline_structured('Coral reefs', 30, 'deep') == outline
+    assert len(model.prompts) == 3
+
+def test_unrepairable_replies_are_not_cached(tampered, config):
+    generator, tamper = tampered
+    config['generation']['structured_repair_attempts'] = 1
+    model = tamper(broken_outline, lambda text: '{}')
+    assert generator.generate_outline_structured('Coral reefs', 30, 'deep') is None
+    assert len(model.prompts) == 2
+    # Asked afresh, and this time the reply is valid
+    assert generator.generate_outline_structured('Coral reefs', 30, 'deep') is not None
+    assert len(model.prompts) == 3
+
+def test_structured_calls_use_the_output_budget(tampered, config):
+    import token_budget
+    generator, tamper = tampered
+    model = tamper()
+    calls = []
+    generate_content = model.generate_content
+    model.generate_content = lambda prompt, **kwargs: calls.append(kwargs) or generate_content(prompt, **kwargs)
+    generator.generate_title_structured('Coral reefs', 'deep')
+    assert calls[0]['generation_config']['max_output_tokens'] == token_budget.output_budget(config, 'title')
+
+@pytest.mark.parametrize('path, body, field', [
+    ('/api/generate/outline', {'topic': 'Coral reefs', 'duration': 30}, 'outline'),
+    ('/api/generate/title', {'topic': 'Coral reefs'}, 'titles'),
+    ('/api/generate/research', {'topic': 'Coral reefs', 'keywords': 'tourism', 'analysis_type': 'gaps'}, 'research'),
+])
+def test_json_format_routes_on_the_fake_backend(client, path, body, field):
+    response = client.post(path, json=dict(body, format='json'))
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()[field]
+
+def test_fake_research_names_the_requested_sections(client):
+    response = client.post('/api/generate/research', json={'topic': 'Coral reefs', 'keywords': 'tourism',
+                                                           'analysis_type': 'gaps', 'format': 'json'})
+    headings = [section['heading'] for section in response.get_json()['research']['sections']]
+    assert headings == structured.RESEARCH_SECTIONS['gaps']
@@ -0,0 +1,86 @@
+import threading
+import time
+import pytest
+from tenants import FairScheduler, QueueTimeout, TenantRegistry, _share, server_processes
+
+def wait_until(check, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not check():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.005)
+
+def queue(scheduler, user, cost, order):
+    def run():
+        with scheduler.slot(user, cost):
+            order.append(user)
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+def test_light_tenant_goes_ahead_of_a_heavy_backlog():
+    registry = TenantRegistry(default={'max_concurrency': 4})
+    scheduler = FairScheduler(registry, max_concurrency=1, queue_timeout=5)
+    order = []
+    threads = []
+    with scheduler.slot('heavy', 1000):
+        for _ in range(3):
+            waiting = scheduler.stats()['waiting']
+            threads.append(queue(scheduler, 'heavy', 1000, order))
+            wait_until(lambda: scheduler.stats()['waiting'] > waiting)
+        threads.append(queue(scheduler, 'light', 1000, order))
+        wait_until(lambda: scheduler.stats()['waiting'] == 4)
+    for thread in threads:
+        thread.join(5)
+    assert order[0] == 'light'
+    assert order.count('heavy') == 3
+
+def test_queue_timeout():
+    scheduler = FairScheduler(TenantRegistry(), max_concurrency=1, queue_timeout=0.05)
+    with scheduler.slot('a', 10):
+        with pytest.raises(QueueTimeout):
+            with scheduler.slot('b', 10):
+                pass
+    assert scheduler.stats() == {'active': 0, 'max_concurrency': 1, 'waiting': 0, 'waiting_by_tenant': {}}
+
+def test_tenant_concurrency_limit():
+    registry = TenantRegistry(default={'max_concurrency': 1})
+    scheduler = FairScheduler(registry, max_concurrency=4, queue_timeout=0.05)
+    with scheduler.slot('a', 10):
+        with scheduler.slot('b', 10):
+            assert scheduler.stats()['active'] == 2
+        with pytest.raises(QueueTimeout):
+            with scheduler.slot('a', 10):
+                pass
+
+def test_tenant_over_its_token_rate_waits_to_refill():
+    registry = TenantRegistry(default={'tokens_per_minute': 6000})
+    scheduler = FairScheduler(registry, max_concurrency=4, queue_timeout=2)
+    scheduler.charge('a', 6010)
+    started = time.monotonic()
+    with scheduler.slot('a', 10):
+        pass
+    assert time.monotonic() - started >= 0.08
+
+def test_configured_clients_authenticate_by_token():
+    registry = TenantRegistry([{'name': 'acme', 'token': 's3cret', 'weight': 3}])
+    assert registry.authenticate('s3cret') == 'tenant:acme'
+    assert registry.authenticate('wrong') is None
+    assert registry.tenant('tenant:acme').weight == 3
+
+def test_limits_are_split_between_processes():
+    assert _share(16, 4) == 4
+    assert _share(3, 4) == 1
+    assert _share(None, 4) is None
+    registry = TenantRegistry([{'name': 'acme', 'token': 't', 'max_concurrency': 8, 'tokens_per_minute': 1000}],
+                              processes=2)
+    tenant = registry.tenant('tenant:acme')
+    assert (tenant.max_concurrency, tenant.tokens_per_minute) == (4, 500)
+
+@pytest.mark.parametrize('config, processes', [
+    ({}, 1),
+    ({'server': {'mode': 'production', 'workers': 3}}, 3),
+    ({'server': {'mode': 'development', 'workers': 3}}, 1),
+    ({'tenants': {'processes': 5}, 'server': {'mode': 'production', 'workers': 3}}, 5),
+])
+def test_server_processes(config, processes):
+    assert server_processes(config) == processes
@@ -0,0 +1,51 @@
+import pytest
+
+@pytest.mark.parametrize('duration', [6, 7, 13, 30, 45, 61, 240])
+@pytest.mark.parametrize('structure', ['solo_narrative', 'interview'])
+def test_plan_fills_the_duration(generator, structure, duration):
+    plan = generator.plan_timeline(duration, structure)
+    assert len(plan) == 6
+    assert sum(minutes for _, _, minutes in plan) == duration
+    assert all(minutes >= 1 for _, _, minutes in plan)
+    # Sections follow each other without gaps
+    starts = [start for _, start, _ in plan]
+    assert starts == [sum(minutes for _, _, minutes in plan[:i]) for i in range(len(plan))]
+
+def test_plan_follows_the_weights(generator):
+    # weights [1, 2, 4, 3, 2, 1]: one minute each, then 39 spare minutes at 3 per weight
+    assert generator.plan_timeline(45, 'interview') == [
+        ('Guest Introduction', 0, 4),
+        ('Background Context', 4, 7),
+        ('Deep Dive Questions', 11, 13),
+        ('Personal Stories', 24, 10),
+        ('Philosophical Insights', 34, 7),
+        ('Closing Reflections', 41, 4),
+    ]
+
+def test_remainders_go_to_the_largest_shares(generator):
+    # 7 spare minutes over weights [1, 3, 2, 2, 2, 1] give whole shares [0, 1, 1, 1, 1, 0];
+    # the 3 left over go to the largest remainders, 0.91 then the two 0.64s
+    minutes = [minutes for _, _, minutes in generator.plan_timeline(13, 'solo_narrative')]
+    assert minutes == [2, 3, 2, 2, 2, 2]
+
+def test_default_structure_is_used(generator, config):
+    default = config['generation']['outline_structure']
+    assert generator.plan_timeline(30) == generator.plan_timeline(30, default)
+
+def test_too_short_for_the_structure(generator):
+    with pytest.raises(ValueError, match="at least 6 minutes"):
+        generator.plan_timeline(5, 'interview')
+
+def test_unknown_structure(generator):
+    with pytest.raises(ValueError, match="Unknown outline structure"):
+        generator.plan_timeline(30, 'panel')
+
+def test_weights_must_match_sections(generator, config):
+    config['podcast_templates']['interview']['weights'] = [1, 2]
+    with pytest.raises(ValueError, match="weights"):
+        generator.plan_timeline(30, 'interview')
+
+def test_sections_without_weights_favour_the_middle(generator, config):
+    del config['podcast_templates']['solo_narrative']['weights']
+    minutes = [minutes for _, _, minutes in generator.plan_timeline(30, 'solo_narrative')]
+    assert minutes[0] < minutes[1] and minutes[-1] < minutes[1]
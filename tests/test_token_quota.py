@@ -0,0 +1,60 @@
+import pytest
+from token_budget import QuotaExceeded, TokenQuota
+
+ALICE = {'REMOTE_ADDR': '10.0.0.1'}
+BOB = {'REMOTE_ADDR': '10.0.0.2'}
+PROXY = {'REMOTE_ADDR': '10.0.0.9'}
+
+@pytest.fixture
+def quota_app(config, tmp_path, app_module_factory):
+    config['tokens']['quota'] = {'enabled': True, 'path': str(tmp_path / 'usage.sqlite3'),
+                                 'daily_tokens_per_user': 1000}
+    return app_module_factory()
+
+def test_charge_and_check(tmp_path):
+    quota = TokenQuota(str(tmp_path / 'usage.sqlite3'), daily_tokens_per_user=100, daily_tokens_total=250)
+    quota.charge('alice', 60)
+    quota.charge('alice', 0)
+    quota.charge('bob', 90)
+    assert quota.usage('alice') == 60
+    assert quota.usage() == 150
+    assert quota.remaining('alice') == 40
+    quota.check('alice')
+
+    quota.charge('alice', 40)
+    with pytest.raises(QuotaExceeded) as excinfo:
+        quota.check('alice')
+    assert 0 < excinfo.value.retry_after <= 86400
+    quota.check('bob')
+
+    quota.charge('bob', 60)
+    with pytest.raises(QuotaExceeded, match='service'):
+        quota.check('carol')
+
+def test_generation_is_charged_to_the_caller(quota_app):
+    client = quota_app.app.test_client()
+    response = client.post('/api/generate/title', json={'topic': 'Coral reefs'}, environ_base=ALICE)
+    assert response.status_code == 200
+    usage = client.get('/api/usage', environ_base=ALICE).get_json()
+    assert usage['user'] == '10.0.0.1'
+    assert usage['used_today'] > 0
+    assert usage['remaining_today'] == 1000 - usage['used_today']
+    assert client.get('/api/usage', environ_base=BOB).get_json()['used_today'] == 0
+
+def test_over_quota_gets_429_with_retry_after(quota_app):
+    quota_app.generator.quota.charge('10.0.0.1', 1000)
+    client = quota_app.app.test_client()
+    response = client.post('/api/generate/title', json={'topic': 'Coral reefs'}, environ_base=ALICE)
+    assert response.status_code == 429
+    assert 0 < int(response.headers['Retry-After']) <= 86400
+    assert client.post('/api/generate/title', json={'topic': 'Coral reefs'}, environ_base=BOB).status_code == 200
+
+def test_user_header_only_trusted_from_a_proxy(config, tmp_path, app_module_factory):
+    config['tokens']['quota'] = {'enabled': True, 'path': str(tmp_path / 'usage.sqlite3'),
+                                 'daily_tokens_per_user': 1000}
+    config['server']['trusted_proxies'] = ['10.0.0.9']
+    client = app_module_factory().app.test_client()
+    spoofed = client.get('/api/usage', headers={'X-User-Id': 'alice'}, environ_base=BOB).get_json()
+    assert spoofed['user'] == '10.0.0.2'
+    proxied = client.get('/api/usage', headers={'X-User-Id': 'alice'}, environ_base=PROXY).get_json()
+    assert proxied['user'] == 'alice'
@@ -0,0 +1,72 @@
+import pytest
+from validation import ValidationError, validate_request
+
+def test_inputs_are_canonicalized(config):
+    inputs = validate_request('outline', {'topic': '  Coral   reefs ', 'style': 'Casual', 'duration': '25'}, config)
+    assert inputs == {'topic': 'Coral reefs', 'style': 'casual', 'duration': 25}
+
+def test_defaults_fill_optional_inputs(config):
+    inputs = validate_request('outline', {'topic': 'Coral reefs'}, config)
+    assert inputs['style'] == 'deep'
+    assert inputs['duration'] == config['generation']['default_durations']['outline']
+    assert validate_request('research', {'topic': 't', 'keywords': 'k'}, config)['analysis_type'] == 'trends'
+
+def test_form_aliases(config):
+    inputs = validate_request('research', {'topic': 't', 'keywords': 'k', 'analysisType': 'Gaps'}, config)
+    assert inputs['analysis_type'] == 'gaps'
+
+@pytest.mark.parametrize('values, message', [
+    ({}, 'topic is required'),
+    ({'topic': '   '}, 'topic is required'),
+    ({'topic': ['a']}, 'topic must be a string'),
+    ({'topic': 'x' * 501}, 'at most 500 characters'),
+    ({'topic': 't', 'style': 'weird'}, 'style must be one of'),
+    ({'topic': 't', 'duration': 'ten'}, 'whole number'),
+    ({'topic': 't', 'duration': True}, 'whole number'),
+    ({'topic': 't', 'duration': 5}, 'between 6 and 240'),
+    ({'topic': 't', 'duration': 241}, 'between 6 and 240'),
+    ({'topic': 't', 'structure': 'panel'}, 'Unknown structure'),
+    ({'topic': 't', 'structure': ['interview']}, 'Unknown structure'),
+    ({'topic': 't', 'structure': {'a': 1}}, 'Unknown structure'),
+])
+def test_bad_outline_inputs(config, values, message):
+    with pytest.raises(ValidationError, match=message):
+        validate_request('outline', values, config)
+
+def test_whole_float_durations_are_accepted(config):
+    assert validate_request('outline', {'topic': 't', 'duration': 30.0}, config)['duration'] == 30
+    with pytest.raises(ValidationError):
+        validate_request('outline', {'topic': 't', 'duration': 30.5}, config)
+
+def test_duration_must_cover_every_section(config):
+    config['limits']['min_duration'] = 1
+    with pytest.raises(ValidationError, match="at least 6 minutes for the interview structure"):
+        validate_request('outline', {'topic': 't', 'duration': 4, 'structure': 'interview'}, config)
+
+def test_keywords_are_deduplicated(config):
+    inputs = validate_request('research', {'topic': 't', 'keywords': 'Tourism, bleaching;tourism\nreefs,,'}, config)
+    assert inputs['keywords'] == 'Tourism, bleaching, reefs'
+    inputs = validate_request('research', {'topic': 't', 'keywords': ['reefs', ' Reefs ', 'fish']}, config)
+    assert inputs['keywords'] == 'reefs, fish'
+
+@pytest.mark.parametrize('keywords', [[1], {'a': 1}, 3])
+def test_bad_keyword_types(config, keywords):
+    with pytest.raises(ValidationError, match='keywords must be'):
+        validate_request('research', {'topic': 't', 'keywords': keywords}, config)
+
+def test_too_many_keywords(config):
+    keywords = ', '.join(f'k{i}' for i in range(21))
+    with pytest.raises(ValidationError, match='At most 20 keywords'):
+        validate_request('research', {'topic': 't', 'keywords': keywords}, config)
+
+def test_questions_need_guest_expertise(config):
+    with pytest.raises(ValidationError, match='guest_expertise is required'):
+        validate_request('questions', {'topic': 't'}, config)
+
+def test_pipeline_inputs_are_all_optional(config):
+    assert validate_request('pipeline', {}, config) == {'duration': 30, 'style': 'deep', 'analysis_type': 'trends'}
+
+def test_routes_answer_bad_structures_with_400(client):
+    response = client.post('/api/generate/outline', json={'topic': 't', 'structure': ['interview']})
+    assert response.status_code == 400
+    assert 'Unknown structure' in response.get_json()['error']
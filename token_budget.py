@@ -0,0 +1,151 @@
+import contextvars
+import datetime
+import re
+from db import LocalConnections
+
+# Words, numbers and single punctuation marks, roughly how the model's
+# tokenizer splits English text
+_PIECE = re.compile(r"[A-Za-z]+|\d+|[^\w\s]", re.UNICODE)
+
+DEFAULT_BUDGETS = {
+    'outline': {'base': 400, 'per_minute': 12, 'per_segment': 150, 'min': 768, 'max': 2048},
+    'questions': {'base': 1536, 'min': 1024, 'max': 2048},
+    'title': {'base': 768, 'min': 512, 'max': 1024},
+    'research': {'base': 400, 'per_section': 260, 'per_keyword': 40, 'min': 1024, 'max': 2048},
+}
+
+def count_tokens(text):
+    """Count tokens locally, without a round-trip to the API.
+
+    Long words are split into pieces of about six characters, as subword
+    tokenizers do; other scripts count about two characters a token.
+    """
+    if not text:
+        return 0
+    tokens = 0
+    matched = 0
+    for piece in _PIECE.findall(text):
+        tokens += 1 + (len(piece) - 1) // 6 if piece.isalpha() else 1 + (len(piece) - 1) // 3
+        matched += len(piece)
+    unmatched = len(re.sub(r"\s", "", text)) - matched
+    return max(1, tokens + (max(0, unmatched) + 1) // 2)
+
+def output_budget(config, method, duration=None, segments=None, keywords=None, sections=None):
+    """Pick max_output_tokens for a request from the `tokens.budgets` config.
+
+    The budget is base + per_minute * duration + per_segment * segments +
+    per_section * sections + per_keyword * keywords, clamped to [min, max].
+    Shorter episodes and lighter analyses get smaller budgets, which caps
+    how long the model can keep generating.
+    """
+    budgets = (config.get('tokens') or {}).get('budgets') or {}
+    budget = dict(DEFAULT_BUDGETS.get(method, {}), **(budgets.get(method) or {}))
+    try:
+        minutes = int(duration or 0)
+    except (TypeError, ValueError):
+        minutes = 0
+    if isinstance(keywords, str):
+        keywords = re.split(r"[,;\n]", keywords)
+    keyword_count = len([k for k in keywords or [] if str(k).strip()])
+    tokens = (
+        budget.get('base', 1024)
+        + budget.get('per_minute', 0) * minutes
+        + budget.get('per_segment', 0) * (segments or 0)
+        + budget.get('per_section', 0) * (sections or 0)
+        + budget.get('per_keyword', 0) * keyword_count
+    )
+    return int(max(budget.get('min', 1), min(budget.get('max', 2048), tokens)))
+
+# Who the current request's tokens are charged to
+_current_user = contextvars.ContextVar("token_user", default="anonymous")
+
+def set_user(user):
+    _current_user.set(user or "anonymous")
+
+def current_user():
+    return _current_user.get()
+
+class QuotaExceeded(Exception):
+    """The user or the service has used up today's token quota."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def _today():
+    return datetime.datetime.now(datetime.timezone.utc).date().isoformat()
+
+def _seconds_until_tomorrow():
+    now = datetime.datetime.now(datetime.timezone.utc)
+    tomorrow = datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time(),
+                                         tzinfo=datetime.timezone.utc)
+    return int((tomorrow - now).total_seconds()) + 1
+
+class TokenQuota:
+    """Daily token quotas per user and for the whole service.
+
+    Usage is kept in SQLite so every server process charges the same
+    counters. Days are UTC. A call is allowed while the user is under
+    quota, and its actual prompt and output tokens are charged after it
+    returns.
+    """
+
+    def __init__(self, path, daily_tokens_per_user=None, daily_tokens_total=None):
+        self.path = path
+        self.daily_tokens_per_user = daily_tokens_per_user
+        self.daily_tokens_total = daily_tokens_total
+        self._db = LocalConnections(path)
+        conn = self._db.connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS token_usage ("
+            "day TEXT NOT NULL, user TEXT NOT NULL, tokens INTEGER NOT NULL, "
+            "PRIMARY KEY (day, user))"
+        )
+        conn.commit()
+
+    def usage(self, user=None):
+        """Tokens used today by one user, or by everyone when user is None."""
+        conn = self._db.connect()
+        if user is None:
+            row = conn.execute("SELECT SUM(tokens) FROM token_usage WHERE day = ?", (_today(),)).fetchone()
+        else:
+            row = conn.execute("SELECT tokens FROM token_usage WHERE day = ? AND user = ?",
+                               (_today(), user)).fetchone()
+        return (row[0] or 0) if row else 0
+
+    def check(self, user):
+        """Raise QuotaExceeded if the user or the service is out of tokens today."""
+        if self.daily_tokens_per_user and self.usage(user) >= self.daily_tokens_per_user:
+            raise QuotaExceeded(f"Daily token quota of {self.daily_tokens_per_user} reached for {user}",
+                                _seconds_until_tomorrow())
+        if self.daily_tokens_total and self.usage() >= self.daily_tokens_total:
+            raise QuotaExceeded("Daily token quota reached for the service", _seconds_until_tomorrow())
+
+    def charge(self, user, tokens):
+        if not tokens:
+            return
+        conn = self._db.connect()
+        conn.execute(
+            "INSERT INTO token_usage (day, user, tokens) VALUES (?, ?, ?) "
+            "ON CONFLICT (day, user) DO UPDATE SET tokens = tokens + excluded.tokens",
+            (_today(), user, int(tokens)),
+        )
+        conn.commit()
+
+    def remaining(self, user):
+        """Tokens left today for the user, or None without a per-user quota."""
+        if not self.daily_tokens_per_user:
+            return None
+        return max(0, self.daily_tokens_per_user - self.usage(user))
+
+def create_quota(config):
+    """Build the token quota from `tokens.quota`, or None when disabled."""
+    quota_config = (config.get('tokens') or {}).get('quota') or {}
+    if not quota_config.get('enabled', False):
+        return None
+    return TokenQuota(
+        quota_config.get('path', 'data/usage.sqlite3'),
+        daily_tokens_per_user=quota_config.get('daily_tokens_per_user'),
+        daily_tokens_total=quota_config.get('daily_tokens_total'),
+    )
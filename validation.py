@@ -0,0 +1,121 @@
+import re
+from limits import field_limits
+from podcast_generator import ANALYSIS_TYPES
+
+# Inputs each kind of request takes: (required, optional)
+REQUESTS = {
+    'outline': (('topic',), ('duration', 'style', 'structure', 'guest_expertise')),
+    'questions': (('topic', 'guest_expertise'), ('style',)),
+    'title': (('topic',), ('style',)),
+    'research': (('topic', 'keywords'), ('analysis_type',)),
+    'package': (('topic', 'guest_expertise'), ('duration', 'style', 'keywords', 'analysis_type', 'structure')),
+    'document_outline': (('topic',), ('duration', 'style', 'structure')),
+    'document_research': (('topic',), ('keywords', 'analysis_type')),
+    'pipeline': ((), ('topic', 'duration', 'style', 'guest_expertise', 'keywords', 'analysis_type', 'structure')),
+}
+
+# Form field names that differ from the JSON ones
+ALIASES = {'analysisType': 'analysis_type'}
+
+class ValidationError(ValueError):
+    """A request input is missing, of the wrong type, out of range or too long."""
+
+def _text(name, value, config):
+    if not isinstance(value, str):
+        raise ValidationError(f"{name} must be a string")
+    value = " ".join(value.split())
+    limit = field_limits(config).get(name)
+    if limit and len(value) > limit:
+        raise ValidationError(f"{name} must be at most {limit} characters")
+    return value
+
+def _choice(name, value, allowed):
+    if not isinstance(value, str) or value.strip().lower() not in allowed:
+        raise ValidationError(f"{name} must be one of: {', '.join(allowed)}")
+    return value.strip().lower()
+
+def _duration(value, config):
+    if isinstance(value, str) and re.fullmatch(r"\s*\d+\s*", value):
+        value = int(value)
+    elif isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValidationError("duration must be a whole number of minutes")
+    limits = config.get('limits') or {}
+    low, high = limits.get('min_duration', 6), limits.get('max_duration', 240)
+    if not low <= value <= high:
+        raise ValidationError(f"duration must be between {low} and {high} minutes")
+    return value
+
+def _keywords(value, config):
+    if isinstance(value, list) and all(isinstance(keyword, str) for keyword in value):
+        value = ",".join(value)
+    if not isinstance(value, str):
+        raise ValidationError("keywords must be a string or a list of strings")
+    value = _text('keywords', value.replace("\n", ","), config)
+    keywords = []
+    seen = set()
+    for keyword in re.split(r"[,;]", value):
+        keyword = keyword.strip()
+        if keyword and keyword.lower() not in seen:
+            seen.add(keyword.lower())
+            keywords.append(keyword)
+    limit = (config.get('limits') or {}).get('max_keywords', 20)
+    if len(keywords) > limit:
+        raise ValidationError(f"At most {limit} keywords are allowed")
+    return ", ".join(keywords)
+
+def _normalize(name, value, config):
+    if name == 'duration':
+        return _duration(value, config)
+    if name == 'style':
+        return _choice('style', value, (config.get('generation') or {}).get('styles') or ['deep'])
+    if name == 'analysis_type':
+        return _choice('analysis_type', value, ANALYSIS_TYPES)
+    if name == 'structure':
+        templates = config.get('podcast_templates') or {}
+        if not isinstance(value, str) or value not in templates:
+            raise ValidationError(f"Unknown structure: {value}")
+        return value
+    if name == 'keywords':
+        return _keywords(value, config)
+    return _text(name, value, config)
+
+def validate_request(kind, values, config):
+    """Check and canonicalize one request's inputs; returns a dict of them.
+
+    Works on JSON bodies and form data alike. Raises ValidationError for
+    the first bad input, before anything reaches a prompt. Whitespace is
+    collapsed, enum values lower-cased, durations made ints and keywords
+    de-duplicated, so requests that differ only in how they were typed
+    build the same prompt and share a cache entry. Optional inputs left
+    out get the routes' defaults.
+    """
+    required, optional = REQUESTS[kind]
+    defaults = {
+        'duration': ((config.get('generation') or {}).get('default_durations') or {}).get('outline', 30),
+        'style': 'deep',
+        'analysis_type': 'trends',
+    }
+    values = {ALIASES.get(key, key): value for key, value in values.items()}
+    inputs = {}
+    for name in required + optional:
+        value = values.get(name)
+        if isinstance(value, str) and not value.strip():
+            value = None
+        if value is None:
+            if name in required:
+                raise ValidationError(f"{name} is required")
+            if name in defaults:
+                inputs[name] = defaults[name]
+            continue
+        inputs[name] = _normalize(name, value, config)
+        if name in required and inputs[name] == "":
+            raise ValidationError(f"{name} is required")
+    if 'duration' in optional:
+        # Every section of the timeline needs at least a minute
+        structure = inputs.get('structure') or (config.get('generation') or {}).get('outline_structure')
+        sections = ((config.get('podcast_templates') or {}).get(structure) or {}).get('structure') or []
+        if inputs['duration'] < len(sections):
+            raise ValidationError(f"duration must be at least {len(sections)} minutes for the {structure} structure")
+    return inputs